@@ -0,0 +1,187 @@
+from datetime import date, timedelta
+
+from django.db import connections, transaction
+from django.db.models import Sum
+from django.db.models.functions import ExtractMonth, TruncDay, TruncMonth, TruncWeek, TruncYear
+
+from fire import cache
+from fire.models import IncidentRollup
+
+GRANULARITIES = {
+    'day': TruncDay,
+    'week': TruncWeek,
+    'month': TruncMonth,
+    'year': TruncYear,
+}
+# group_by parameter -> rollup field
+GROUPS = {
+    'severity': 'severity_level',
+    'country': 'country',
+    'city': 'city',
+}
+# Longest series one request may ask for
+MAX_PERIODS = 5000
+
+
+def period_start(day, granularity):
+    """The first day of the period ``day`` falls in, the same day Trunc* picks in the database."""
+    if granularity == 'day':
+        return day
+    if granularity == 'week':
+        return day - timedelta(days=day.weekday())
+    if granularity == 'month':
+        return day.replace(day=1)
+    return day.replace(month=1, day=1)
+
+
+def next_period(start, granularity):
+    if granularity == 'day':
+        return start + timedelta(days=1)
+    if granularity == 'week':
+        return start + timedelta(days=7)
+    if granularity == 'month':
+        return date(start.year + start.month // 12, start.month % 12 + 1, 1)
+    return date(start.year + 1, 1, 1)
+
+
+def periods(start, end, granularity):
+    current = period_start(start, granularity)
+    while current <= end:
+        yield current
+        current = next_period(current, granularity)
+
+
+def period_version_key(granularity, start):
+    return f'fire:analytics:version:{granularity}:{start.isoformat()}'
+
+
+def touch(day):
+    """Invalidate the cached counts of every period containing ``day``."""
+    if day is None:
+        return
+    # Instances built in code can still hold the date as a string until reloaded.
+    day = IncidentRollup._meta.get_field('day').to_python(day)
+    keys = [period_version_key(granularity, period_start(day, granularity)) for granularity in GRANULARITIES]
+    cache.bump_keys(keys)
+    transaction.on_commit(lambda: cache.bump_keys(keys))
+
+
+def query_counts(start, end, granularity, group_by):
+    """``{(period, group): count}`` for days in [start, end], aggregated by the database."""
+    fields = ['period'] + ([GROUPS[group_by]] if group_by else [])
+    rows = (IncidentRollup.objects
+            .filter(day__gte=start, day__lte=end)
+            .annotate(period=GRANULARITIES[granularity]('day'))
+            .values(*fields)
+            .annotate(total=Sum('count'))
+            .order_by())
+    counts = {}
+    for row in rows:
+        group = row[GROUPS[group_by]] if group_by else None
+        counts[row['period'], group] = row['total']
+    return counts
+
+
+def incident_counts(start, end, granularity='month', group_by=None):
+    """Incident counts per period between ``start`` and ``end`` (inclusive).
+
+    Whole periods inside the range are cached under a per-period version that
+    ``touch`` bumps whenever the rollup for one of their days changes, so a new
+    incident only costs its own period a recount. Periods cut by the ends of the
+    range are always counted afresh.
+    """
+    if granularity not in GRANULARITIES:
+        raise ValueError(f'Unknown granularity: {granularity}')
+    if group_by is not None and group_by not in GROUPS:
+        raise ValueError(f'Unknown group_by: {group_by}')
+    if start > end:
+        raise ValueError('start must not be after end')
+    starts = []
+    for period in periods(start, end, granularity):
+        starts.append(period)
+        if len(starts) > MAX_PERIODS:
+            raise ValueError(f'More than {MAX_PERIODS} periods; use a coarser granularity or shorter range')
+
+    whole = [period for period in starts
+             if period >= start and next_period(period, granularity) - timedelta(days=1) <= end]
+    # A rollup rebuild replaces every row, so its version is part of every key.
+    generation, = cache.versions([IncidentRollup])
+    period_versions = cache.key_versions([period_version_key(granularity, period) for period in whole])
+    keys = {period: f'fire:analytics:{granularity}:{group_by}:{period.isoformat()}:{version}:{generation}'
+            for period, version in zip(whole, period_versions)}
+    store = cache.get_cache()
+    cached = store.get_many(list(keys.values()))
+
+    by_period = {period: cached[keys[period]] for period in whole if keys[period] in cached}
+    # One query per run of adjacent uncached periods, so the partial periods at
+    # either end don't drag the cached ones between them back into the count.
+    runs = []
+    for index, period in enumerate(starts):
+        if period in by_period:
+            continue
+        if runs and runs[-1][-1] == starts[index - 1]:
+            runs[-1].append(period)
+        else:
+            runs.append([period])
+    for run in runs:
+        low = max(start, run[0])
+        high = min(end, next_period(run[-1], granularity) - timedelta(days=1))
+        fresh = {period: {} for period in run}
+        for (period, group), total in query_counts(low, high, granularity, group_by).items():
+            if period in fresh:
+                fresh[period][group] = total
+        by_period.update(fresh)
+        store.set_many({keys[period]: fresh[period] for period in run if period in keys}, timeout=None)
+
+    return [{'period': period, 'counts': by_period[period]} for period in starts]
+
+
+def country_months(year):
+    """Incident totals per (country, month) of ``year``."""
+    return (IncidentRollup.objects
+            .filter(day__year=year)
+            .annotate(month=ExtractMonth('day'))
+            .values('country', 'month')
+            .annotate(total=Sum('count'))
+            .order_by())
+
+
+def ranked_top_country_months(year, limit):
+    """One pass over the rollup: window functions total and rank the countries
+    over the grouped rows, and only the top ``limit`` countries come back.
+    """
+    queryset = country_months(year)
+    connection = connections[queryset.db]
+    inner, params = queryset.query.get_compiler(connection=connection).as_sql()
+    country, month, total = map(connection.ops.quote_name, ('country', 'month', 'total'))
+    sql = (
+        f'SELECT {country}, {month}, {total} FROM ('
+        f'SELECT {country}, {month}, {total}, '
+        f'DENSE_RANK() OVER (ORDER BY country_total DESC, {country}) AS country_rank FROM ('
+        f'SELECT {country}, {month}, {total}, SUM({total}) OVER (PARTITION BY {country}) AS country_total '
+        f'FROM ({inner}) country_months) country_totals) ranked '
+        f'WHERE country_rank <= %s ORDER BY {country}, {month}'
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, (*params, limit))
+        return [{'country': row[0], 'month': row[1], 'total': row[2]} for row in cursor.fetchall()]
+
+
+def two_pass_top_country_months(year, limit):
+    """Fallback for backends without window functions: rank first, then fetch."""
+    top = list(IncidentRollup.objects
+               .filter(day__year=year)
+               .values('country')
+               .annotate(total=Sum('count'))
+               .order_by('-total', 'country')
+               .values_list('country', flat=True)[:limit])
+    return list(country_months(year).filter(country__in=top).order_by('country', 'month'))
+
+
+def top_country_months(year, limit=3):
+    """``[{'country', 'month', 'total'}]`` for the ``limit`` countries with the most
+    incidents in ``year``; ties go to the country that sorts first.
+    """
+    if connections[IncidentRollup.objects.db].features.supports_over_clause:
+        return ranked_top_country_months(year, limit)
+    return two_pass_top_country_months(year, limit)
@@ -0,0 +1,293 @@
+import hashlib
+import json
+from datetime import date, datetime
+
+from django.core.exceptions import ValidationError
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.views.decorators.http import condition, require_GET, require_POST
+
+from fire import analytics, bulk, coverage, dashboard, dispatch, exporters, importers, metrics, spatial, sync
+from fire.cache import cache_page_for_models
+from fire.models import FireStation, Incident, IncidentRollup, LocationCoverage, Locations
+
+
+def _dashboard_state(request):
+    if not hasattr(request, '_dashboard_state'):
+        request._dashboard_state = dashboard.dashboard_state()
+    return request._dashboard_state
+
+
+def _dashboard_etag(request):
+    last_modified, total = _dashboard_state(request)
+    stamp = last_modified.isoformat() if last_modified else ''
+    key = f"{stamp}|{total}|{datetime.now().year}|{request.GET.get('series', '')}"
+    return hashlib.md5(key.encode()).hexdigest()
+
+
+def _dashboard_last_modified(request):
+    return _dashboard_state(request)[0]
+
+
+@require_GET
+@condition(etag_func=_dashboard_etag, last_modified_func=_dashboard_last_modified)
+@cache_page_for_models(Incident, Locations, IncidentRollup, vary_on=lambda request: datetime.now().year)
+def dashboard_data(request):
+    try:
+        names = dashboard.parse_series(request.GET.get('series'))
+    except ValueError as exc:
+        return JsonResponse({'error': str(exc)}, status=400)
+    return JsonResponse(dashboard.compute_series(names))
+
+
+@require_GET
+@cache_page_for_models(FireStation, Incident, Locations)
+def map_clusters(request):
+    layer = request.GET.get('layer', 'incidents')
+    if layer not in spatial.MAP_LAYERS:
+        return JsonResponse({'error': f'Unknown layer: {layer}'}, status=400)
+    try:
+        bbox = spatial.parse_bbox(request.GET.get('bbox'))
+        zoom = int(request.GET.get('zoom', 0))
+    except ValueError as exc:
+        return JsonResponse({'error': str(exc)}, status=400)
+    city = request.GET.get('city') or None
+
+    data = spatial.cluster_points(layer, bbox=bbox, zoom=zoom, city=city)
+    if request.GET.get('bounds'):
+        data['bounds'] = spatial.layer_bounds(layer, city=city)
+    return JsonResponse(data)
+
+
+@require_GET
+@cache_page_for_models(FireStation, Incident, Locations)
+def map_points(request):
+    layer = request.GET.get('layer', 'incidents')
+    if layer not in spatial.MAP_LAYERS:
+        return JsonResponse({'error': f'Unknown layer: {layer}'}, status=400)
+    fmt = request.GET.get('format', 'binary')
+    if fmt not in ('binary', 'json'):
+        return JsonResponse({'error': f'Unknown format: {fmt}'}, status=400)
+    try:
+        bbox = spatial.parse_bbox(request.GET.get('bbox'))
+    except ValueError as exc:
+        return JsonResponse({'error': str(exc)}, status=400)
+
+    rows, truncated = spatial.layer_points(layer, bbox=bbox, city=request.GET.get('city') or None)
+    if fmt == 'json':
+        return JsonResponse({'layer': layer, 'truncated': truncated, 'points': rows})
+    return HttpResponse(spatial.pack_points(rows, truncated), content_type='application/octet-stream')
+
+
+def _radius_km(request, default=None):
+    if not request.GET.get('radius_km'):
+        return default
+    radius_km = float(request.GET['radius_km'])
+    if radius_km <= 0:
+        raise ValueError('radius_km must be positive')
+    return radius_km
+
+
+@require_GET
+@cache_page_for_models(FireStation, Locations)
+def nearest_stations(request):
+    try:
+        if request.GET.get('location'):
+            location = get_object_or_404(Locations, pk=int(request.GET['location']))
+            point = (location.latitude, location.longitude)
+        else:
+            point = (float(request.GET['lat']), float(request.GET['lon']))
+        k = min(50, max(1, int(request.GET.get('k', 5))))
+        radius_km = _radius_km(request)
+    except (KeyError, ValueError):
+        return JsonResponse({'error': 'Pass location=<id> or lat and lon, with optional k and a positive radius_km'}, status=400)
+
+    if radius_km is not None:
+        stations = spatial.stations_within(point, radius_km)[:k]
+    else:
+        stations = spatial.nearest_stations(point, k)
+    return JsonResponse({'stations': stations})
+
+
+@require_GET
+@cache_page_for_models(LocationCoverage, Locations)
+def coverage_heatmap(request):
+    try:
+        bbox = spatial.parse_bbox(request.GET.get('bbox'))
+        zoom = int(request.GET.get('zoom', 0))
+        radius_km = _radius_km(request, coverage.default_radius_km())
+    except ValueError as exc:
+        return JsonResponse({'error': str(exc)}, status=400)
+    return JsonResponse(coverage.heatmap(bbox=bbox, zoom=zoom, radius_km=radius_km))
+
+
+@require_GET
+@cache_page_for_models(LocationCoverage, Locations, FireStation)
+def uncovered_locations(request):
+    try:
+        radius_km = _radius_km(request, coverage.default_radius_km())
+        limit = min(5000, max(1, int(request.GET.get('limit', 100))))
+    except ValueError as exc:
+        return JsonResponse({'error': str(exc)}, status=400)
+    rows = coverage.uncovered_locations(radius_km)
+    return JsonResponse({
+        'radius_km': radius_km,
+        'total': rows.count(),
+        'locations': [{
+            'id': row.location_id,
+            'name': row.location.name,
+            'city': row.location.city,
+            'country': row.location.country,
+            'distance_km': round(row.distance_km, 3),
+            'nearest_station': {'id': row.station_id, 'name': row.station.name} if row.station else None,
+        } for row in rows[:limit]],
+    })
+
+
+@require_GET
+def dispatch_recommendations(request):
+    severity_level = request.GET.get('severity') or None
+    try:
+        if request.GET.get('incident'):
+            incident = get_object_or_404(Incident.objects.select_related('location'), pk=int(request.GET['incident']))
+            point, severity_level = incident.location, severity_level or incident.severity_level
+        elif request.GET.get('location'):
+            point = get_object_or_404(Locations, pk=int(request.GET['location']))
+        else:
+            point = (float(request.GET['lat']), float(request.GET['lon']))
+        limit = min(50, max(1, int(request.GET.get('limit', 5))))
+    except (KeyError, ValueError):
+        return JsonResponse({'error': 'Pass incident=<id>, location=<id> or lat and lon, '
+                                      'with optional severity and limit'}, status=400)
+    if severity_level is not None and severity_level not in dispatch.SEVERITY_NEEDS:
+        return JsonResponse({'error': f'Unknown severity: {severity_level}'}, status=400)
+
+    trucks_needed, crew_needed = dispatch.SEVERITY_NEEDS.get(severity_level, (1, 1))
+    return JsonResponse({
+        'severity': severity_level,
+        'needs': {'trucks': trucks_needed, 'firefighters': crew_needed},
+        'stations': dispatch.recommend(point, severity_level, limit=limit),
+    })
+
+
+# Reports returned by the upload endpoint keep at most this many error lines
+MAX_REPORTED_ERRORS = 1000
+
+
+@require_POST
+def import_data(request, kind):
+    if kind not in importers.IMPORTERS:
+        return JsonResponse({'error': f'Unknown import type: {kind}'}, status=404)
+    upload = request.FILES.get('file')
+    if upload is None:
+        return JsonResponse({'error': 'Upload the data as a "file" field'}, status=400)
+    fmt = request.POST.get('format') or importers.guess_format(upload.name)
+    if fmt not in importers.FORMATS:
+        return JsonResponse({'error': f'Unknown format: {fmt}'}, status=400)
+
+    try:
+        batch_size = max(1, int(request.POST.get('batch_size', 1000)))
+    except ValueError:
+        return JsonResponse({'error': 'batch_size must be a whole number'}, status=400)
+
+    importer = importers.IMPORTERS[kind](batch_size=batch_size)
+    summary = {'created': 0, 'failed': 0, 'batches': 0, 'errors': []}
+    # Large uploads are spooled to disk by Django and read back in chunks here.
+    try:
+        for report in importer.run(importers.iter_records(upload, fmt)):
+            summary['batches'] += 1
+            summary['created'] += report['created']
+            summary['failed'] += report['failed']
+            room = MAX_REPORTED_ERRORS - len(summary['errors'])
+            summary['errors'].extend(dict(error, batch=report['batch']) for error in report['errors'][:room])
+    except importers.READ_ERRORS as exc:
+        summary['error'] = f'Could not read the file after {summary["batches"]} batches: {exc}'
+        return JsonResponse(summary, status=400)
+    return JsonResponse(summary, status=200 if not summary['failed'] else 207)
+
+
+@require_GET
+def export_data(request, kind):
+    if kind not in exporters.EXPORTS:
+        return JsonResponse({'error': f'Unknown export type: {kind}'}, status=404)
+    fmt = request.GET.get('format', 'csv')
+    if fmt not in exporters.FORMATS:
+        return JsonResponse({'error': f'Unknown format: {fmt}'}, status=400)
+
+    response = StreamingHttpResponse(exporters.stream(kind, fmt, request.GET.get('q')),
+                                     content_type=exporters.FORMATS[fmt])
+    response['Content-Disposition'] = f'attachment; filename="{kind}.{fmt}"'
+    return response
+
+
+@require_POST
+def bulk_action(request, kind):
+    """Update or delete many rows of ``kind`` in one transaction.
+
+    The JSON body names the ``action`` (update or delete), the rows as ``ids``
+    or as ``"all": true`` for every row matching the search ``query``, and for
+    updates the ``values`` to set. ``"all": true`` without a query also needs
+    ``confirm``, the number of rows it selects; a missing or wrong count is
+    answered with that number as ``selected``.
+    """
+    if kind not in bulk.MODELS:
+        return JsonResponse({'error': f'Unknown bulk action type: {kind}'}, status=404)
+    try:
+        payload = json.loads(request.body or b'{}')
+        if not isinstance(payload, dict):
+            raise ValueError('Send a JSON object')
+        ids = payload.get('ids')
+        if ids is not None:
+            ids = [int(pk) for pk in ids]
+        elif payload.get('all') is not True:
+            raise ValueError('Select rows with "ids" or with "all": true')
+        confirm = payload.get('confirm')
+        if confirm is not None:
+            confirm = int(confirm)
+        result = bulk.run(kind, payload.get('action'), ids=ids, query=payload.get('query') or None,
+                          values=payload.get('values'), confirm=confirm)
+    except bulk.SelectionNotConfirmed as exc:
+        return JsonResponse({'error': str(exc), 'selected': exc.selected}, status=400)
+    except ValidationError as exc:
+        errors = exc.message_dict if hasattr(exc, 'error_dict') else {'values': exc.messages}
+        return JsonResponse({'error': 'Invalid values', 'errors': errors}, status=400)
+    except (ValueError, TypeError) as exc:
+        return JsonResponse({'error': str(exc)}, status=400)
+    return JsonResponse(result)
+
+
+@require_GET
+def metrics_data(request):
+    return HttpResponse(metrics.registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+@require_GET
+def sync_changes(request):
+    try:
+        limit = min(5000, max(1, int(request.GET.get('limit', 500))))
+        data = sync.changes_since(request.GET.get('since'), limit=limit)
+    except ValueError as exc:
+        return JsonResponse({'error': str(exc)}, status=400)
+    except sync.ExpiredToken as exc:
+        return JsonResponse({'error': str(exc)}, status=410)
+    return JsonResponse(data)
+
+
+@require_GET
+def incident_analytics(request):
+    today = date.today()
+    try:
+        start = date.fromisoformat(request.GET.get('start') or f'{today.year}-01-01')
+        end = date.fromisoformat(request.GET.get('end') or today.isoformat())
+        granularity = request.GET.get('granularity', 'month')
+        group_by = request.GET.get('group_by') or None
+        rows = analytics.incident_counts(start, end, granularity, group_by)
+    except ValueError as exc:
+        return JsonResponse({'error': str(exc)}, status=400)
+
+    if group_by:
+        series = [{'period': row['period'], 'counts': row['counts']} for row in rows]
+    else:
+        series = [{'period': row['period'], 'count': row['counts'].get(None, 0)} for row in rows]
+    return JsonResponse({'start': start, 'end': end, 'granularity': granularity, 'group_by': group_by,
+                         'series': series})
@@ -1,6 +1,17 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class FireConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "fire"
+
+    def ready(self):
+        from fire import signals  # noqa: F401
+
+        # Django already keeps compiled templates in its cached loader; filling it up
+        # front means no request pays for parsing one. Skipped while DEBUG, where the
+        # autoreloader restarts often.
+        if not settings.DEBUG:
+            from fire.templating import precompile_templates
+            precompile_templates()
@@ -0,0 +1,142 @@
+import asyncio
+import hashlib
+from datetime import datetime
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, HttpResponseNotAllowed, JsonResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+from fire import dashboard, events, spatial
+from fire.cache import cache_page_for_models
+from fire.models import FireStation, Incident, IncidentRollup, Locations
+
+# Async counterparts of the chart and map endpoints in fire.api, for serving under ASGI.
+# The decorators in django.views.decorators.http only wrap coroutines from Django 5.0,
+# so these views check the method themselves.
+
+CHART_MODELS = (Incident, Locations, IncidentRollup)
+
+
+def current_year(request):
+    return datetime.now().year
+
+
+@cache_page_for_models(*CHART_MODELS, vary_on=current_year)
+async def chart_series(request, series):
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+    if series not in dashboard.SERIES:
+        return JsonResponse({'error': f'Unknown series: {series}'}, status=404)
+    return JsonResponse(await dashboard.afetch_series(series))
+
+
+async def dashboard_data(request):
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+    try:
+        names = dashboard.parse_series(request.GET.get('series'))
+    except ValueError as exc:
+        return JsonResponse({'error': str(exc)}, status=400)
+
+    last_modified, total = await dashboard.adashboard_state()
+    stamp = last_modified.isoformat() if last_modified else ''
+    etag = hashlib.md5(f"{stamp}|{total}|{datetime.now().year}|{request.GET.get('series', '')}".encode()).hexdigest()
+    last_modified = last_modified.timestamp() if last_modified else None
+    response = get_conditional_response(request, etag=f'"{etag}"', last_modified=last_modified)
+    if response is None:
+        response = JsonResponse(await dashboard.acompute_series(names))
+    response['ETag'] = f'"{etag}"'
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified)
+    return response
+
+
+@cache_page_for_models(FireStation, Incident, Locations)
+async def map_data(request):
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+    layer = request.GET.get('layer', 'incidents')
+    if layer not in spatial.MAP_LAYERS:
+        return JsonResponse({'error': f'Unknown layer: {layer}'}, status=400)
+    try:
+        bbox = spatial.parse_bbox(request.GET.get('bbox'))
+        zoom = int(request.GET.get('zoom', 0))
+    except ValueError as exc:
+        return JsonResponse({'error': str(exc)}, status=400)
+    city = request.GET.get('city') or None
+
+    data = await spatial.acluster_points(layer, bbox=bbox, zoom=zoom, city=city)
+    if request.GET.get('bounds'):
+        data['bounds'] = await spatial.alayer_bounds(layer, city=city)
+    return JsonResponse(data)
+
+
+# Seconds between keep-alive comments on an idle event stream
+HEARTBEAT = 15
+# Seconds before a stream ends and the browser reconnects with its Last-Event-ID.
+# Django 4.2 doesn't notice a client going away mid-stream, so this is what
+# eventually releases the subscription of a closed tab.
+STREAM_LIFETIME = getattr(settings, 'FIRE_EVENT_STREAM_SECONDS', 300)
+# How long the browser waits before reconnecting, in milliseconds
+RETRY_MS = 3000
+
+
+def wanted_event(event, types):
+    event_type = event[1]
+    return not types or event_type == 'reset' or event_type.split('.')[0] in types
+
+
+def stream_preamble(last_event_id, types):
+    """The retry hint, the current event id and whatever the client missed."""
+    lines = [f'retry: {RETRY_MS}\n\n']
+    if last_event_id is None:
+        # An id with no data moves the client's Last-Event-ID without firing an event.
+        lines.append(f'id: {events.bus.last_id}\n\n')
+        return lines
+    missed = events.bus.replay(last_event_id)
+    if missed is None:
+        lines.append(events.format_event((events.bus.last_id, 'reset', '{"reason": "replay"}')))
+    else:
+        lines.extend(events.format_event(event) for event in missed if wanted_event(event, types))
+    return lines
+
+
+async def event_stream(last_event_id, types):
+    queue = events.bus.subscribe()
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + STREAM_LIFETIME
+    try:
+        for line in stream_preamble(last_event_id, types):
+            yield line
+        while (remaining := deadline - loop.time()) > 0:
+            try:
+                event = await asyncio.wait_for(queue.get(), min(HEARTBEAT, remaining))
+            except asyncio.TimeoutError:
+                yield ': keep-alive\n\n'
+                continue
+            if wanted_event(event, types):
+                yield events.format_event(event)
+    finally:
+        events.bus.unsubscribe(queue)
+
+
+async def live_events(request):
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+    types = {name for name in request.GET.get('types', '').split(',') if name}
+    try:
+        last_event_id = int(request.headers.get('Last-Event-ID') or request.GET.get('last_event_id') or '')
+    except ValueError:
+        last_event_id = None
+
+    if isinstance(request, ASGIRequest):
+        response = StreamingHttpResponse(event_stream(last_event_id, types), content_type='text/event-stream')
+    else:
+        # A WSGI worker can't hold the stream open, so answer with what was missed and let
+        # the browser's automatic reconnect turn the stream into polling.
+        response = HttpResponse(''.join(stream_preamble(last_event_id, types)), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -0,0 +1,235 @@
+from collections import defaultdict
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db import connection, models, transaction
+from django.utils import timezone
+
+from fire import cache, coverage, dispatch, events, geo, rollups, search, spatial, sync
+from fire.models import FireStation, FireTruck, Firefighters, Incident, Locations
+
+# Rows per statement; keeps every IN (...) well under SQLite's parameter limit
+CHUNK_SIZE = 500
+ACTIONS = ('update', 'delete')
+# Bulk actions name their models the way the sync and export APIs do
+MODELS = sync.SYNC_MODELS
+KINDS = {model: kind for kind, model in MODELS.items()}
+
+# Kept up to date by the code that saves a row, never set directly
+MANAGED_FIELDS = {'created_at', 'updated_at', 'geohash'}
+POSITION_FIELDS = {'latitude', 'longitude'}
+# Changing one of these moves the model's incidents to other rollup buckets
+ROLLUP_FIELDS = {
+    Incident: {'date_time', 'severity_level', 'location'},
+    Locations: {'country', 'city'},
+}
+STATION_MODELS = (FireStation, FireTruck, Firefighters)
+
+
+class SelectionNotConfirmed(ValueError):
+    """An "every row" selection without a search query or a matching ``confirm`` count."""
+
+    def __init__(self, message, selected):
+        super().__init__(message)
+        self.selected = selected
+
+
+def chunks(pks, size=CHUNK_SIZE):
+    for start in range(0, len(pks), size):
+        yield pks[start:start + size]
+
+
+def delete_rows(model, pks):
+    """DELETE the rows of ``pks`` by primary key, one statement per chunk.
+
+    Goes around the deletion collector on purpose: ``delete`` has already done what
+    the collector's cascades and signals would, for the whole selection at once.
+    """
+    table = connection.ops.quote_name(model._meta.db_table)
+    column = connection.ops.quote_name(model._meta.pk.column)
+    with connection.cursor() as cursor:
+        for chunk in chunks(pks):
+            placeholders = ', '.join(['%s'] * len(chunk))
+            cursor.execute(f'DELETE FROM {table} WHERE {column} IN ({placeholders})', chunk)
+
+
+def updatable_fields(model):
+    return [field.name for field in model._meta.concrete_fields
+            if field.editable and not field.primary_key and field.name not in MANAGED_FIELDS]
+
+
+def clean_values(model, values):
+    """Validate ``{field: value}`` for a bulk update of ``model``; raises ValidationError."""
+    if not isinstance(values, dict) or not values:
+        raise ValidationError('Give the fields to update as a non-empty object.')
+    cleaned, errors = {}, {}
+    allowed = updatable_fields(model)
+    for name, value in values.items():
+        try:
+            field = model._meta.get_field(name)
+        except FieldDoesNotExist:
+            errors[name] = ['Unknown field.']
+            continue
+        if name not in allowed:
+            errors[name] = ['This field cannot be updated in bulk.']
+            continue
+        try:
+            cleaned[name] = field.clean(value, None)
+        except ValidationError as exc:
+            errors[name] = exc.messages
+    if POSITION_FIELDS & cleaned.keys() and not POSITION_FIELDS <= cleaned.keys():
+        errors['latitude'] = ['Set latitude and longitude together.']
+    if errors:
+        raise ValidationError(errors)
+    if POSITION_FIELDS <= cleaned.keys() and 'geohash' in {field.name for field in model._meta.concrete_fields}:
+        # Every row gets the same position, so one geohash fits them all.
+        cleaned['geohash'] = geo.encode(cleaned['latitude'], cleaned['longitude'])
+    return cleaned
+
+
+def selected_pks(model, ids=None, query=None):
+    """Primary keys to act on: those of ``ids`` that exist or, without ids, every row.
+
+    ``query`` narrows the selection the way the list page search does.
+    """
+    queryset = model._default_manager.all()
+    if query:
+        queryset = search.search(queryset, query, ranked=False)
+    pks = queryset.order_by('pk').values_list('pk', flat=True)
+    if ids is None:
+        return list(pks)
+    ids = sorted(set(ids))
+    return [pk for chunk in chunks(ids) for pk in pks.filter(pk__in=chunk)]
+
+
+def cascades(model, path=''):
+    """Yield ``(related model, field, lookup, on_delete)`` for every table a delete of
+    ``model`` rows reaches, deepest first; ``lookup`` leads back to ``model``'s pk.
+    """
+    # Hidden relations (related_name='+') cascade too.
+    for relation in model._meta.get_fields(include_hidden=True):
+        if not relation.auto_created or relation.concrete or not (relation.one_to_many or relation.one_to_one):
+            continue
+        field = relation.field
+        lookup = f'{field.name}__{path}' if path else field.name
+        if relation.on_delete is models.CASCADE:
+            yield from cascades(relation.related_model, lookup)
+            yield relation.related_model, field, lookup, models.CASCADE
+        elif relation.on_delete is models.SET_NULL:
+            yield relation.related_model, field, lookup, models.SET_NULL
+
+
+def incidents_of(model, pks):
+    if model is Incident:
+        return Incident.objects.filter(pk__in=pks)
+    return Incident.objects.filter(location_id__in=pks)
+
+
+def update_coverage(location_pks):
+    for chunk in chunks(location_pks):
+        coverage.update_locations(Locations.objects.filter(pk__in=chunk))
+
+
+def update(model, pks, values):
+    """Set cleaned ``values`` on every row of ``pks``, one UPDATE per chunk, and
+    do in bulk what saving each row would have done.
+    """
+    now = timezone.now()
+    rebucket = bool(ROLLUP_FIELDS.get(model, set()) & values.keys())
+    moved = POSITION_FIELDS <= values.keys()
+    previous = (events.snapshot(model, pks)
+                if model in events.EVENT_TYPES and len(pks) <= events.BULK_THRESHOLD else None)
+    with transaction.atomic():
+        for chunk in chunks(pks):
+            if rebucket:
+                deltas = rollups.incident_deltas(incidents_of(model, chunk), -1)
+            model._default_manager.filter(pk__in=chunk).update(**values, updated_at=now)
+            if rebucket:
+                # Incidents whose bucket did not change cancel out and cost nothing.
+                deltas.update(rollups.incident_deltas(incidents_of(model, chunk)))
+                rollups.bump_many(deltas)
+            search.index_objects(model, chunk)
+        cache.invalidate(model)
+
+        if model is FireStation:
+            transaction.on_commit(spatial.invalidate_station_index)
+        if model in STATION_MODELS:
+            transaction.on_commit(dispatch.invalidate_station_summaries)
+        if moved and model is Locations:
+            transaction.on_commit(lambda: update_coverage(pks))
+        if moved and model is FireStation:
+            transaction.on_commit(lambda: coverage.station_changed(pks[0]) if len(pks) == 1 else coverage.rebuild())
+        transaction.on_commit(lambda: events.publish_bulk(model, pks, 'updated', previous))
+    return {model._meta.label: len(pks)}
+
+
+def delete(model, pks):
+    """Delete the rows of ``pks`` and every row that cascades from them, one DELETE
+    per table and chunk, and do in bulk what deleting each row would have done.
+    """
+    plan = list(cascades(model)) + [(model, None, 'pk', models.CASCADE)]
+    removed = defaultdict(list)
+    previous = defaultdict(dict)
+    with transaction.atomic():
+        for chunk in chunks(pks):
+            for related, field, lookup, on_delete in plan:
+                rows = related._default_manager.filter(**{f'{lookup}__in': chunk})
+                if on_delete is models.SET_NULL:
+                    rows.update(**{field.name: None})
+                    continue
+                rows_pks = list(rows.values_list('pk', flat=True))
+                if not rows_pks:
+                    continue
+                if related is Incident:
+                    rollups.remove_incidents(rows)
+                if (related in events.EVENT_TYPES
+                        and len(removed[related]) + len(rows_pks) <= events.BULK_THRESHOLD):
+                    previous[related].update(events.snapshot(related, rows_pks))
+                search.remove_objects(related, rows_pks)
+                if related in MODELS.values():
+                    sync.record_deletions(related, rows_pks)
+                delete_rows(related, rows_pks)
+                removed[related].extend(rows_pks)
+        touched = set(removed) | {related for related, field, lookup, on_delete in plan
+                                  if on_delete is models.SET_NULL}
+        if touched:
+            cache.invalidate(*touched)
+
+        if FireStation in removed:
+            transaction.on_commit(spatial.invalidate_station_index)
+            # Locations the deleted stations served go to their nearest remaining station.
+            transaction.on_commit(lambda: coverage.update_locations(
+                Locations.objects
+                .exclude(latitude__isnull=True).exclude(longitude__isnull=True)
+                .filter(coverage__station__isnull=True)))
+        if any(related in removed for related in STATION_MODELS):
+            transaction.on_commit(dispatch.invalidate_station_summaries)
+        for related, related_pks in removed.items():
+            transaction.on_commit(lambda related=related, related_pks=related_pks:
+                                  events.publish_bulk(related, related_pks, 'deleted', previous[related]))
+    return {related._meta.label: len(related_pks) for related, related_pks in removed.items()}
+
+
+def run(kind, action, ids=None, query=None, values=None, confirm=None):
+    """Apply ``action`` to the selected rows of ``kind``; returns a summary.
+
+    Selecting every row (no ``ids``) takes a search ``query``, a ``confirm`` count
+    equal to the number of rows selected, or both; a count that does not match
+    raises SelectionNotConfirmed. Raises ValueError for any other bad request and
+    ValidationError for bad ``values``.
+    """
+    if kind not in MODELS:
+        raise ValueError(f'Unknown kind: {kind}')
+    if action not in ACTIONS:
+        raise ValueError(f"Unknown action: {action}; use {' or '.join(ACTIONS)}")
+    model = MODELS[kind]
+    cleaned = clean_values(model, values) if action == 'update' else None
+    pks = selected_pks(model, ids, query)
+    if confirm is not None and confirm != len(pks):
+        raise SelectionNotConfirmed(f'The selection has {len(pks)} rows, not {confirm}', len(pks))
+    if ids is None and not query and confirm is None:
+        raise SelectionNotConfirmed(
+            f'Selecting every row needs a search query or a confirm count of {len(pks)}', len(pks))
+    if not pks:
+        return {'action': action, 'kind': kind, 'selected': 0, 'rows': {}}
+    rows = update(model, pks, cleaned) if action == 'update' else delete(model, pks)
+    return {'action': action, 'kind': kind, 'selected': len(pks), 'rows': rows}
@@ -0,0 +1,178 @@
+import asyncio
+import hashlib
+import threading
+import time
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import Model
+from django.http import HttpResponse
+
+
+def get_cache():
+    return caches[getattr(settings, 'FIRE_CACHE_ALIAS', 'default')]
+
+
+def version_key(model):
+    return f'fire:version:{model._meta.label_lower}'
+
+
+def key_versions(keys):
+    """Current value of each version key, starting a fresh one for keys not seen yet."""
+    cache = get_cache()
+    found = cache.get_many(keys)
+    for key in keys:
+        if key not in found:
+            # Start from the clock rather than 1, so a version key that was evicted
+            # can never come back at a number some stale entry was stored under.
+            cache.add(key, time.time_ns(), timeout=None)
+            found[key] = cache.get(key)
+    return [found[key] for key in keys]
+
+
+def bump_keys(keys):
+    cache = get_cache()
+    for key in keys:
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, time.time_ns(), timeout=None)
+
+
+def versions(models):
+    return key_versions([version_key(model) for model in models])
+
+
+async def aversions(models):
+    cache = get_cache()
+    keys = [version_key(model) for model in models]
+    found = await cache.aget_many(keys)
+    for key in keys:
+        if key not in found:
+            await cache.aadd(key, time.time_ns(), timeout=None)
+            found[key] = await cache.aget(key)
+    return [found[key] for key in keys]
+
+
+def bump(*models):
+    bump_keys([version_key(model) for model in models])
+
+
+def invalidate(*models):
+    """Bump now and again on commit, so pages cached from the pre-commit data don't survive."""
+    bump(*models)
+    transaction.on_commit(lambda: bump(*models))
+
+
+class VersionedMemo:
+    """A value built in this process and kept until one of ``models``' versions moves.
+
+    Versions live in the shared cache, so a change saved by any worker makes every
+    other worker rebuild on its next ``get()``; ``clear()`` drops this process's copy
+    at once, e.g. after switching databases.
+    """
+
+    def __init__(self, build, *models):
+        self.build = build
+        self.models = models
+        self.entry = None  # (versions, value)
+        self.generation = 0
+        self.lock = threading.Lock()
+
+    def get(self):
+        current = versions(self.models)
+        entry = self.entry
+        if entry is not None and entry[0] == current:
+            return entry[1]
+        with self.lock:
+            entry = self.entry
+            if entry is not None and entry[0] == current:
+                return entry[1]
+            generation = self.generation
+            value = self.build()
+            # Don't publish a value that was cleared while it was being built.
+            if generation == self.generation:
+                self.entry = (current, value)
+        return value
+
+    def clear(self):
+        self.generation += 1
+        self.entry = None
+
+
+def fragment_part(value):
+    """What a template fragment depends on about ``value``: for a row, which row and when it last changed."""
+    if isinstance(value, Model):
+        updated_at = getattr(value, 'updated_at', None)
+        return f"{value._meta.label_lower}:{value.pk}:{updated_at.isoformat() if updated_at else ''}"
+    return str(value)
+
+
+def fragment_key(name, vary_on):
+    digest = hashlib.md5('|'.join(fragment_part(value) for value in vary_on).encode()).hexdigest()
+    return f'fire:fragment:{name}:{digest}'
+
+
+def has_pending_messages(request):
+    # len() loads the messages without marking them as shown
+    return hasattr(request, '_messages') and len(get_messages(request)) > 0
+
+
+def cache_page_for_models(*models, vary_on=None):
+    """Cache a view's successful GET responses until one of ``models`` changes.
+
+    Entries are keyed on the full path plus the models' current versions, so a
+    bump makes every dependent entry unreachable at once. ``vary_on(request)``
+    adds anything else the response depends on, e.g. the current year.
+    """
+    def page_key(view, request, model_versions):
+        extra = vary_on(request) if vary_on else ''
+        path = hashlib.md5(f'{request.get_full_path()}|{extra}'.encode()).hexdigest()
+        return f"fire:view:{view.__module__}.{view.__name__}:{path}:" + '.'.join(map(str, model_versions))
+
+    def cacheable(response):
+        return response.status_code == 200 and not response.streaming
+
+    def decorator(view):
+        timeout = getattr(settings, 'FIRE_CACHE_TIMEOUT', None)
+
+        if asyncio.iscoroutinefunction(view):
+            @wraps(view)
+            async def wrapper(request, *args, **kwargs):
+                if request.method not in ('GET', 'HEAD') or await sync_to_async(has_pending_messages)(request):
+                    return await view(request, *args, **kwargs)
+                cache = get_cache()
+                key = page_key(view, request, await aversions(models))
+                cached = await cache.aget(key)
+                if cached is not None:
+                    content, content_type = cached
+                    return HttpResponse(content, content_type=content_type)
+                response = await view(request, *args, **kwargs)
+                if cacheable(response):
+                    await cache.aset(key, (response.content, response['Content-Type']), timeout=timeout)
+                return response
+        else:
+            @wraps(view)
+            def wrapper(request, *args, **kwargs):
+                # A flash message belongs to one visitor and must not end up in a shared page.
+                if request.method not in ('GET', 'HEAD') or has_pending_messages(request):
+                    return view(request, *args, **kwargs)
+                cache = get_cache()
+                key = page_key(view, request, versions(models))
+                cached = cache.get(key)
+                if cached is not None:
+                    content, content_type = cached
+                    return HttpResponse(content, content_type=content_type)
+                response = view(request, *args, **kwargs)
+                if cacheable(response):
+                    if hasattr(response, 'render') and callable(response.render):
+                        response.render()
+                    cache.set(key, (response.content, response['Content-Type']), timeout=timeout)
+                return response
+        wrapper.cache_models = models
+        return wrapper
+    return decorator
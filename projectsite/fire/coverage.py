@@ -0,0 +1,144 @@
+import math
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Avg, Count, Max, Q
+from django.db.models.functions import Substr
+
+from fire import cache, geo, spatial
+from fire.models import FireStation, LocationCoverage, Locations
+
+BATCH_SIZE = 2000
+KM_PER_DEGREE = math.pi * geo.EARTH_RADIUS_KM / 180
+
+
+def default_radius_km():
+    """A location further than this from every station counts as uncovered."""
+    return getattr(settings, 'FIRE_COVERAGE_RADIUS_KM', 5.0)
+
+
+def coverage_row(index, pk, latitude, longitude):
+    match = index.nearest(latitude, longitude, 1) if latitude is not None and longitude is not None else []
+    if not match:
+        return LocationCoverage(location_id=pk, station_id=None, distance_km=None)
+    distance, station = match[0]
+    return LocationCoverage(location_id=pk, station_id=station['id'], distance_km=distance)
+
+
+def store(rows):
+    LocationCoverage.objects.bulk_create(rows, update_conflicts=True, unique_fields=['location'],
+                                         update_fields=['station', 'distance_km'])
+
+
+def update_locations(queryset):
+    """Recompute the nearest station of every location in ``queryset``, a batch at a time."""
+    index = spatial.station_index()
+    rows = queryset.values_list('id', 'latitude', 'longitude').order_by('id')
+    total = last = 0
+    with transaction.atomic():
+        # Each batch is its own query: no cursor stays open over rows this loop rewrites.
+        while True:
+            batch = list(rows.filter(id__gt=last)[:BATCH_SIZE])
+            if not batch:
+                break
+            store([coverage_row(index, *row) for row in batch])
+            total += len(batch)
+            last = batch[-1][0]
+        if total:
+            cache.invalidate(LocationCoverage)
+    return total
+
+
+def rebuild():
+    return update_locations(Locations.objects.all())
+
+
+def location_changed(location_id):
+    update_locations(Locations.objects.filter(pk=location_id))
+
+
+def reach_box(latitude, longitude, km):
+    """A (west, south, east, north) box holding every point within ``km``, or None for the whole map."""
+    lat_span = km / KM_PER_DEGREE
+    south, north = latitude - lat_span, latitude + lat_span
+    if south <= -90 or north >= 90:
+        return None
+    lon_span = lat_span / math.cos(math.radians(max(abs(south), abs(north))))
+    if lon_span >= 180:
+        return None
+    west, east = longitude - lon_span, longitude + lon_span
+    # bbox_filter splits boxes that wrap around the antimeridian
+    return (west + 360 if west < -180 else west, south, east - 360 if east > 180 else east, north)
+
+
+def station_changed(station_id):
+    """Bring coverage up to date after a station was added, moved or removed."""
+    # Locations the station used to serve, plus any left without one (its
+    # deletion nulls their station), go back to the index for a new nearest.
+    with transaction.atomic():
+        update_locations(Locations.objects
+                         .exclude(latitude__isnull=True).exclude(longitude__isnull=True)
+                         .filter(Q(coverage__station_id=station_id) | Q(coverage__station__isnull=True)))
+
+        station = FireStation.objects.filter(pk=station_id).values('latitude', 'longitude').first()
+        if not station or station['latitude'] is None or station['longitude'] is None:
+            return
+        # Elsewhere only locations now closer to this station than to their own can change,
+        # and none of those is further away than the furthest current assignment.
+        latitude, longitude = float(station['latitude']), float(station['longitude'])
+        reach = LocationCoverage.objects.aggregate(reach=Max('distance_km'))['reach']
+        candidates = Locations.objects.exclude(latitude__isnull=True).exclude(longitude__isnull=True)
+        box = reach_box(latitude, longitude, reach) if reach is not None else None
+        if box:
+            candidates = candidates.filter(spatial.bbox_filter(box))
+        closer = [pk for pk, lat, lon, distance
+                  in candidates.values_list('id', 'latitude', 'longitude', 'coverage__distance_km').iterator()
+                  if distance is None or geo.haversine(latitude, longitude, lat, lon) < distance]
+        for start in range(0, len(closer), BATCH_SIZE):
+            update_locations(Locations.objects.filter(pk__in=closer[start:start + BATCH_SIZE]))
+
+
+def heatmap_queryset(bbox=None, zoom=0, radius_km=None):
+    """Return ``(rows, precision)``: locations, uncovered locations and distances per geohash cell."""
+    if radius_km is None:
+        radius_km = default_radius_km()
+    precision = geo.zoom_precision(zoom)
+    qs = LocationCoverage.objects.exclude(distance_km__isnull=True)
+    if bbox:
+        qs = qs.filter(spatial.bbox_filter(bbox, 'location__'))
+    rows = (qs.annotate(cell=Substr('location__geohash', 1, precision))
+            .values('cell')
+            .annotate(locations=Count('pk'),
+                      uncovered=Count('pk', filter=Q(distance_km__gt=radius_km)),
+                      mean_km=Avg('distance_km'),
+                      max_km=Max('distance_km'))
+            .order_by())
+    return rows, precision
+
+
+def heatmap(bbox=None, zoom=0, radius_km=None):
+    if radius_km is None:
+        radius_km = default_radius_km()
+    rows, precision = heatmap_queryset(bbox, zoom, radius_km)
+    cells = []
+    for row in rows:
+        south, west, north, east = geo.decode_bounds(row['cell'])
+        cells.append({
+            'geohash': row['cell'],
+            'bounds': [[south, west], [north, east]],
+            'locations': row['locations'],
+            'uncovered': row['uncovered'],
+            'mean_km': round(row['mean_km'], 3),
+            'max_km': round(row['max_km'], 3),
+        })
+    return {'precision': precision, 'radius_km': radius_km, 'cells': cells}
+
+
+def uncovered_locations(radius_km=None):
+    """Locations further than ``radius_km`` from every station, furthest first."""
+    if radius_km is None:
+        radius_km = default_radius_km()
+    return (LocationCoverage.objects
+            .filter(distance_km__gt=radius_km)
+            .select_related('location', 'station')
+            .order_by('-distance_km'))
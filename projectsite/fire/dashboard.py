@@ -0,0 +1,153 @@
+from collections import defaultdict
+from datetime import datetime
+
+from asgiref.sync import sync_to_async
+from django.db.models import Max, Sum
+from django.db.models.functions import ExtractMonth, ExtractYear
+
+from fire.models import Incident, IncidentRollup, Locations
+
+SERIES = ('pie', 'line', 'multiline', 'multibar')
+
+MONTH_NAMES = {1: 'Jan', 2: 'Feb', 3: 'Mar', 4: 'Apr', 5: 'May', 6: 'Jun', 7: 'Jul', 8: 'Aug', 9: 'Sep', 10: 'Oct', 11: 'Nov', 12: 'Dec'}
+MONTHS = [str(i).zfill(2) for i in range(1, 13)]
+
+
+def parse_series(value):
+    if not value:
+        return list(SERIES)
+    names = [name.strip() for name in value.split(',') if name.strip()]
+    unknown = [name for name in names if name not in SERIES]
+    if unknown:
+        raise ValueError(f"Unknown series: {', '.join(unknown)}")
+    return names
+
+
+def dashboard_state():
+    """Cheap fingerprint of the data behind the charts: newest edit plus total count.
+
+    Locations count as well as incidents, since moving a location to another
+    city or country moves its incidents to other buckets. The total comes from
+    the rollup so deletions change the fingerprint too.
+    """
+    stamps = [Incident.objects.aggregate(last=Max('updated_at'))['last'],
+              Locations.objects.aggregate(last=Max('updated_at'))['last']]
+    last_modified = max((stamp for stamp in stamps if stamp is not None), default=None)
+    total = IncidentRollup.objects.aggregate(total=Sum('count'))['total'] or 0
+    return last_modified, total
+
+
+def top_countries(by_country, limit=3):
+    # Ties go to the country that sorts first, as in analytics.top_country_months
+    return sorted(by_country, key=lambda country: (-by_country[country], country))[:limit]
+
+
+def compute_series(names, year=None):
+    year = year or datetime.now().year
+
+    # One pass over month-level buckets feeds every series.
+    rows = (IncidentRollup.objects
+            .annotate(year=ExtractYear('day'), month=ExtractMonth('day'))
+            .values('year', 'month', 'severity_level', 'country')
+            .annotate(total=Sum('count'))
+            .order_by())
+
+    by_severity = defaultdict(int)
+    by_month = defaultdict(int)
+    by_country = defaultdict(int)
+    by_country_month = defaultdict(lambda: defaultdict(int))
+    by_severity_month = defaultdict(lambda: defaultdict(int))
+
+    for row in rows:
+        total = row['total']
+        by_severity[row['severity_level']] += total
+        if row['month'] is None:
+            continue
+        month = str(row['month']).zfill(2)
+        by_severity_month[str(row['severity_level'])][month] += total
+        if row['year'] == year:
+            by_month[row['month']] += total
+            by_country[row['country']] += total
+            by_country_month[row['country']][month] += total
+
+    result = {}
+    if 'pie' in names:
+        result['pie'] = {level: by_severity[level] for level in sorted(by_severity)}
+    if 'line' in names:
+        result['line'] = {MONTH_NAMES[month]: by_month[month] for month in range(1, 13)}
+    if 'multiline' in names:
+        top = top_countries(by_country)
+        multiline = {country: {month: by_country_month[country][month] for month in MONTHS}
+                     for country in sorted(top)}
+        # Ensure there are always 3 countries in the result
+        while len(multiline) < 3:
+            multiline[f"Country {len(multiline) + 1}"] = {month: 0 for month in MONTHS}
+        result['multiline'] = multiline
+    if 'multibar' in names:
+        result['multibar'] = {level: {month: by_severity_month[level][month] for month in MONTHS}
+                              for level in by_severity_month}
+    return result
+
+
+#-----------------Per-series queries (async chart endpoint)--------------------------------
+
+def series_queryset(name, year):
+    """The rollup query behind one series on its own, for fetching a single chart."""
+    if name == 'pie':
+        return (IncidentRollup.objects.values('severity_level')
+                .annotate(total=Sum('count')).order_by('severity_level'))
+    if name == 'multibar':
+        return (IncidentRollup.objects.exclude(day__isnull=True)
+                .annotate(month=ExtractMonth('day'))
+                .values('severity_level', 'month').annotate(total=Sum('count')).order_by())
+    this_year = IncidentRollup.objects.filter(day__year=year).annotate(month=ExtractMonth('day'))
+    if name == 'line':
+        return this_year.values('month').annotate(total=Sum('count')).order_by()
+    if name == 'multiline':
+        return this_year.values('country', 'month').annotate(total=Sum('count')).order_by()
+    raise ValueError(f"Unknown series: {name}")
+
+
+def shape_series(name, rows):
+    """Turn the rows of ``series_queryset(name)`` into the same shape ``compute_series`` returns."""
+    if name == 'pie':
+        return {row['severity_level']: row['total'] for row in rows}
+    if name == 'line':
+        by_month = {row['month']: row['total'] for row in rows}
+        return {MONTH_NAMES[month]: by_month.get(month, 0) for month in range(1, 13)}
+    if name == 'multiline':
+        by_country = defaultdict(int)
+        by_country_month = defaultdict(lambda: defaultdict(int))
+        for row in rows:
+            by_country[row['country']] += row['total']
+            by_country_month[row['country']][str(row['month']).zfill(2)] += row['total']
+        top = top_countries(by_country)
+        multiline = {country: {month: by_country_month[country][month] for month in MONTHS}
+                     for country in sorted(top)}
+        while len(multiline) < 3:
+            multiline[f"Country {len(multiline) + 1}"] = {month: 0 for month in MONTHS}
+        return multiline
+    if name == 'multibar':
+        by_severity_month = defaultdict(lambda: defaultdict(int))
+        for row in rows:
+            by_severity_month[str(row['severity_level'])][str(row['month']).zfill(2)] += row['total']
+        return {level: {month: by_severity_month[level][month] for month in MONTHS}
+                for level in by_severity_month}
+    raise ValueError(f"Unknown series: {name}")
+
+
+async def afetch_series(name, year=None):
+    year = year or datetime.now().year
+    rows = [row async for row in series_queryset(name, year)]
+    return shape_series(name, rows)
+
+
+async def acompute_series(names, year=None):
+    """Async ``compute_series``. The async ORM runs every query on the same thread,
+    one after another, so the single pass over the rollup beats a query per series.
+    """
+    return await sync_to_async(compute_series)(names, year)
+
+
+async def adashboard_state():
+    return await sync_to_async(dashboard_state)()
@@ -0,0 +1,50 @@
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connections
+
+READ_ALIAS = 'read'
+
+
+def sqlite_pragmas(alias):
+    pragmas = dict(getattr(settings, 'FIRE_SQLITE_PRAGMAS', {}))
+    if alias == READ_ALIAS:
+        pragmas['query_only'] = 'ON'
+    return pragmas
+
+
+def configure_connection(connection):
+    """Apply FIRE_SQLITE_PRAGMAS to a freshly opened SQLite connection."""
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for name, value in sqlite_pragmas(connection.alias).items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+
+
+def use_sqlite_file(path):
+    """Point the default connection, and the read connection if there is one, at another SQLite file."""
+    connections.close_all()
+    connections['default'].settings_dict['NAME'] = path
+    if READ_ALIAS in settings.DATABASES:
+        connections[READ_ALIAS].settings_dict['NAME'] = f'{Path(path).resolve().as_uri()}?mode=ro'
+
+
+class ReadRouter:
+    """Send reads to the read-only connection, except inside a write transaction,
+    where they must see that transaction's own uncommitted rows.
+    """
+
+    def db_for_read(self, model, **hints):
+        if connections['default'].in_atomic_block:
+            return 'default'
+        return READ_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == 'default'
@@ -0,0 +1,107 @@
+from django.db.models import Count
+
+from fire import cache, spatial
+from fire.models import FireStation, Firefighters, FireTruck
+
+# What each severity needs on scene: (trucks, firefighters)
+SEVERITY_NEEDS = {
+    'Minor Fire': (1, 2),
+    'Moderate Fire': (2, 6),
+    'Major Fire': (4, 12),
+}
+# Stations looked at around the incident before ranking
+CANDIDATES = 25
+
+RANKS = [rank for rank, _ in Firefighters.RANK_CHOICES]
+EXPERIENCE_LEVELS = [level for level, _ in Firefighters.XP_CHOICES]
+SENIOR_EXPERIENCE = {'Advanced', 'Expert'}
+
+
+def empty_summary():
+    return {
+        'trucks': [],
+        'truck_capacity': 0,
+        'firefighters': 0,
+        'senior_firefighters': 0,
+        'ranks': {},
+        'experience': {},
+    }
+
+
+def build_summaries():
+    """Per-station trucks and crew mix, from one pass over each table."""
+    summaries = {}
+    trucks = FireTruck.objects.values_list('station_id', 'id', 'truck_number', 'capacity').order_by()
+    for station_id, pk, number, capacity in trucks.iterator():
+        summary = summaries.setdefault(station_id, empty_summary())
+        summary['trucks'].append({'id': pk, 'truck_number': number, 'capacity': capacity})
+        summary['truck_capacity'] += capacity
+    crews = (Firefighters.objects
+             .values('station_id', 'rank', 'experience_level')
+             .annotate(total=Count('id'))
+             .order_by())
+    for row in crews:
+        summary = summaries.setdefault(row['station_id'], empty_summary())
+        summary['firefighters'] += row['total']
+        if row['rank']:
+            summary['ranks'][row['rank']] = summary['ranks'].get(row['rank'], 0) + row['total']
+        if row['experience_level']:
+            level = row['experience_level']
+            summary['experience'][level] = summary['experience'].get(level, 0) + row['total']
+            if level in SENIOR_EXPERIENCE:
+                summary['senior_firefighters'] += row['total']
+    for summary in summaries.values():
+        summary['trucks'].sort(key=lambda truck: (-truck['capacity'], truck['truck_number']))
+    return summaries
+
+
+# Built lazily in each worker process and rebuilt once a station, truck or
+# firefighter version moves, whichever process saved the change.
+_summaries = cache.VersionedMemo(build_summaries, FireStation, FireTruck, Firefighters)
+
+
+def station_summaries():
+    return _summaries.get()
+
+
+def invalidate_station_summaries():
+    _summaries.clear()
+
+
+def candidate(station, distance, summary, needs):
+    trucks_needed, crew_needed = needs
+    return {
+        **station,
+        'distance_km': round(distance, 3),
+        'trucks': summary['trucks'],
+        'truck_capacity': summary['truck_capacity'],
+        'firefighters': summary['firefighters'],
+        'senior_firefighters': summary['senior_firefighters'],
+        'ranks': {rank: summary['ranks'][rank] for rank in RANKS if rank in summary['ranks']},
+        'experience': {level: summary['experience'][level]
+                       for level in EXPERIENCE_LEVELS if level in summary['experience']},
+        'meets_needs': len(summary['trucks']) >= trucks_needed and summary['firefighters'] >= crew_needed,
+    }
+
+
+def recommend(location, severity_level=None, limit=5, candidates=CANDIDATES):
+    """Rank the stations nearest a Locations row or (lat, lon) pair as responders.
+
+    Stations whose trucks and crew cover what ``severity_level`` needs come
+    first, nearest first; stations short of resources follow, also by distance,
+    and stations with neither trucks nor crew are left out.
+    """
+    latitude, longitude = spatial.coordinates(location)
+    if latitude is None or longitude is None:
+        return []
+    needs = SEVERITY_NEEDS.get(severity_level, (1, 1))
+    summaries = station_summaries()
+    ranked = []
+    for distance, station in spatial.station_index().nearest(latitude, longitude, max(limit, candidates)):
+        summary = summaries.get(station['id'])
+        if summary is None:
+            continue
+        ranked.append(candidate(station, distance, summary, needs))
+    ranked.sort(key=lambda station: (not station['meets_needs'], station['distance_km']))
+    return ranked[:limit]
+
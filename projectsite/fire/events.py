@@ -0,0 +1,164 @@
+import asyncio
+import json
+import threading
+from collections import deque
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+
+from fire.models import FireTruck, Incident, WeatherConditions
+
+# Events kept for Last-Event-ID replay; a client further behind gets a reset instead.
+BUFFER_SIZE = getattr(settings, 'FIRE_EVENT_BUFFER', 1000)
+# Bulk writes touching more rows than this send one reset rather than a flood of deltas.
+BULK_THRESHOLD = 50
+
+EVENT_TYPES = {
+    Incident: 'incident',
+    WeatherConditions: 'weather',
+    FireTruck: 'truck',
+}
+
+
+class EventBus:
+    """In-process publish/subscribe with a replay buffer.
+
+    Publishing happens on request threads; every subscriber is an asyncio queue,
+    fed through its own event loop. Clients connected to other processes do not
+    see these events.
+    """
+
+    def __init__(self, size=BUFFER_SIZE):
+        self.lock = threading.Lock()
+        self.buffer = deque(maxlen=size)
+        self.last_id = 0
+        self.subscribers = set()
+
+    def publish(self, event_type, data):
+        with self.lock:
+            self.last_id += 1
+            event = (self.last_id, event_type, json.dumps(data, cls=DjangoJSONEncoder))
+            self.buffer.append(event)
+            subscribers = list(self.subscribers)
+        closed = []
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, event)
+            except RuntimeError:
+                # The subscriber's loop has shut down without unsubscribing
+                closed.append(queue)
+        for queue in closed:
+            self.unsubscribe(queue)
+        return event[0]
+
+    def replay(self, last_event_id):
+        """Buffered events after ``last_event_id``, or None when the client missed
+        events that have already been dropped and has to reload instead.
+        """
+        with self.lock:
+            if last_event_id > self.last_id or (self.buffer and last_event_id < self.buffer[0][0] - 1):
+                return None
+            return [event for event in self.buffer if event[0] > last_event_id]
+
+    def subscribe(self):
+        queue = asyncio.Queue()
+        with self.lock:
+            self.subscribers.add((asyncio.get_running_loop(), queue))
+        return queue
+
+    def unsubscribe(self, queue):
+        with self.lock:
+            self.subscribers = {(loop, q) for loop, q in self.subscribers if q is not queue}
+
+
+bus = EventBus()
+
+
+def incident_values(incident):
+    location = incident.location
+    return {
+        'date_time': incident.date_time,
+        'severity_level': incident.severity_level,
+        'description': incident.description,
+        'location': location.name,
+        'city': location.city,
+        'country': location.country,
+        'latitude': location.latitude,
+        'longitude': location.longitude,
+        'geohash': location.geohash,
+    }
+
+
+def weather_values(weather):
+    return {
+        'incident': weather.incident_id,
+        'temperature': weather.temperature,
+        'humidity': weather.humidity,
+        'wind_speed': weather.wind_speed,
+        'weather_description': weather.weather_description,
+    }
+
+
+def truck_values(truck):
+    return {
+        'truck_number': truck.truck_number,
+        'model': truck.model,
+        'capacity': truck.capacity,
+        'station': truck.station_id,
+    }
+
+
+SERIALIZERS = {
+    Incident: incident_values,
+    WeatherConditions: weather_values,
+    FireTruck: truck_values,
+}
+
+
+def publish_change(instance, action, previous=None):
+    """Publish ``<type>.<action>`` for one row once the transaction commits.
+
+    ``previous`` holds the values an updated row had before, so clients can
+    take the old row out of their totals before adding the new one.
+    """
+    model = type(instance)
+    values = SERIALIZERS[model](instance)
+    data = {
+        'id': instance.pk,
+        'previous': values if action == 'deleted' else previous,
+        'current': None if action == 'deleted' else values,
+    }
+    transaction.on_commit(lambda: bus.publish(f'{EVENT_TYPES[model]}.{action}', data))
+
+
+def snapshot(model, pks):
+    """``{pk: values}`` for the given rows, serialized as the live feed sends them."""
+    queryset = model._default_manager.filter(pk__in=pks)
+    if model is Incident:
+        queryset = queryset.select_related('location')
+    return {instance.pk: SERIALIZERS[model](instance) for instance in queryset}
+
+
+def publish_bulk(model, pks, action='created', previous=None):
+    """Announce rows written without signals (imports, generated data, bulk actions).
+
+    ``previous`` is a ``snapshot`` taken before an update or delete.
+    """
+    if model not in EVENT_TYPES or not pks:
+        return
+    if len(pks) > BULK_THRESHOLD:
+        bus.publish('reset', {'model': EVENT_TYPES[model], 'count': len(pks)})
+        return
+    previous = previous or {}
+    current = snapshot(model, pks) if action != 'deleted' else {}
+    for pk in pks:
+        if action != 'deleted' and pk not in current:
+            continue
+        bus.publish(f'{EVENT_TYPES[model]}.{action}',
+                    {'id': pk, 'previous': previous.get(pk), 'current': current.get(pk)})
+
+
+def format_event(event):
+    event_id, event_type, data = event
+    return f'id: {event_id}\nevent: {event_type}\ndata: {data}\n\n'
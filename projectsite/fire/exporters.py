@@ -0,0 +1,87 @@
+import csv
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from fire import search
+from fire.models import FireStation, FireTruck, Firefighters, Incident, Locations, WeatherConditions
+
+FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+# kind -> (model, [(column, field path)]); related rows are joined in the same query
+EXPORTS = {
+    'locations': (Locations, [
+        ('id', 'id'), ('name', 'name'), ('address', 'address'), ('city', 'city'), ('country', 'country'),
+        ('latitude', 'latitude'), ('longitude', 'longitude'), ('created_at', 'created_at'),
+    ]),
+    'incidents': (Incident, [
+        ('id', 'id'), ('date_time', 'date_time'), ('severity_level', 'severity_level'),
+        ('description', 'description'), ('location_id', 'location_id'), ('location_name', 'location__name'),
+        ('address', 'location__address'), ('city', 'location__city'), ('country', 'location__country'),
+        ('latitude', 'location__latitude'), ('longitude', 'location__longitude'),
+        # One line per weather reading; incidents without one still get a line.
+        ('weather_id', 'weatherconditions__id'), ('temperature', 'weatherconditions__temperature'),
+        ('humidity', 'weatherconditions__humidity'), ('wind_speed', 'weatherconditions__wind_speed'),
+        ('weather_description', 'weatherconditions__weather_description'), ('created_at', 'created_at'),
+    ]),
+    'stations': (FireStation, [
+        ('id', 'id'), ('name', 'name'), ('address', 'address'), ('city', 'city'), ('country', 'country'),
+        ('latitude', 'latitude'), ('longitude', 'longitude'), ('created_at', 'created_at'),
+    ]),
+    'firefighters': (Firefighters, [
+        ('id', 'id'), ('name', 'name'), ('rank', 'rank'), ('experience_level', 'experience_level'),
+        ('station_id', 'station_id'), ('station_name', 'station__name'), ('created_at', 'created_at'),
+    ]),
+    'trucks': (FireTruck, [
+        ('id', 'id'), ('truck_number', 'truck_number'), ('model', 'model'), ('capacity', 'capacity'),
+        ('station_id', 'station_id'), ('station_name', 'station__name'), ('created_at', 'created_at'),
+    ]),
+    'weather': (WeatherConditions, [
+        ('id', 'id'), ('incident_id', 'incident_id'), ('location_name', 'incident__location__name'),
+        ('temperature', 'temperature'), ('humidity', 'humidity'), ('wind_speed', 'wind_speed'),
+        ('weather_description', 'weather_description'), ('created_at', 'created_at'),
+    ]),
+}
+
+
+def export_rows(kind, query=None, chunk_size=2000):
+    """Yield the header and then one tuple per row, fetched ``chunk_size`` at a time."""
+    model, columns = EXPORTS[kind]
+    qs = model._default_manager.all()
+    if query:
+        qs = search.search(qs, query, ranked=False)
+    yield tuple(name for name, path in columns)
+    # values_list() skips model instances, and iterator() never fills the result cache.
+    yield from qs.order_by('pk').values_list(*(path for name, path in columns)).iterator(chunk_size=chunk_size)
+
+
+class _Echo:
+    """File-like object whose write() hands the line straight back."""
+
+    def write(self, value):
+        return value
+
+
+def render_csv(rows):
+    writer = csv.writer(_Echo())
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def render_ndjson(rows):
+    header = next(rows)
+    for row in rows:
+        yield json.dumps(dict(zip(header, row)), cls=DjangoJSONEncoder) + '\n'
+
+
+RENDERERS = {
+    'csv': render_csv,
+    'ndjson': render_ndjson,
+}
+
+
+def stream(kind, fmt, query=None):
+    return RENDERERS[fmt](export_rows(kind, query))
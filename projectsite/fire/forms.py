@@ -38,3 +38,8 @@ class WeatherConForm(ModelForm):
         model = WeatherConditions
         fields = "__all__"
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Each incident option is labelled with its location
+        self.fields['incident'].queryset = Incident.objects.select_related('location')
+
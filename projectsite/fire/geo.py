@@ -0,0 +1,115 @@
+import math
+
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+GEOHASH_PRECISION = 12
+EARTH_RADIUS_KM = 6371.0088
+
+# Upper bound for range scans over a geohash prefix: sorts after every base32 character.
+PREFIX_END = '~'
+
+
+def encode(latitude, longitude, precision=GEOHASH_PRECISION):
+    if latitude is None or longitude is None:
+        return ''
+    latitude, longitude = float(latitude), float(longitude)
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    chars = []
+    bit = ch = 0
+    even = True
+    while len(chars) < precision:
+        rng, value = (lon_range, longitude) if even else (lat_range, latitude)
+        mid = (rng[0] + rng[1]) / 2
+        if value >= mid:
+            ch |= 1 << (4 - bit)
+            rng[0] = mid
+        else:
+            rng[1] = mid
+        even = not even
+        if bit < 4:
+            bit += 1
+        else:
+            chars.append(BASE32[ch])
+            bit = ch = 0
+    return ''.join(chars)
+
+
+def decode_bounds(geohash):
+    """Return the (south, west, north, east) corners of a geohash cell."""
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    even = True
+    for char in geohash:
+        bits = BASE32.index(char)
+        for shift in range(4, -1, -1):
+            rng = lon_range if even else lat_range
+            mid = (rng[0] + rng[1]) / 2
+            if bits >> shift & 1:
+                rng[0] = mid
+            else:
+                rng[1] = mid
+            even = not even
+    return lat_range[0], lon_range[0], lat_range[1], lon_range[1]
+
+
+def cell_size(precision):
+    """Return the (lat, lon) size in degrees of a geohash cell."""
+    bits = precision * 5
+    lon_bits = (bits + 1) // 2
+    lat_bits = bits // 2
+    return 180.0 / (1 << lat_bits), 360.0 / (1 << lon_bits)
+
+
+def covering_cells(south, west, north, east, precision):
+    lat_step, lon_step = cell_size(precision)
+    cells = set()
+    lat = south
+    while True:
+        lon = west
+        while True:
+            cells.add(encode(min(lat, 90.0), min(lon, 180.0), precision))
+            if lon >= east:
+                break
+            lon = min(lon + lon_step, east)
+        if lat >= north:
+            break
+        lat = min(lat + lat_step, north)
+    return cells
+
+
+def covering_prefixes(south, west, north, east, max_cells=32):
+    """Pick the finest geohash precision whose cover of the box stays small."""
+    best = {''}
+    for precision in range(1, GEOHASH_PRECISION + 1):
+        lat_step, lon_step = cell_size(precision)
+        estimate = ((north - south) / lat_step + 2) * ((east - west) / lon_step + 2)
+        if estimate > max_cells:
+            break
+        best = covering_cells(south, west, north, east, precision)
+    return best
+
+
+def zoom_precision(zoom):
+    """Geohash length to cluster on for a web-map zoom level."""
+    if zoom <= 2:
+        return 1
+    if zoom <= 4:
+        return 2
+    if zoom <= 7:
+        return 3
+    if zoom <= 9:
+        return 4
+    if zoom <= 12:
+        return 5
+    if zoom <= 14:
+        return 6
+    if zoom <= 16:
+        return 7
+    return 8
+
+
+def haversine(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(math.radians, (float(lat1), float(lon1), float(lat2), float(lon2)))
+    a = (math.sin((lat2 - lat1) / 2) ** 2
+         + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
@@ -0,0 +1,228 @@
+import codecs
+import csv
+import json
+from collections import OrderedDict
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from fire import cache, events, rollups, search
+from fire.models import Incident, Locations, WeatherConditions
+
+FORMATS = ('csv', 'ndjson')
+# Raised mid-stream by an upload that isn't valid UTF-8 or CSV; batches before it are already saved
+READ_ERRORS = (UnicodeDecodeError, csv.Error)
+
+
+def guess_format(filename, default='csv'):
+    name = (filename or '').lower()
+    if name.endswith(('.ndjson', '.jsonl', '.json')):
+        return 'ndjson'
+    if name.endswith('.csv'):
+        return 'csv'
+    return default
+
+
+def iter_records(stream, fmt):
+    """Lazily yield ``(line_number, dict)`` from a binary stream."""
+    text = codecs.getreader('utf-8-sig')(stream)
+    if fmt == 'csv':
+        reader = csv.DictReader(text)
+        for record in reader:
+            yield reader.line_num, record
+    elif fmt == 'ndjson':
+        for line_number, line in enumerate(text, start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as exc:
+                yield line_number, exc
+                continue
+            yield line_number, record if isinstance(record, dict) else ValueError('Expected a JSON object')
+    else:
+        raise ValueError(f'Unknown format: {fmt}')
+
+
+class LRUCache(OrderedDict):
+    def __init__(self, maxsize):
+        super().__init__()
+        self.maxsize = maxsize
+
+    def get(self, key, default=None):
+        if key in self:
+            self.move_to_end(key)
+            return self[key]
+        return default
+
+    def put(self, key, value):
+        self[key] = value
+        self.move_to_end(key)
+        if len(self) > self.maxsize:
+            self.popitem(last=False)
+
+
+class BaseImporter:
+    model = None
+    # model fields validated straight from the record
+    fields = ()
+    max_errors_per_batch = 100
+
+    def __init__(self, batch_size=1000):
+        self.batch_size = batch_size
+
+    def clean_fields(self, record):
+        values, errors = {}, {}
+        for name in self.fields:
+            field = self.model._meta.get_field(name)
+            raw = record.get(name)
+            if isinstance(raw, str):
+                raw = raw.strip()
+            if raw in ('', None):
+                raw = None if field.null else ''
+            try:
+                values[name] = field.clean(raw, None)
+            except ValidationError as exc:
+                errors[name] = exc.messages
+        return values, errors
+
+    def build(self, record):
+        """Return an unsaved instance, or raise ValidationError."""
+        values, errors = self.clean_fields(record)
+        values.update(self.resolve_relations(record, errors))
+        if errors:
+            raise ValidationError(errors)
+        return self.model(**values)
+
+    def resolve_relations(self, record, errors):
+        return {}
+
+    def prepare_batch(self, objects):
+        """Last chance to drop rows that need a look at the whole batch; returns errors."""
+        return {}
+
+    def after_batch(self, pks):
+        search.index_objects(self.model, pks)
+        cache.invalidate(self.model)
+        transaction.on_commit(lambda: events.publish_bulk(self.model, pks))
+
+    def run(self, records):
+        """Import ``(line, record)`` pairs, yielding one report per batch."""
+        batch, errors, number = [], [], 0
+        for line, record in records:
+            try:
+                if isinstance(record, Exception):
+                    raise ValidationError(str(record))
+                batch.append((line, self.build(record)))
+            except ValidationError as exc:
+                errors.append({'line': line, 'errors': exc.message_dict if hasattr(exc, 'error_dict') else exc.messages})
+            if len(batch) + len(errors) >= self.batch_size:
+                number += 1
+                yield self.write_batch(number, batch, errors)
+                batch, errors = [], []
+        if batch or errors:
+            number += 1
+            yield self.write_batch(number, batch, errors)
+
+    def write_batch(self, number, batch, errors):
+        rejected = self.prepare_batch(batch)
+        for line, messages in rejected.items():
+            errors.append({'line': line, 'errors': messages})
+        objects = [obj for line, obj in batch if line not in rejected]
+        with transaction.atomic():
+            created = self.model.objects.bulk_create(objects)
+            self.after_batch([obj.pk for obj in created])
+        errors.sort(key=lambda error: error['line'])
+        return {
+            'batch': number,
+            'rows': len(batch) + len(errors) - len(rejected),
+            'created': len(created),
+            'failed': len(errors),
+            'errors': errors[:self.max_errors_per_batch],
+        }
+
+
+class IncidentImporter(BaseImporter):
+    """Rows carry the location's natural key (``location_name``, ``city``, ``country``)
+    or a ``location_id``; unknown locations are created when ``address`` is given.
+    """
+    model = Incident
+    fields = ('date_time', 'severity_level', 'description')
+
+    def __init__(self, batch_size=1000, cache_size=50000):
+        super().__init__(batch_size)
+        self.locations = LRUCache(cache_size)
+
+    def resolve_relations(self, record, errors):
+        if record.get('location_id'):
+            try:
+                location_id = int(record['location_id'])
+            except (TypeError, ValueError):
+                errors['location_id'] = ['Enter a whole number.']
+                return {}
+            return {'location_id': location_id}
+
+        key = tuple(str(record.get(name) or '').strip() for name in ('location_name', 'city', 'country'))
+        if not all(key):
+            errors['location'] = ['location_id or location_name, city and country are required.']
+            return {}
+        location_id = self.locations.get(key)
+        if location_id is None:
+            name, city, country = key
+            location_id = (Locations.objects.filter(name=name, city=city, country=country)
+                           .values_list('id', flat=True).first())
+            if location_id is None:
+                location_id = self.create_location(record, key, errors)
+                if location_id is None:
+                    return {}
+            self.locations.put(key, location_id)
+        return {'location_id': location_id}
+
+    def create_location(self, record, key, errors):
+        address = str(record.get('address') or '').strip()
+        if not address:
+            errors['location'] = [f'Unknown location {", ".join(key)}; include an address to create it.']
+            return None
+        location = Locations(name=key[0], city=key[1], country=key[2], address=address,
+                             latitude=record.get('latitude') or None, longitude=record.get('longitude') or None)
+        try:
+            location.full_clean()
+        except ValidationError as exc:
+            errors.update({f'location_{name}': messages for name, messages in exc.message_dict.items()})
+            return None
+        location.save()
+        return location.pk
+
+    def prepare_batch(self, batch):
+        location_ids = {obj.location_id for line, obj in batch}
+        known = set(Locations.objects.filter(pk__in=location_ids).values_list('id', flat=True))
+        return {line: {'location_id': [f'Location {obj.location_id} does not exist.']}
+                for line, obj in batch if obj.location_id not in known}
+
+    def after_batch(self, pks):
+        super().after_batch(pks)
+        rollups.add_incidents(Incident.objects.filter(pk__in=pks))
+
+
+class WeatherImporter(BaseImporter):
+    model = WeatherConditions
+    fields = ('temperature', 'humidity', 'wind_speed', 'weather_description')
+
+    def resolve_relations(self, record, errors):
+        try:
+            return {'incident_id': int(record.get('incident_id'))}
+        except (TypeError, ValueError):
+            errors['incident_id'] = ['Enter a whole number.']
+            return {}
+
+    def prepare_batch(self, batch):
+        incident_ids = {obj.incident_id for line, obj in batch}
+        known = set(Incident.objects.filter(pk__in=incident_ids).values_list('id', flat=True))
+        return {line: {'incident_id': [f'Incident {obj.incident_id} does not exist.']}
+                for line, obj in batch if obj.incident_id not in known}
+
+
+IMPORTERS = {
+    'incidents': IncidentImporter,
+    'weather': WeatherImporter,
+}
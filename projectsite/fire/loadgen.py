@@ -0,0 +1,104 @@
+"""Row generation for the generate_load_data command.
+
+Worker processes import this module on their own, and with the 'spawn' start
+method (the default on macOS and Windows) Django is not set up in them, so
+nothing here may touch Django; the command turns the rows into model
+instances and writes them.
+"""
+import math
+import random
+from datetime import timedelta
+
+from fire import geo
+
+# (city, country, latitude, longitude, weight): incidents cluster around dense cities
+HOTSPOTS = [
+    ('Puerto Princesa', 'Philippines', 9.7392, 118.7353, 30),
+    ('Manila', 'Philippines', 14.5995, 120.9842, 25),
+    ('Quezon City', 'Philippines', 14.6760, 121.0437, 20),
+    ('Cebu City', 'Philippines', 10.3157, 123.8854, 12),
+    ('Davao City', 'Philippines', 7.1907, 125.4553, 10),
+    ('Jakarta', 'Indonesia', -6.2088, 106.8456, 8),
+    ('Kuala Lumpur', 'Malaysia', 3.1390, 101.6869, 6),
+    ('Bangkok', 'Thailand', 13.7563, 100.5018, 6),
+    ('Ho Chi Minh City', 'Vietnam', 10.8231, 106.6297, 5),
+    ('Singapore', 'Singapore', 1.3521, 103.8198, 3),
+]
+# Dry season (Feb-May) sees far more fires than the rainy months.
+MONTH_WEIGHTS = [6, 9, 12, 13, 10, 6, 4, 4, 4, 5, 6, 7]
+SEVERITY_WEIGHTS = [('Minor Fire', 60), ('Moderate Fire', 30), ('Major Fire', 10)]
+WEATHER = ['Sunny', 'Cloudy', 'Windy', 'Hazy', 'Humid', 'Clear', 'Overcast', 'Drizzle']
+PLACE_WORDS = ['Market', 'Plaza', 'Heights', 'Village', 'Terminal', 'Warehouse', 'Mall', 'School',
+               'Barangay Hall', 'Port', 'Residences', 'Depot', 'Church', 'Hospital', 'Park']
+STREETS = ['Rizal Ave', 'Malvar St', 'Mabini St', 'Bonifacio Rd', 'Roxas Blvd', 'Luna St', 'Burgos St']
+TRUCK_MODELS = ['Toyota fire', 'Tesla', 'Misyubibi fire engine']
+FIRST_NAMES = ['Juan', 'Maria', 'Jose', 'Ana', 'Mark', 'Grace', 'Paolo', 'Liza', 'Ramon', 'Joy']
+LAST_NAMES = ['Santos', 'Reyes', 'Cruz', 'Bautista', 'Garcia', 'Mendoza', 'Torres', 'Flores']
+
+# Primary keys and choices shared with worker processes through the pool initializer
+_shared = {}
+
+
+def _init_worker(shared):
+    _shared.update(shared)
+
+
+def _rng(seed, kind, chunk):
+    return random.Random(f"{seed}:{kind}:{chunk}")
+
+
+def _place(rnd, spread):
+    city, country, lat, lon, _ = rnd.choices(HOTSPOTS, weights=[h[4] for h in HOTSPOTS])[0]
+    lat = max(-90.0, min(90.0, rnd.gauss(lat, spread)))
+    lon = max(-180.0, min(180.0, rnd.gauss(lon, spread)))
+    return city, country, round(lat, 6), round(lon, 6)
+
+
+def _skewed_index(rnd, size):
+    # Squaring a uniform draw piles incidents onto a minority of locations.
+    return min(size - 1, int(size * rnd.random() ** 2))
+
+
+def generate_chunk(task):
+    kind, chunk, count, seed, options = task
+    rnd = _rng(seed, kind, chunk)
+    rows = []
+    if kind in ('locations', 'stations'):
+        for _ in range(count):
+            city, country, lat, lon = _place(rnd, 0.08 if kind == 'locations' else 0.05)
+            name = (f"{rnd.choice(PLACE_WORDS)} {rnd.randint(1, 999)}" if kind == 'locations'
+                    else f"{city} Fire Station {rnd.randint(1, 99)}")
+            rows.append((name, lat, lon, f"{rnd.randint(1, 999)} {rnd.choice(STREETS)}", city, country,
+                         geo.encode(lat, lon)))
+    elif kind == 'incidents':
+        location_ids = _shared['location_ids']
+        start, days = options['start'], options['days']
+        end = start + timedelta(days=days)
+        years = max(1, math.ceil(days / 365))
+        severities, severity_weights = zip(*SEVERITY_WEIGHTS)
+        for _ in range(count):
+            # Later years are busier, and months follow the dry-season curve.
+            year_offset = min(years - 1, int(years * math.sqrt(rnd.random())))
+            month = rnd.choices(range(1, 13), weights=MONTH_WEIGHTS)[0]
+            day = start + timedelta(days=year_offset * 365 + (month - 1) * 30 + rnd.randint(0, 29))
+            if day > end:
+                day -= timedelta(days=365)
+            rows.append((location_ids[_skewed_index(rnd, len(location_ids))], day,
+                         rnd.choices(severities, weights=severity_weights)[0],
+                         f"{rnd.choice(['Grass', 'Structure', 'Vehicle', 'Electrical', 'Rubbish'])} fire"))
+    elif kind in ('trucks', 'firefighters'):
+        station_ids = _shared['station_ids']
+        ranks, xps = _shared['ranks'], _shared['experience_levels']
+        for i in range(count):
+            station_id = rnd.choice(station_ids)
+            if kind == 'trucks':
+                rows.append((f"{chunk}-{i}", rnd.choice(TRUCK_MODELS), rnd.randint(1000, 5000), station_id))
+            else:
+                rows.append((f"{rnd.choice(FIRST_NAMES)} {rnd.choice(LAST_NAMES)}", rnd.choice(ranks),
+                             rnd.choice(xps), station_id))
+    elif kind == 'weather':
+        low, high = _shared['incident_range']
+        for _ in range(count):
+            rows.append((rnd.randint(low, high), round(rnd.uniform(22, 40), 2), round(rnd.uniform(40, 95), 2),
+                         round(rnd.uniform(0, 60), 2), rnd.choice(WEATHER)))
+    return kind, rows
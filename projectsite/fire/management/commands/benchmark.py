@@ -0,0 +1,231 @@
+import json
+import math
+import os
+import platform
+import shutil
+import tempfile
+import time
+from contextlib import ExitStack
+from datetime import datetime, timezone
+from io import StringIO
+
+import django
+from django.apps import apps
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from fire import cache, db, dispatch, spatial
+
+LIST_VIEWS = [
+    'location-list',
+    'firestation-list',
+    'fireincident-list',
+    'firetruck-list',
+    'firefighter-list',
+    'weathercondition-list',
+]
+# A term that matches a good share of the generated rows of each list
+SEARCH_TERMS = {'weathercondition-list': 'Market'}
+DEFAULT_SEARCH_TERM = 'Manila'
+# Pages cache their responses; cold measurements have to reach the database every time.
+NO_CACHE = {
+    'CACHES': {'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}},
+    'FIRE_CACHE_ALIAS': 'default',
+    'ALLOWED_HOSTS': ['*'],
+}
+
+
+def endpoints():
+    """``(name, url)`` pairs to measure, in a stable order."""
+    # The four chart views share the url name 'chart', so they are listed by path.
+    urls = [
+        ('chart-pie', '/chart/'),
+        ('chart-line', '/lineChart/'),
+        ('chart-multiline', '/multilineChart/'),
+        ('chart-multibar', '/multiBarChart/'),
+        ('map-incidents', reverse('map-incidents')),
+        ('map-station', reverse('map-station')),
+    ]
+    for name in LIST_VIEWS:
+        url = reverse(name)
+        urls += [
+            (name, url),
+            (f'{name}?q', f'{url}?q={SEARCH_TERMS.get(name, DEFAULT_SEARCH_TERM)}'),
+            (f'{name}?page=last', f'{url}?page=last'),
+        ]
+    return urls
+
+
+def percentile(ordered, fraction):
+    # nearest-rank on an already sorted list
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+def summarize(timings, queries, status):
+    ordered = sorted(timings)
+    return {
+        'requests': len(ordered),
+        'status': status,
+        'queries': queries,
+        'min_ms': round(ordered[0], 3),
+        'p50_ms': round(percentile(ordered, 0.50), 3),
+        'p90_ms': round(percentile(ordered, 0.90), 3),
+        'p95_ms': round(percentile(ordered, 0.95), 3),
+        'p99_ms': round(percentile(ordered, 0.99), 3),
+        'max_ms': round(ordered[-1], 3),
+        'mean_ms': round(sum(ordered) / len(ordered), 3),
+    }
+
+
+def compare(results, baseline, tolerance, min_delta_ms):
+    """Return a list of human-readable regressions of ``results`` against ``baseline``."""
+    regressions = []
+    for scale, measured in results['scales'].items():
+        for name, current in measured.items():
+            previous = baseline.get('scales', {}).get(scale, {}).get(name)
+            if previous is None:
+                continue
+            slower = current['p95_ms'] - previous['p95_ms']
+            if slower > min_delta_ms and current['p95_ms'] > previous['p95_ms'] * (1 + tolerance):
+                regressions.append(f"{scale} {name}: p95 {previous['p95_ms']}ms -> {current['p95_ms']}ms")
+            if current['queries'] > previous['queries']:
+                regressions.append(f"{scale} {name}: queries {previous['queries']} -> {current['queries']}")
+    return regressions
+
+
+class Command(BaseCommand):
+    help = 'Seed databases at several incident counts and measure latency and query counts of the hot endpoints'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scales', default='10000,100000,1000000',
+                            help='Comma-separated incident counts, e.g. 10000,100000,1000000')
+        parser.add_argument('--requests', type=int, default=30, help='Timed requests per endpoint')
+        parser.add_argument('--warmup', type=int, default=3, help='Untimed requests per endpoint')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--data-dir', default=None,
+                            help='Keep seeded databases here and reuse them on later runs')
+        parser.add_argument('--output', default=None, help='Write the JSON results to this file')
+        parser.add_argument('--baseline', default=None, help='Compare against a previous JSON result')
+        parser.add_argument('--tolerance', type=float, default=0.25,
+                            help='Allowed relative p95 slowdown before a run counts as a regression')
+        parser.add_argument('--min-delta-ms', type=float, default=2.0,
+                            help='Ignore p95 slowdowns smaller than this (timer noise)')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('The benchmark seeds throwaway SQLite databases; run it with the sqlite backend.')
+        try:
+            scales = [int(scale) for scale in options['scales'].split(',')]
+        except ValueError:
+            raise CommandError('--scales takes comma-separated integers')
+        baseline = None
+        if options['baseline']:
+            with open(options['baseline']) as f:
+                baseline = json.load(f)
+
+        data_dir = options['data_dir'] or tempfile.mkdtemp(prefix='fire-benchmark-')
+        os.makedirs(data_dir, exist_ok=True)
+        results = {
+            'meta': {
+                'started_at': datetime.now(timezone.utc).isoformat(),
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'platform': platform.platform(),
+                'requests': options['requests'],
+                'seed': options['seed'],
+            },
+            'scales': {},
+        }
+        original_name = connection.settings_dict['NAME']
+        try:
+            for scale in scales:
+                self.use_database(os.path.join(data_dir, f'bench_{scale}_{options["seed"]}.sqlite3'), scale, options)
+                results['scales'][str(scale)] = self.measure(options)
+        finally:
+            db.use_sqlite_file(original_name)
+            spatial.invalidate_station_index()
+            dispatch.invalidate_station_summaries()
+            cache.bump(*apps.get_app_config('fire').get_models())
+            if not options['data_dir']:
+                shutil.rmtree(data_dir, ignore_errors=True)
+
+        output = json.dumps(results, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output + '\n')
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+        else:
+            self.stdout.write(output)
+
+        if baseline is not None:
+            regressions = compare(results, baseline, options['tolerance'], options['min_delta_ms'])
+            if regressions:
+                raise CommandError('Regressions against baseline:\n  ' + '\n  '.join(regressions))
+            self.stdout.write(self.style.SUCCESS('No regressions against baseline'))
+
+    def use_database(self, path, scale, options):
+        db.use_sqlite_file(path)
+        spatial.invalidate_station_index()
+        dispatch.invalidate_station_summaries()
+        # Cached views from the previous database must not answer for this one.
+        cache.bump(*apps.get_app_config('fire').get_models())
+        if os.path.exists(path):
+            self.stdout.write(f'Reusing {path}')
+            return
+        self.stdout.write(f'Seeding {scale} incidents into {path}...')
+        started = time.perf_counter()
+        call_command('migrate', verbosity=0)
+        call_command('set_journal_mode', 'WAL', stdout=StringIO())
+        call_command('generate_load_data', incidents=scale, locations=max(100, scale // 10),
+                     stations=max(20, scale // 1000), seed=options['seed'], stdout=StringIO())
+        self.stdout.write(f'  seeded in {time.perf_counter() - started:.1f}s')
+
+    def measure(self, options):
+        """Time every endpoint cold, with caching off, and warm, from the cache.
+
+        The top-level figures, which the baseline comparison gates on, are the cold
+        ones; a page served from the cache says nothing about its queries.
+        """
+        measured = {}
+        for name, url in endpoints():
+            with override_settings(**NO_CACHE):
+                measured[name] = self.time_requests(url, options)
+            with override_settings(ALLOWED_HOSTS=['*']):
+                warm = self.time_requests(url, options)
+            measured[name]['warm'] = {key: warm[key] for key in ('p50_ms', 'p95_ms', 'queries')}
+            self.stdout.write(f"  {name:40} p50 {measured[name]['p50_ms']:8.2f}ms  "
+                              f"p95 {measured[name]['p95_ms']:8.2f}ms  {measured[name]['queries']} queries  "
+                              f"(warm p50 {warm['p50_ms']:.2f}ms)")
+        return measured
+
+    @staticmethod
+    def time_requests(url, options):
+        client = Client()
+        for _ in range(options['warmup']):
+            client.get(url)
+        timings, queries = [], 0
+        executed = 0
+
+        def count(execute, sql, params, many, context):
+            nonlocal executed
+            executed += 1
+            return execute(sql, params, many, context)
+
+        for _ in range(options['requests']):
+            executed = 0
+            # Reads may be routed to a connection other than the default one.
+            with ExitStack() as stack:
+                for db_connection in connections.all():
+                    stack.enter_context(db_connection.execute_wrapper(count))
+                started = time.perf_counter()
+                response = client.get(url)
+                timings.append((time.perf_counter() - started) * 1000)
+            if response.status_code != 200:
+                # An error page is usually fast and cheap; timing it would hide the breakage
+                raise CommandError(f'{url} answered {response.status_code}')
+            queries = max(queries, executed)
+        return summarize(timings, queries, response.status_code)
@@ -0,0 +1,162 @@
+import os
+import re
+import shutil
+import tempfile
+from contextlib import ExitStack
+from datetime import date
+from io import StringIO
+
+from django.apps import apps
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from fire import db, dispatch, spatial
+from fire.management.commands.benchmark import NO_CACHE, endpoints
+from fire.models import FireStation, FireTruck, Firefighters, Incident, Locations, WeatherConditions
+
+UPDATE_VIEWS = [
+    ('location-update', Locations),
+    ('firestation-update', FireStation),
+    ('fireincident-update', Incident),
+    ('firetruck-update', FireTruck),
+    ('firefighter-update', Firefighters),
+    ('weathercondition-update', WeatherConditions),
+]
+
+SQLITE_SCAN = re.compile(r'^SCAN (\w+)(.*)$')
+POSTGRES_SCAN = re.compile(r'Seq Scan on (\w+)')
+
+
+def audited_urls():
+    """``(name, url)`` pairs for every page and API view that reads the database."""
+    year = date.today().year
+    location = Locations.objects.order_by('pk').first()
+    urls = endpoints() + [
+        ('dashboard-api', reverse('dashboard-api')),
+        ('map-clusters', reverse('map-clusters') + '?zoom=8'),
+        ('map-clusters?city', reverse('map-clusters') + '?zoom=12&city=Manila&bounds=1'),
+        ('incident-analytics', reverse('incident-analytics') + f'?start={year}-01-01&end={year}-12-31'),
+        ('incident-analytics?group_by', reverse('incident-analytics')
+         + f'?start={year}-01-01&end={year}-12-31&granularity=week&group_by=city'),
+        ('sync', reverse('sync') + '?limit=100'),
+    ]
+    if location is not None:
+        urls.append(('nearest-stations', reverse('nearest-stations') + f'?location={location.pk}'))
+    for name, model in UPDATE_VIEWS:
+        obj = model._default_manager.order_by('pk').first()
+        if obj is not None:
+            urls.append((name, reverse(name, args=[obj.pk])))
+    return urls
+
+
+def explain(connection, sql, params):
+    """The query plan as a list of lines, for the backends we know how to read."""
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            return [row[3] for row in cursor.fetchall()]
+        cursor.execute(f'EXPLAIN {sql}', params)
+        return [row[0] for row in cursor.fetchall()]
+
+
+def full_scans(plan, tables):
+    """Tables of ``tables`` the plan reads row by row rather than through an index."""
+    scanned = []
+    for line in plan:
+        if connection.vendor == 'sqlite':
+            match = SQLITE_SCAN.match(line.strip())
+            # "SCAN t USING INDEX i" walks an index; only a bare "SCAN t" reads the table.
+            if match and match.group(1) in tables and 'INDEX' not in match.group(2):
+                scanned.append(match.group(1))
+        else:
+            match = POSTGRES_SCAN.search(line)
+            if match and match.group(1) in tables:
+                scanned.append(match.group(1))
+    return scanned
+
+
+class Command(BaseCommand):
+    help = 'Run EXPLAIN on every query the views issue and flag full table scans'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--incidents', type=int, default=0,
+                            help='Audit a throwaway SQLite database seeded with this many incidents '
+                                 'instead of the configured one')
+        parser.add_argument('--all', action='store_true', help='Print the plan of every query, not only scans')
+        parser.add_argument('--fail-on-scan', action='store_true',
+                            help='Exit with an error when any query scans a table')
+
+    def handle(self, *args, **options):
+        if connection.vendor not in ('sqlite', 'postgresql'):
+            raise CommandError(f'Reading {connection.vendor} query plans is not supported.')
+        data_dir = None
+        original_name = connection.settings_dict['NAME']
+        try:
+            if options['incidents']:
+                if connection.vendor != 'sqlite':
+                    raise CommandError('--incidents creates a SQLite database; run it with the sqlite backend.')
+                data_dir = tempfile.mkdtemp(prefix='fire-explain-')
+                self.seed(os.path.join(data_dir, 'explain.sqlite3'), options['incidents'])
+            flagged = self.audit(options['all'])
+        finally:
+            if data_dir:
+                db.use_sqlite_file(original_name)
+                spatial.invalidate_station_index()
+                dispatch.invalidate_station_summaries()
+                shutil.rmtree(data_dir, ignore_errors=True)
+
+        if flagged and options['fail_on_scan']:
+            raise CommandError(f'{flagged} queries scan a table')
+        self.stdout.write(self.style.SUCCESS(f'Audit finished; {flagged} queries scan a table'))
+
+    def seed(self, path, incidents):
+        db.use_sqlite_file(path)
+        spatial.invalidate_station_index()
+        dispatch.invalidate_station_summaries()
+        self.stdout.write(f'Seeding {incidents} incidents into {path}...')
+        call_command('migrate', verbosity=0)
+        call_command('generate_load_data', incidents=incidents, locations=max(100, incidents // 10),
+                     stations=max(20, incidents // 1000), stdout=StringIO())
+
+    def audit(self, show_all):
+        tables = {model._meta.db_table for model in apps.get_app_config('fire').get_models()}
+        captured = []
+
+        def capture(execute, sql, params, many, context):
+            if sql.lstrip().upper().startswith('SELECT'):
+                captured.append((context['connection'], sql, params))
+            return execute(sql, params, many, context)
+
+        client = Client()
+        seen = set()
+        flagged = 0
+        with override_settings(**NO_CACHE):
+            for name, url in audited_urls():
+                captured.clear()
+                # Reads may be routed to a connection other than the default one.
+                with ExitStack() as stack:
+                    for db_connection in connections.all():
+                        stack.enter_context(db_connection.execute_wrapper(capture))
+                    response = client.get(url)
+                    if response.streaming:
+                        b''.join(response.streaming_content)
+                self.stdout.write(f'{name} [{response.status_code}] {len(captured)} queries')
+                for db_connection, sql, params in captured:
+                    if sql in seen:
+                        continue
+                    seen.add(sql)
+                    plan = explain(db_connection, sql, params)
+                    scanned = full_scans(plan, tables)
+                    if scanned:
+                        flagged += 1
+                        self.stdout.write(self.style.WARNING(f"  full scan of {', '.join(scanned)}:"))
+                    elif not show_all:
+                        continue
+                    self.stdout.write(f'    {sql}')
+                    for line in plan:
+                        self.stdout.write(f'      {line}')
+        return flagged
@@ -0,0 +1,129 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max, Min
+
+from fire import cache, coverage, dispatch, rollups, search, spatial
+from fire.loadgen import _init_worker, generate_chunk
+from fire.models import Incident, FireStation, Locations, FireTruck, Firefighters, WeatherConditions
+
+BUILDERS = {
+    'locations': lambda r: Locations(name=r[0], latitude=r[1], longitude=r[2], address=r[3], city=r[4],
+                                     country=r[5], geohash=r[6]),
+    'stations': lambda r: FireStation(name=r[0], latitude=r[1], longitude=r[2], address=r[3], city=r[4],
+                                      country=r[5], geohash=r[6]),
+    'incidents': lambda r: Incident(location_id=r[0], date_time=r[1], severity_level=r[2], description=r[3]),
+    'trucks': lambda r: FireTruck(truck_number=r[0], model=r[1], capacity=r[2], station_id=r[3]),
+    'firefighters': lambda r: Firefighters(name=r[0], rank=r[1], experience_level=r[2], station_id=r[3]),
+    'weather': lambda r: WeatherConditions(incident_id=r[0], temperature=r[1], humidity=r[2], wind_speed=r[3],
+                                           weather_description=r[4]),
+}
+MODELS = {
+    'locations': Locations, 'stations': FireStation, 'incidents': Incident,
+    'trucks': FireTruck, 'firefighters': Firefighters, 'weather': WeatherConditions,
+}
+
+
+class Command(BaseCommand):
+    help = 'Bulk-generate realistic synthetic data for load and capacity testing'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--locations', type=int, default=1000)
+        parser.add_argument('--stations', type=int, default=100)
+        parser.add_argument('--incidents', type=int, default=10000)
+        parser.add_argument('--trucks', type=int, default=None, help='Defaults to 3 per station')
+        parser.add_argument('--firefighters', type=int, default=None, help='Defaults to 15 per station')
+        parser.add_argument('--weather', type=float, default=0.5,
+                            help='Weather readings per incident (fraction)')
+        parser.add_argument('--years', type=int, default=3, help='Spread incidents over this many years')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+        parser.add_argument('--skip-derived', action='store_true',
+                            help='Do not rebuild the rollup, search index and station coverage afterwards')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        self.options = options
+        stations = options['stations']
+        counts = {
+            'locations': options['locations'],
+            'stations': stations,
+            'trucks': options['trucks'] if options['trucks'] is not None else stations * 3,
+            'firefighters': options['firefighters'] if options['firefighters'] is not None else stations * 15,
+            'incidents': options['incidents'],
+        }
+        counts['weather'] = int(counts['incidents'] * options['weather'])
+        today = date.today()
+        start = date(today.year - options['years'] + 1, 1, 1)
+        self.incident_options = {'start': start, 'days': (today - start).days}
+
+        shared = {
+            'ranks': [choice[0] for choice in Firefighters.RANK_CHOICES],
+            'experience_levels': [choice[0] for choice in Firefighters.XP_CHOICES],
+        }
+        self.generate('locations', counts['locations'], shared)
+        self.generate('stations', counts['stations'], shared)
+        shared['location_ids'] = list(Locations.objects.values_list('id', flat=True))
+        shared['station_ids'] = list(FireStation.objects.values_list('id', flat=True))
+        if counts['trucks'] or counts['firefighters']:
+            if not shared['station_ids']:
+                self.stderr.write('No fire stations to attach trucks and firefighters to')
+                counts['trucks'] = counts['firefighters'] = 0
+        self.generate('trucks', counts['trucks'], shared)
+        self.generate('firefighters', counts['firefighters'], shared)
+
+        if counts['incidents'] and not shared['location_ids']:
+            self.stderr.write('No locations to attach incidents to')
+            counts['incidents'] = counts['weather'] = 0
+        previous = Incident.objects.aggregate(top=Max('id'))['top'] or 0
+        self.generate('incidents', counts['incidents'], shared)
+        new = Incident.objects.filter(id__gt=previous).aggregate(low=Min('id'), high=Max('id'))
+        shared['incident_range'] = (new['low'], new['high'])
+        if new['low'] is None:
+            counts['weather'] = 0
+        self.generate('weather', counts['weather'], shared)
+
+        transaction.on_commit(spatial.invalidate_station_index)
+        transaction.on_commit(dispatch.invalidate_station_summaries)
+        cache.invalidate(*MODELS.values())
+        if not options['skip_derived']:
+            self.stdout.write('Rebuilding incident rollups, search index and station coverage...')
+            rollups.rebuild()
+            search.rebuild()
+            coverage.rebuild()
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            'Generated ' + ', '.join(f'{count} {kind}' for kind, count in counts.items()) + f' in {elapsed:.1f}s'))
+
+    def generate(self, kind, total, shared):
+        if total <= 0:
+            return
+        batch_size = self.options['batch_size']
+        tasks = [(kind, chunk, min(batch_size, total - offset), self.options['seed'], self.incident_options)
+                 for chunk, offset in enumerate(range(0, total, batch_size))]
+        model, build = MODELS[kind], BUILDERS[kind]
+
+        def write(rows):
+            with transaction.atomic():
+                model.objects.bulk_create([build(row) for row in rows], batch_size=batch_size)
+
+        started = time.perf_counter()
+        workers = self.options['workers']
+        if workers > 1 and len(tasks) > 1:
+            # Workers only generate rows (fire.loadgen never touches Django); SQLite has a
+            # single writer, so inserts stay here. A worker that dies or raises fails the
+            # command through map() rather than leaving it waiting.
+            with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(shared,)) as pool:
+                for _, rows in pool.map(generate_chunk, tasks):
+                    write(rows)
+        else:
+            _init_worker(shared)
+            for task in tasks:
+                write(generate_chunk(task)[1])
+        self.stdout.write(f'  {total} {kind} in {time.perf_counter() - started:.1f}s')
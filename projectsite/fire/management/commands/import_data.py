@@ -0,0 +1,39 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from fire import importers
+
+
+class Command(BaseCommand):
+    help = 'Stream a CSV or NDJSON file of incidents or weather readings into the database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(importers.IMPORTERS))
+        parser.add_argument('path', help="File to import, or '-' for stdin")
+        parser.add_argument('--format', choices=importers.FORMATS, default=None)
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or importers.guess_format(path)
+        importer = importers.IMPORTERS[options['kind']](batch_size=options['batch_size'])
+
+        stream = sys.stdin.buffer if path == '-' else None
+        try:
+            stream = stream or open(path, 'rb')
+        except OSError as exc:
+            raise CommandError(exc)
+
+        created = failed = 0
+        with stream:
+            try:
+                for report in importer.run(importers.iter_records(stream, fmt)):
+                    created += report['created']
+                    failed += report['failed']
+                    self.stdout.write(f"Batch {report['batch']}: {report['created']} created, {report['failed']} failed")
+                    for error in report['errors']:
+                        self.stderr.write(f"  line {error['line']}: {error['errors']}")
+            except importers.READ_ERRORS as exc:
+                raise CommandError(f'Could not read {path} after importing {created} rows: {exc}')
+        self.stdout.write(self.style.SUCCESS(f'Successfully imported {created} rows ({failed} rejected)'))
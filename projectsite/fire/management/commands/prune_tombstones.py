@@ -0,0 +1,16 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from fire import sync
+
+
+class Command(BaseCommand):
+    help = 'Delete sync tombstones older than the retention period'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=sync.TOMBSTONE_RETENTION.days)
+
+    def handle(self, *args, **options):
+        deleted = sync.prune_tombstones(timedelta(days=options['days']))
+        self.stdout.write(self.style.SUCCESS(f'Successfully pruned {deleted} tombstones'))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from fire import coverage
+
+
+class Command(BaseCommand):
+    help = 'Recompute the nearest fire station and its distance for every location'
+
+    def handle(self, *args, **options):
+        total = coverage.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Successfully computed coverage for {total} locations'))
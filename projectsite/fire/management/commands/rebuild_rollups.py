@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from fire import rollups
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the pre-aggregated incident rollup table behind the dashboard charts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        total = rollups.rebuild(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Successfully rebuilt {total} incident rollup rows'))
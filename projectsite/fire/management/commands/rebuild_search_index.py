@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from fire import search
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search index used by the list views'
+
+    def handle(self, *args, **kwargs):
+        backend = search.get_backend()
+        for label, total in search.rebuild().items():
+            self.stdout.write(self.style.SUCCESS(f'Indexed {total} {label} rows with {type(backend).__name__}'))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+JOURNAL_MODES = ('WAL', 'DELETE', 'TRUNCATE', 'PERSIST')
+
+
+class Command(BaseCommand):
+    help = ("Switch the SQLite database's journal mode; it is stored in the file, "
+            "so this only needs running once per database")
+
+    def add_arguments(self, parser):
+        parser.add_argument('mode', nargs='?', default='WAL', type=str.upper, choices=JOURNAL_MODES)
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('Journal modes only apply to SQLite databases')
+        with connection.cursor() as cursor:
+            cursor.execute(f"PRAGMA journal_mode = {options['mode']}")
+            mode = cursor.fetchone()[0].upper()
+        if mode != options['mode']:
+            # SQLite keeps the old mode when it cannot switch, e.g. while another process has the file open
+            raise CommandError(f"Journal mode is still {mode}; close other connections to the database and retry")
+        self.stdout.write(self.style.SUCCESS(f'Successfully set journal mode to {mode}'))
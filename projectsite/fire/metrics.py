@@ -0,0 +1,210 @@
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.template.backends.django import DjangoTemplates, Template
+
+slow_query_logger = logging.getLogger('fire.slow_queries')
+
+TIME_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+SIZE_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+# name -> (help, buckets)
+METRICS = {
+    'fire_request_duration_seconds': ('Wall time spent handling the request', TIME_BUCKETS),
+    'fire_request_db_queries': ('Database queries issued by the request', COUNT_BUCKETS),
+    'fire_request_db_duration_seconds': ('Time spent waiting on the database', TIME_BUCKETS),
+    'fire_request_template_duration_seconds': ('Time spent rendering the response template', TIME_BUCKETS),
+    'fire_response_size_bytes': ('Size of the response body', SIZE_BUCKETS),
+}
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        # one slot per bucket plus +Inf; cumulated only when rendered
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    def cumulative(self):
+        total = 0
+        for bound, count in zip(self.buckets + ('+Inf',), self.counts):
+            total += count
+            yield bound, total
+
+
+class Registry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.histograms = {}
+        self.responses = {}
+
+    def record(self, view, status, values):
+        with self.lock:
+            for name, value in values.items():
+                key = (name, view)
+                histogram = self.histograms.get(key)
+                if histogram is None:
+                    histogram = self.histograms[key] = Histogram(METRICS[name][1])
+                histogram.observe(value)
+            self.responses[view, status] = self.responses.get((view, status), 0) + 1
+
+    def reset(self):
+        with self.lock:
+            self.histograms.clear()
+            self.responses.clear()
+
+    def render(self):
+        """Everything recorded so far, in the Prometheus text exposition format."""
+        with self.lock:
+            histograms = {key: (list(h.cumulative()), h.sum) for key, h in self.histograms.items()}
+            responses = dict(self.responses)
+
+        lines = [
+            '# HELP fire_responses_total Responses served, by view and status code',
+            '# TYPE fire_responses_total counter',
+        ]
+        for (view, status), count in sorted(responses.items()):
+            lines.append(f'fire_responses_total{{view="{view}",status="{status}"}} {count}')
+        for name, (help_text, _) in METRICS.items():
+            lines += [f'# HELP {name} {help_text}', f'# TYPE {name} histogram']
+            for (metric, view), (buckets, total) in sorted(histograms.items()):
+                if metric != name:
+                    continue
+                for bound, count in buckets:
+                    lines.append(f'{name}_bucket{{view="{view}",le="{bound}"}} {count}')
+                lines.append(f'{name}_sum{{view="{view}"}} {total:.6f}')
+                lines.append(f'{name}_count{{view="{view}"}} {buckets[-1][1]}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+
+class QueryTimer:
+    """Database execute wrapper that counts and times every query of one request."""
+
+    def __init__(self, slow_ms=None):
+        self.count = 0
+        self.duration = 0.0
+        self.slow_seconds = slow_ms / 1000 if slow_ms is not None else None
+        self.slow = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.count += 1
+            self.duration += elapsed
+            if self.slow_seconds is not None and elapsed >= self.slow_seconds:
+                self.slow.append((elapsed, sql))
+
+
+def watch_queries(stack, timer):
+    for connection in connections.all():
+        stack.enter_context(connection.execute_wrapper(timer))
+
+
+def view_label(request):
+    # The route rather than the url name: several routes share a name (the four
+    # chart views are all 'chart'), but every route pattern is distinct.
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unresolved'
+    return match.route or match.view_name
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            if hasattr(request, '_template_duration'):
+                request._template_duration += time.perf_counter() - started
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """The Django template backend, timing every render that is given the request.
+
+    Both TemplateResponse and the render() shortcut pass the request in, so class-based
+    and function views alike show up in fire_request_template_duration_seconds.
+    """
+
+    def from_string(self, template_code):
+        return TimedTemplate(super().from_string(template_code).template, self)
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name).template, self)
+
+
+class MetricsMiddleware:
+    """Times each request and records it under its URL route in ``registry``.
+
+    Put it first in ``MIDDLEWARE`` so the wall time covers the other middleware too.
+    Works in both sync and async stacks, like Django's own middleware.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.slow_query_ms = getattr(settings, 'FIRE_SLOW_QUERY_MS', None)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        timer = QueryTimer(self.slow_query_ms)
+        request._template_duration = 0.0
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            watch_queries(stack, timer)
+            response = self.get_response(request)
+        self.record(request, response, timer, time.perf_counter() - started)
+        return response
+
+    async def __acall__(self, request):
+        timer = QueryTimer(self.slow_query_ms)
+        request._template_duration = 0.0
+        started = time.perf_counter()
+        # Connections belong to the thread the async ORM runs queries on, which is
+        # shared by the whole request, so the wrapper has to be installed there.
+        stack = ExitStack()
+        await sync_to_async(watch_queries)(stack, timer)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+        self.record(request, response, timer, time.perf_counter() - started)
+        return response
+
+    def record(self, request, response, timer, elapsed):
+        view = view_label(request)
+        values = {
+            'fire_request_duration_seconds': elapsed,
+            'fire_request_db_queries': timer.count,
+            'fire_request_db_duration_seconds': timer.duration,
+            'fire_request_template_duration_seconds': request._template_duration,
+        }
+        # Streamed bodies are produced after this returns, so neither their size nor
+        # their queries are known here.
+        if not response.streaming:
+            values['fire_response_size_bytes'] = len(response.content)
+        registry.record(view, response.status_code, values)
+
+        for duration, sql in timer.slow:
+            slow_query_logger.warning('%.1fms in %s (%s): %s', duration * 1000, view, request.path, sql)
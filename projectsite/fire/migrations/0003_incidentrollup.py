@@ -0,0 +1,49 @@
+# Generated by Django 4.2.11 on 2026-10-18 14:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def populate_rollups(apps, schema_editor):
+    Incident = apps.get_model('fire', 'Incident')
+    IncidentRollup = apps.get_model('fire', 'IncidentRollup')
+    groups = (Incident.objects
+              .values('date_time', 'severity_level', 'location__country', 'location__city')
+              .annotate(total=Count('id'))
+              .order_by())
+    IncidentRollup.objects.bulk_create(
+        IncidentRollup(day=group['date_time'], severity_level=group['severity_level'],
+                       country=group['location__country'], city=group['location__city'],
+                       count=group['total'])
+        for group in groups)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fire', '0002_alter_firefighters_experience_level_and_more'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='firefighters',
+            name='station',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='fire.firestation'),
+        ),
+        migrations.CreateModel(
+            name='IncidentRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(blank=True, db_index=True, null=True)),
+                ('severity_level', models.CharField(choices=[('Minor Fire', 'Minor Fire'), ('Moderate Fire', 'Moderate Fire'), ('Major Fire', 'Major Fire')], max_length=45)),
+                ('country', models.CharField(max_length=150)),
+                ('city', models.CharField(max_length=150)),
+                ('count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('day', 'severity_level', 'country', 'city'), name='fire_incidentrollup_unique_key')],
+            },
+        ),
+        migrations.RunPython(populate_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 4.2.11 on 2026-10-18 14:11
+
+from django.db import migrations, models
+
+from fire import geo
+
+
+def populate_geohashes(apps, schema_editor):
+    for model_name in ('Locations', 'FireStation'):
+        model = apps.get_model('fire', model_name)
+        batch = []
+        rows = model.objects.exclude(latitude__isnull=True).exclude(longitude__isnull=True)
+        for row in rows.only('latitude', 'longitude').iterator(chunk_size=1000):
+            row.geohash = geo.encode(row.latitude, row.longitude)
+            batch.append(row)
+            if len(batch) >= 1000:
+                model.objects.bulk_update(batch, ['geohash'])
+                batch = []
+        model.objects.bulk_update(batch, ['geohash'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fire', '0003_incidentrollup'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='firestation',
+            name='geohash',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=12),
+        ),
+        migrations.AddField(
+            model_name='locations',
+            name='geohash',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=12),
+        ),
+        migrations.RunPython(populate_geohashes, migrations.RunPython.noop),
+    ]
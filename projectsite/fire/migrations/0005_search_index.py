@@ -0,0 +1,23 @@
+from django.db import migrations
+
+from fire import search
+
+
+def create_search_tables(apps, schema_editor):
+    search.create_fts_tables(schema_editor, apps)
+
+
+def drop_search_tables(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        search.drop_fts_tables(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fire', '0004_geohash'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_tables, drop_search_tables),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.11 on 2026-10-18 14:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fire', '0006_sync'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='firefighters',
+            index=models.Index(fields=['station', 'rank'], name='fire_firefighter_station_rank'),
+        ),
+        migrations.AddIndex(
+            model_name='incident',
+            index=models.Index(fields=['location', 'date_time', 'severity_level'], name='fire_incident_loc_day_sev'),
+        ),
+        migrations.AddIndex(
+            model_name='incidentrollup',
+            index=models.Index(fields=['severity_level', 'country', 'day', 'count'], name='fire_rollup_sev_country_day'),
+        ),
+        migrations.AddIndex(
+            model_name='locations',
+            index=models.Index(fields=['city', 'country'], name='fire_location_city_country'),
+        ),
+    ]
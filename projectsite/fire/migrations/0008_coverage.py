@@ -0,0 +1,44 @@
+# Generated by Django 4.2.11 on 2026-10-18 14:40
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+from fire import spatial
+
+
+def populate_coverage(apps, schema_editor):
+    FireStation = apps.get_model('fire', 'FireStation')
+    Locations = apps.get_model('fire', 'Locations')
+    LocationCoverage = apps.get_model('fire', 'LocationCoverage')
+    stations = (FireStation.objects
+                .exclude(latitude__isnull=True).exclude(longitude__isnull=True)
+                .values_list('latitude', 'longitude', 'id'))
+    index = spatial.PointIndex((float(lat), float(lon), pk) for lat, lon, pk in stations)
+    batch = []
+    for pk, lat, lon in Locations.objects.values_list('id', 'latitude', 'longitude').iterator(chunk_size=2000):
+        match = index.nearest(float(lat), float(lon), 1) if lat is not None and lon is not None else []
+        distance, station_id = match[0] if match else (None, None)
+        batch.append(LocationCoverage(location_id=pk, station_id=station_id, distance_km=distance))
+        if len(batch) >= 2000:
+            LocationCoverage.objects.bulk_create(batch)
+            batch = []
+    LocationCoverage.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fire', '0007_composite_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LocationCoverage',
+            fields=[
+                ('location', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='coverage', serialize=False, to='fire.locations')),
+                ('distance_km', models.FloatField(blank=True, db_index=True, null=True)),
+                ('station', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='fire.firestation')),
+            ],
+        ),
+        migrations.RunPython(populate_coverage, migrations.RunPython.noop),
+    ]
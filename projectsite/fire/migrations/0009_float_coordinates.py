@@ -0,0 +1,33 @@
+# Generated by Django 4.2.11 on 2026-10-18 14:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fire', '0008_coverage'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='firestation',
+            name='latitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='firestation',
+            name='longitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='locations',
+            name='latitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='locations',
+            name='longitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+    ]
@@ -3,7 +3,7 @@ from django.db import models
 
 class BaseModel(models.Model):
     created_at = models.DateTimeField(auto_now_add=True, db_index=True)
-    updated_at = models.DateTimeField(auto_now=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     class Meta:
         abstract = True
@@ -11,13 +11,17 @@ class BaseModel(models.Model):
 
 class Locations(BaseModel):
     name = models.CharField(max_length=150)
-    latitude = models.DecimalField(
-        max_digits=22, decimal_places=16, null=True, blank=True)
-    longitude = models.DecimalField(
-        max_digits=22, decimal_places=16, null=True, blank=True)
+    latitude = models.FloatField(null=True, blank=True)
+    longitude = models.FloatField(null=True, blank=True)
     address = models.CharField(max_length=150)
     city = models.CharField(max_length=150)  # can be in separate table
     country = models.CharField(max_length=150)  # can be in separate table
+    geohash = models.CharField(max_length=12, blank=True, db_index=True, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['city', 'country'], name='fire_location_city_country'),
+        ]
 
     def __str__(self):
         return self.name
@@ -33,18 +37,23 @@ class Incident(BaseModel):
     severity_level = models.CharField(max_length=45, choices=SEVERITY_CHOICES)
     description = models.CharField(max_length=250)
 
+    class Meta:
+        indexes = [
+            # Re-bucketing a location's incidents reads only this index
+            models.Index(fields=['location', 'date_time', 'severity_level'], name='fire_incident_loc_day_sev'),
+        ]
+
     def __str__(self):
         return f"{self.severity_level} at {self.location}"
 
 class FireStation(BaseModel):
     name = models.CharField(max_length=150)
-    latitude = models.DecimalField(
-        max_digits=22, decimal_places=16, null=True, blank=True)
-    longitude = models.DecimalField(
-        max_digits=22, decimal_places=16, null=True, blank=True)
+    latitude = models.FloatField(null=True, blank=True)
+    longitude = models.FloatField(null=True, blank=True)
     address = models.CharField(max_length=150)
     city = models.CharField(max_length=150) 
     country = models.CharField(max_length=150) 
+    geohash = models.CharField(max_length=12, blank=True, db_index=True, editable=False)
 
     def __str__(self):
         return self.name
@@ -69,6 +78,11 @@ class Firefighters(BaseModel):
     experience_level = models.CharField(max_length=45, null=True, blank=True, choices=XP_CHOICES)
     station = models.ForeignKey(FireStation, on_delete=models.CASCADE)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['station', 'rank'], name='fire_firefighter_station_rank'),
+        ]
+
     def __str__(self):
         return self.name
 
@@ -89,4 +103,45 @@ class WeatherConditions(BaseModel):
     weather_description = models.CharField(max_length=150)
 
     def __str__(self):
-        return f"Weather on {self.incident}: {self.weather_description}"
\ No newline at end of file
+        return f"Weather on {self.incident}: {self.weather_description}"
+
+class IncidentRollup(models.Model):
+    day = models.DateField(null=True, blank=True, db_index=True)
+    severity_level = models.CharField(max_length=45, choices=Incident.SEVERITY_CHOICES)
+    country = models.CharField(max_length=150)
+    city = models.CharField(max_length=150)
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['day', 'severity_level', 'country', 'city'],
+                name='fire_incidentrollup_unique_key'),
+        ]
+        indexes = [
+            # Covers the whole-table chart aggregates, which group by severity and country
+            models.Index(fields=['severity_level', 'country', 'day', 'count'], name='fire_rollup_sev_country_day'),
+        ]
+
+    def __str__(self):
+        return f"{self.count} {self.severity_level} on {self.day} in {self.city}, {self.country}"
+
+
+class LocationCoverage(models.Model):
+    """Nearest fire station to a location, kept up to date by fire.coverage."""
+    location = models.OneToOneField(Locations, on_delete=models.CASCADE, primary_key=True, related_name='coverage')
+    station = models.ForeignKey(FireStation, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    distance_km = models.FloatField(null=True, blank=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.location_id} is {self.distance_km} km from station {self.station_id}"
+
+
+class Tombstone(models.Model):
+    """Marks a deleted row so sync clients can drop their copy."""
+    model = models.CharField(max_length=100)
+    object_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.model} {self.object_id} deleted at {self.deleted_at}"
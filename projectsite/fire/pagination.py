@@ -0,0 +1,116 @@
+import base64
+from datetime import datetime
+
+from django.core.paginator import Paginator
+from django.db import connection
+from django.db.models import Max, Q
+from django.utils.functional import cached_property
+
+
+def encode_cursor(created_at, pk):
+    raw = f"{created_at.isoformat()}|{pk}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Return ``(direction, created_at, pk)`` for a ``n:``/``p:`` prefixed token."""
+    direction, _, payload = token.partition(':')
+    if direction not in ('n', 'p') or not payload:
+        raise ValueError('Invalid cursor')
+    try:
+        raw = base64.urlsafe_b64decode(payload + '=' * (-len(payload) % 4)).decode()
+        created_at, pk = raw.split('|')
+        return direction, datetime.fromisoformat(created_at), int(pk)
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError('Invalid cursor')
+
+
+def estimated_count(queryset):
+    """Cheap row-count estimate for an unfiltered table, or None."""
+    if queryset.query.where:
+        return None
+    model = queryset.model
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE relname = %s', [model._meta.db_table])
+            row = cursor.fetchone()
+        if row and row[0] >= 0:
+            return row[0]
+    # The highest primary key is an index lookup; gaps from deletes make it an upper bound.
+    return model._default_manager.aggregate(top=Max('pk'))['top'] or 0
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator whose count may be an estimate, in which case ``estimated`` is set.
+
+    The estimate can run past the real end of the table, so a page that comes out
+    short replaces it with the exact count, and a page past the end (e.g. "Last"
+    under an overestimate) falls back to COUNT(*) and shows the real last page.
+    """
+    estimated = False
+
+    @cached_property
+    def count(self):
+        estimate = estimated_count(self.object_list)
+        if estimate is None:
+            return super().count
+        self.estimated = True
+        return estimate
+
+    def set_count(self, count):
+        self.__dict__['count'] = count
+        self.__dict__.pop('num_pages', None)
+        self.estimated = False
+
+    def page(self, number):
+        page = super().page(number)
+        if not self.estimated or len(page) >= self.per_page:
+            return page
+        if len(page) or page.number == 1:
+            self.set_count((page.number - 1) * self.per_page + len(page))
+            return page
+        self.set_count(Paginator.count.func(self))
+        return super().page(self.num_pages)
+
+
+class CursorPage:
+    """Keyset page ordered newest first on ``(created_at, id)``."""
+
+    def __init__(self, queryset, per_page, cursor=None):
+        ordered = queryset.order_by('-created_at', '-id')
+        direction = None
+        if cursor:
+            direction, created_at, pk = decode_cursor(cursor)
+            if direction == 'n':
+                ordered = ordered.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk))
+            else:
+                ordered = (ordered.filter(Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=pk))
+                           .order_by('created_at', 'id'))
+
+        rows = list(ordered[:per_page + 1])
+        has_more = len(rows) > per_page
+        rows = rows[:per_page]
+        if direction == 'p':
+            rows.reverse()
+            self.has_previous_page, self.has_next_page = has_more, True
+        else:
+            self.has_previous_page, self.has_next_page = direction == 'n', has_more
+
+        self.object_list = rows
+        self.next_cursor = f"n:{encode_cursor(rows[-1].created_at, rows[-1].pk)}" if rows and self.has_next_page else None
+        self.previous_cursor = f"p:{encode_cursor(rows[0].created_at, rows[0].pk)}" if rows and self.has_previous_page else None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.has_next_page
+
+    def has_previous(self):
+        return self.has_previous_page
+
+    def has_other_pages(self):
+        return self.has_next_page or self.has_previous_page
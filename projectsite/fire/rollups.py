@@ -0,0 +1,139 @@
+from collections import Counter
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q
+
+from fire import analytics, cache
+from fire.models import Incident, IncidentRollup
+
+
+def rollup_key(day, severity_level, country, city):
+    return {
+        'day': day,
+        'severity_level': severity_level,
+        'country': country,
+        'city': city,
+    }
+
+
+def incident_key(incident):
+    location = incident.location
+    return rollup_key(incident.date_time, incident.severity_level, location.country, location.city)
+
+
+def bump(key, delta):
+    if not delta:
+        return
+    analytics.touch(key['day'])
+    rows = IncidentRollup.objects.filter(**key)
+    if delta > 0:
+        if rows.update(count=F('count') + delta):
+            return
+        try:
+            with transaction.atomic():
+                IncidentRollup.objects.create(count=delta, **key)
+        except IntegrityError:
+            # Another writer created the bucket after our update found nothing.
+            rows.update(count=F('count') + delta)
+    else:
+        rows.update(count=F('count') + delta)
+        rows.filter(count__lte=0).delete()
+
+
+def add_incident(incident):
+    bump(incident_key(incident), 1)
+
+
+def remove_incident(incident):
+    bump(incident_key(incident), -1)
+
+
+def move_location(location_id, old_country, old_city, new_country, new_city):
+    # A location changing city/country re-buckets every incident filed against it.
+    groups = (Incident.objects.filter(location_id=location_id)
+              .values('date_time', 'severity_level')
+              .annotate(total=Count('id'))
+              .order_by())
+    for group in groups:
+        bump(rollup_key(group['date_time'], group['severity_level'], old_country, old_city), -group['total'])
+        bump(rollup_key(group['date_time'], group['severity_level'], new_country, new_city), group['total'])
+
+
+def incident_deltas(queryset, sign=1):
+    """``{(day, severity_level, country, city): count}`` for the incidents in ``queryset``,
+    negated when ``sign`` is -1.
+    """
+    groups = (queryset.values('date_time', 'severity_level', 'location__country', 'location__city')
+              .annotate(total=Count('id'))
+              .order_by())
+    return Counter({(group['date_time'], group['severity_level'], group['location__country'],
+                     group['location__city']): sign * group['total'] for group in groups})
+
+
+def bump_many(deltas, batch_size=500):
+    """Apply ``incident_deltas``-style changes with a few statements per batch of
+    buckets, where ``bump`` needs a few per bucket.
+    """
+    deltas = {key: delta for key, delta in deltas.items() if delta}
+    for day in {key[0] for key in deltas}:
+        analytics.touch(day)
+    keys = list(deltas)
+    with transaction.atomic():
+        for start in range(0, len(keys), batch_size):
+            batch = keys[start:start + batch_size]
+            days = {key[0] for key in batch}
+            same_day = Q(day__in=[day for day in days if day is not None])
+            if None in days:
+                same_day |= Q(day__isnull=True)
+            # A superset of the batch's rows; matched up exactly below.
+            candidates = (IncidentRollup.objects.select_for_update()
+                          .filter(same_day,
+                                  severity_level__in={key[1] for key in batch},
+                                  country__in={key[2] for key in batch},
+                                  city__in={key[3] for key in batch}))
+            rows = {(row.day, row.severity_level, row.country, row.city): row for row in candidates}
+            changed, emptied, created = [], [], []
+            for key in batch:
+                row = rows.get(key)
+                if row is None:
+                    if deltas[key] > 0:
+                        created.append(IncidentRollup(count=deltas[key], **rollup_key(*key)))
+                    continue
+                row.count += deltas[key]
+                (changed if row.count > 0 else emptied).append(row)
+            IncidentRollup.objects.bulk_update(changed, ['count'])
+            IncidentRollup.objects.filter(pk__in=[row.pk for row in emptied]).delete()
+            try:
+                with transaction.atomic():
+                    IncidentRollup.objects.bulk_create(created)
+            except IntegrityError:
+                # Another writer created some of these buckets since we looked;
+                # bump handles that one bucket at a time.
+                for row in created:
+                    bump(rollup_key(row.day, row.severity_level, row.country, row.city), row.count)
+
+
+def add_incidents(queryset):
+    """Fold the incidents in ``queryset`` into the rollup."""
+    bump_many(incident_deltas(queryset))
+
+
+def remove_incidents(queryset):
+    bump_many(incident_deltas(queryset, -1))
+
+
+def rebuild(batch_size=1000):
+    groups = (Incident.objects
+              .values('date_time', 'severity_level', 'location__country', 'location__city')
+              .annotate(total=Count('id'))
+              .order_by())
+    with transaction.atomic():
+        IncidentRollup.objects.all().delete()
+        IncidentRollup.objects.bulk_create(
+            (IncidentRollup(count=group['total'], **rollup_key(
+                group['date_time'], group['severity_level'],
+                group['location__country'], group['location__city']))
+             for group in groups.iterator()),
+            batch_size=batch_size)
+    cache.invalidate(IncidentRollup)
+    return IncidentRollup.objects.count()
@@ -0,0 +1,195 @@
+import re
+from functools import reduce
+from operator import or_
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+
+from fire.models import FireStation, FireTruck, Firefighters, Incident, Locations, WeatherConditions
+
+# model -> field paths whose values make up the searchable text of a row
+SEARCH_FIELDS = {
+    Locations: ('name', 'city', 'address', 'country'),
+    FireStation: ('name', 'city', 'address', 'country'),
+    Incident: ('location__name', 'location__city', 'location__country', 'severity_level'),
+    FireTruck: ('truck_number', 'model', 'capacity', 'station__name'),
+    Firefighters: ('name', 'rank', 'experience_level', 'station__name', 'station__country'),
+    WeatherConditions: ('incident__location__name', 'temperature', 'humidity', 'wind_speed'),
+}
+
+
+def dependent_lookups(model):
+    """Yield ``(indexed_model, lookup)`` for documents that embed fields of ``model``.
+
+    e.g. a Locations change affects ``Incident`` rows via ``location`` and
+    ``WeatherConditions`` rows via ``incident__location``.
+    """
+    for indexed, paths in SEARCH_FIELDS.items():
+        lookups = set()
+        for path in paths:
+            parts = path.split('__')[:-1]
+            current = indexed
+            for depth, part in enumerate(parts):
+                current = current._meta.get_field(part).related_model
+                if current is model:
+                    lookups.add('__'.join(parts[:depth + 1]))
+        for lookup in lookups:
+            yield indexed, lookup
+
+
+def documents(queryset, paths):
+    """Yield ``(pk, text)`` for every row of ``queryset``."""
+    for row in queryset.values_list('pk', *paths).iterator(chunk_size=2000):
+        yield row[0], ' '.join(str(value) for value in row[1:] if value is not None)
+
+
+class ContainsBackend:
+    """Substring matching with ``icontains``; works everywhere but scans."""
+
+    def filter(self, model, query):
+        return reduce(or_, (Q(**{f'{path}__icontains': query}) for path in SEARCH_FIELDS[model]))
+
+    def search(self, queryset, query, ranked=True):
+        return queryset.filter(self.filter(queryset.model, query))
+
+    def index(self, model, queryset):
+        pass
+
+    def remove(self, model, pks):
+        pass
+
+    def rebuild(self, model):
+        return 0
+
+
+class SQLiteFTSBackend(ContainsBackend):
+    """FTS5 index, one virtual table per model whose rowid is the row's pk."""
+
+    @staticmethod
+    def table(model):
+        return f'{model._meta.db_table}_fts'
+
+    @staticmethod
+    def match_expression(query):
+        # Every word must match, each as a prefix: "fire stat" -> "fire"* "stat"*
+        tokens = re.findall(r'\w+', query)
+        return ' '.join(f'"{token}"*' for token in tokens)
+
+    def filter(self, model, query):
+        expression = self.match_expression(query)
+        if not expression:
+            return Q(pk__in=[])
+        return Q(pk__in=RawSQL(f'SELECT rowid FROM {self.table(model)} WHERE {self.table(model)} MATCH %s',
+                               [expression]))
+
+    def search(self, queryset, query, ranked=True):
+        model = queryset.model
+        expression = self.match_expression(query)
+        if not (ranked and expression):
+            return queryset.filter(self.filter(model, query))
+        # Join the index so MATCH runs once and hands back every row's rank with it;
+        # a per-row rank subquery would repeat the whole MATCH for each match.
+        table = self.table(model)
+        return queryset.extra(
+            tables=[table],
+            where=[f'{table}.rowid = {model._meta.db_table}.{model._meta.pk.column}', f'{table} MATCH %s'],
+            params=[expression],
+            select={'search_rank': f'{table}.rank'},
+        ).order_by('search_rank', 'pk')
+
+    def index(self, model, queryset):
+        table = self.table(model)
+        with transaction.atomic(), connection.cursor() as cursor:
+            for pk, text in documents(queryset, SEARCH_FIELDS[model]):
+                cursor.execute(f'INSERT OR REPLACE INTO {table} (rowid, body) VALUES (%s, %s)', [pk, text])
+
+    def remove(self, model, pks):
+        table = self.table(model)
+        with connection.cursor() as cursor:
+            cursor.executemany(f'DELETE FROM {table} WHERE rowid = %s', [(pk,) for pk in pks])
+
+    def rebuild(self, model):
+        return fill_fts_table(connection, self.table(model), model._default_manager.all(), SEARCH_FIELDS[model])
+
+
+def fill_fts_table(db, table, queryset, paths):
+    total = 0
+    batch = []
+    with transaction.atomic(using=db.alias), db.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {table}')
+        for document in documents(queryset, paths):
+            batch.append(document)
+            if len(batch) >= 2000:
+                cursor.executemany(f'INSERT INTO {table} (rowid, body) VALUES (%s, %s)', batch)
+                total += len(batch)
+                batch = []
+        cursor.executemany(f'INSERT INTO {table} (rowid, body) VALUES (%s, %s)', batch)
+    return total + len(batch)
+
+
+def fts5_available(db=connection):
+    if db.vendor != 'sqlite':
+        return False
+    with db.cursor() as cursor:
+        cursor.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+        return bool(cursor.fetchone()[0])
+
+
+def create_fts_tables(schema_editor, apps=None):
+    """Create (and fill) the FTS5 tables; used by the migration."""
+    if not fts5_available(schema_editor.connection):
+        return
+    for model, paths in SEARCH_FIELDS.items():
+        table = SQLiteFTSBackend.table(model)
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {table} USING fts5(body, tokenize='unicode61', prefix='2 3')")
+        if apps is not None:
+            historical = apps.get_model(model._meta.app_label, model._meta.object_name)
+            fill_fts_table(schema_editor.connection, table, historical.objects.all(), paths)
+
+
+def drop_fts_tables(schema_editor):
+    for model in SEARCH_FIELDS:
+        schema_editor.execute(f'DROP TABLE IF EXISTS {SQLiteFTSBackend.table(model)}')
+
+
+_backend = None
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        path = getattr(settings, 'FIRE_SEARCH_BACKEND', None)
+        if path:
+            _backend = import_string(path)()
+        elif fts5_available():
+            _backend = SQLiteFTSBackend()
+        else:
+            _backend = ContainsBackend()
+    return _backend
+
+
+def search(queryset, query, ranked=True):
+    return get_backend().search(queryset, query, ranked=ranked)
+
+
+def index_objects(model, pks):
+    """(Re)index the given rows plus every document that embeds them."""
+    backend = get_backend()
+    if model in SEARCH_FIELDS:
+        backend.index(model, model._default_manager.filter(pk__in=pks))
+    for indexed, lookup in dependent_lookups(model):
+        backend.index(indexed, indexed._default_manager.filter(**{f'{lookup}__in': pks}))
+
+
+def remove_objects(model, pks):
+    if model in SEARCH_FIELDS:
+        get_backend().remove(model, pks)
+
+
+def rebuild():
+    backend = get_backend()
+    return {model._meta.label: backend.rebuild(model) for model in SEARCH_FIELDS}
@@ -0,0 +1,211 @@
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from fire import cache, coverage, db, dispatch, events, geo, rollups, search, spatial, sync
+from fire.models import FireStation, FireTruck, Firefighters, Incident, Locations, WeatherConditions
+
+
+#-----------------Connection setup--------------------------------
+
+@receiver(connection_created)
+def configure_connection(sender, connection, **kwargs):
+    db.configure_connection(connection)
+
+
+#-----------------Spatial index--------------------------------
+
+@receiver(pre_save, sender=Locations)
+@receiver(pre_save, sender=FireStation)
+def update_geohash(sender, instance, **kwargs):
+    instance.geohash = geo.encode(instance.latitude, instance.longitude)
+
+
+@receiver(post_save, sender=FireStation)
+@receiver(post_delete, sender=FireStation)
+def drop_station_index(sender, **kwargs):
+    transaction.on_commit(spatial.invalidate_station_index)
+
+
+#-----------------Dispatch summaries--------------------------------
+
+@receiver(post_save, sender=FireStation)
+@receiver(post_delete, sender=FireStation)
+@receiver(post_save, sender=FireTruck)
+@receiver(post_delete, sender=FireTruck)
+@receiver(post_save, sender=Firefighters)
+@receiver(post_delete, sender=Firefighters)
+def drop_station_summaries(sender, **kwargs):
+    transaction.on_commit(dispatch.invalidate_station_summaries)
+
+
+#-----------------Station coverage--------------------------------
+
+@receiver(pre_save, sender=Locations)
+@receiver(pre_save, sender=FireStation)
+def remember_position(sender, instance, raw=False, **kwargs):
+    instance._previous_position = None
+    if raw or instance.pk is None:
+        return
+    instance._previous_position = sender.objects.filter(pk=instance.pk).values_list('latitude', 'longitude').first()
+
+
+def position_changed(instance, created):
+    position = (instance.latitude, instance.longitude)
+    previous = getattr(instance, '_previous_position', None)
+    if created or previous is None:
+        return True
+    return [None if value is None else float(value) for value in previous] != \
+        [None if value is None else float(value) for value in position]
+
+
+@receiver(post_save, sender=Locations)
+def update_location_coverage(sender, instance, created, raw=False, **kwargs):
+    if not raw and position_changed(instance, created):
+        transaction.on_commit(lambda: coverage.location_changed(instance.pk))
+
+
+@receiver(post_save, sender=FireStation)
+def update_station_coverage(sender, instance, created, raw=False, **kwargs):
+    if not raw and position_changed(instance, created):
+        transaction.on_commit(lambda: coverage.station_changed(instance.pk))
+
+
+@receiver(post_delete, sender=FireStation)
+def reassign_station_coverage(sender, instance, **kwargs):
+    station_id = instance.pk
+    transaction.on_commit(lambda: coverage.station_changed(station_id))
+
+
+#-----------------Incident rollups--------------------------------
+
+@receiver(pre_save, sender=Incident)
+def remember_incident_rollup_key(sender, instance, raw=False, **kwargs):
+    instance._rollup_key = None
+    instance._previous_values = None
+    if raw or instance.pk is None:
+        return
+    old = (Incident.objects.filter(pk=instance.pk)
+           .values('date_time', 'severity_level', 'location__country', 'location__city', 'location__geohash')
+           .first())
+    if old:
+        instance._rollup_key = rollups.rollup_key(
+            old['date_time'], old['severity_level'], old['location__country'], old['location__city'])
+        # The live feed sends these along so clients can move the incident out of its old place
+        instance._previous_values = {
+            'date_time': old['date_time'],
+            'severity_level': old['severity_level'],
+            'country': old['location__country'],
+            'city': old['location__city'],
+            'geohash': old['location__geohash'],
+        }
+
+
+@receiver(post_save, sender=Incident)
+def update_incident_rollup(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    old_key = getattr(instance, '_rollup_key', None)
+    new_key = rollups.incident_key(instance)
+    if old_key != new_key:
+        if old_key:
+            rollups.bump(old_key, -1)
+        rollups.bump(new_key, 1)
+
+
+@receiver(post_delete, sender=Incident)
+def remove_incident_rollup(sender, instance, **kwargs):
+    rollups.remove_incident(instance)
+
+
+@receiver(pre_save, sender=Locations)
+def remember_location_place(sender, instance, raw=False, **kwargs):
+    instance._rollup_place = None
+    if raw or instance.pk is None:
+        return
+    instance._rollup_place = (Locations.objects.filter(pk=instance.pk)
+                              .values_list('country', 'city').first())
+
+
+@receiver(post_save, sender=Locations)
+def move_location_rollups(sender, instance, created, raw=False, **kwargs):
+    old_place = getattr(instance, '_rollup_place', None)
+    if raw or created or not old_place:
+        return
+    if old_place != (instance.country, instance.city):
+        rollups.move_location(instance.pk, *old_place, instance.country, instance.city)
+
+
+#-----------------Search index--------------------------------
+
+@receiver(post_save, sender=Locations)
+@receiver(post_save, sender=FireStation)
+@receiver(post_save, sender=Incident)
+@receiver(post_save, sender=FireTruck)
+@receiver(post_save, sender=Firefighters)
+@receiver(post_save, sender=WeatherConditions)
+def index_search_document(sender, instance, raw=False, **kwargs):
+    if not raw:
+        search.index_objects(sender, [instance.pk])
+
+
+@receiver(post_delete, sender=Locations)
+@receiver(post_delete, sender=FireStation)
+@receiver(post_delete, sender=Incident)
+@receiver(post_delete, sender=FireTruck)
+@receiver(post_delete, sender=Firefighters)
+@receiver(post_delete, sender=WeatherConditions)
+def remove_search_document(sender, instance, **kwargs):
+    search.remove_objects(sender, [instance.pk])
+
+
+#-----------------View cache--------------------------------
+
+@receiver(post_save, sender=Locations)
+@receiver(post_save, sender=FireStation)
+@receiver(post_save, sender=Incident)
+@receiver(post_save, sender=FireTruck)
+@receiver(post_save, sender=Firefighters)
+@receiver(post_save, sender=WeatherConditions)
+@receiver(post_delete, sender=Locations)
+@receiver(post_delete, sender=FireStation)
+@receiver(post_delete, sender=Incident)
+@receiver(post_delete, sender=FireTruck)
+@receiver(post_delete, sender=Firefighters)
+@receiver(post_delete, sender=WeatherConditions)
+def bump_cache_version(sender, **kwargs):
+    cache.invalidate(sender)
+
+
+#-----------------Live feed--------------------------------
+
+@receiver(post_save, sender=Incident)
+@receiver(post_save, sender=WeatherConditions)
+@receiver(post_save, sender=FireTruck)
+def publish_live_change(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        events.publish_change(instance, 'created')
+    else:
+        events.publish_change(instance, 'updated', getattr(instance, '_previous_values', None))
+
+
+@receiver(post_delete, sender=Incident)
+@receiver(post_delete, sender=WeatherConditions)
+@receiver(post_delete, sender=FireTruck)
+def publish_live_delete(sender, instance, **kwargs):
+    events.publish_change(instance, 'deleted')
+
+
+#-----------------Delta sync--------------------------------
+
+@receiver(post_delete, sender=Locations)
+@receiver(post_delete, sender=FireStation)
+@receiver(post_delete, sender=Incident)
+@receiver(post_delete, sender=FireTruck)
+@receiver(post_delete, sender=Firefighters)
+@receiver(post_delete, sender=WeatherConditions)
+def record_tombstone(sender, instance, **kwargs):
+    sync.record_deletion(instance)
@@ -0,0 +1,282 @@
+import heapq
+import math
+import struct
+import sys
+from array import array
+
+from django.db.models import Avg, Count, Max, Min, Q
+from django.db.models.functions import Substr
+
+from fire import cache, geo
+from fire.models import FireStation, Incident
+
+# layer name -> (queryset factory, lookup prefix to the coordinate-bearing model)
+MAP_LAYERS = {
+    'stations': (FireStation.objects.all, ''),
+    'incidents': (Incident.objects.all, 'location__'),
+}
+
+
+def parse_bbox(value):
+    """Parse ``west,south,east,north`` into floats, or None when absent."""
+    if not value:
+        return None
+    try:
+        west, south, east, north = (float(part) for part in value.split(','))
+    except ValueError:
+        raise ValueError('bbox must be "west,south,east,north"')
+    if not (-90 <= south <= north <= 90 and -180 <= west <= 180 and -180 <= east <= 180):
+        raise ValueError('bbox is out of range')
+    return west, south, east, north
+
+
+def bbox_filter(bbox, prefix=''):
+    west, south, east, north = bbox
+    # A box crossing the antimeridian is split into two.
+    spans = [(west, east)] if west <= east else [(west, 180.0), (-180.0, east)]
+    condition = Q()
+    for span_west, span_east in spans:
+        cells = Q()
+        for cell in geo.covering_prefixes(south, span_west, north, span_east):
+            cells |= Q(**{f'{prefix}geohash__gte': cell, f'{prefix}geohash__lt': cell + geo.PREFIX_END})
+        condition |= cells & Q(**{
+            f'{prefix}latitude__range': (south, north),
+            f'{prefix}longitude__range': (span_west, span_east),
+        })
+    return condition
+
+
+def layer_queryset(layer, bbox=None, city=None):
+    queryset, prefix = MAP_LAYERS[layer]
+    qs = queryset().exclude(**{f'{prefix}latitude__isnull': True}).exclude(**{f'{prefix}longitude__isnull': True})
+    if bbox:
+        qs = qs.filter(bbox_filter(bbox, prefix))
+    if city:
+        qs = qs.filter(**{f'{prefix}city': city})
+    return qs, prefix
+
+
+def cluster_queryset(layer, bbox=None, zoom=0, city=None):
+    """Return ``(rows, precision)``: one row per geohash cell with its count and centre."""
+    qs, prefix = layer_queryset(layer, bbox, city)
+    precision = geo.zoom_precision(zoom)
+    rows = (qs.annotate(cell=Substr(f'{prefix}geohash', 1, precision))
+            .values('cell')
+            .annotate(count=Count('id'),
+                      latitude=Avg(f'{prefix}latitude'),
+                      longitude=Avg(f'{prefix}longitude'),
+                      name=Min(f'{prefix}name'))
+            .order_by())
+    return rows, precision
+
+
+def cluster_payload(layer, precision, rows):
+    clusters = []
+    for row in rows:
+        cluster = {
+            'geohash': row['cell'],
+            'count': row['count'],
+            'latitude': float(row['latitude']),
+            'longitude': float(row['longitude']),
+        }
+        if row['count'] == 1:
+            cluster['name'] = row['name']
+        clusters.append(cluster)
+    return {'layer': layer, 'precision': precision, 'clusters': clusters}
+
+
+def cluster_points(layer, bbox=None, zoom=0, city=None):
+    rows, precision = cluster_queryset(layer, bbox, zoom, city)
+    return cluster_payload(layer, precision, rows)
+
+
+async def acluster_points(layer, bbox=None, zoom=0, city=None):
+    rows, precision = cluster_queryset(layer, bbox, zoom, city)
+    return cluster_payload(layer, precision, [row async for row in rows])
+
+
+def bounds_aggregates(prefix):
+    return {'south': Min(f'{prefix}latitude'), 'west': Min(f'{prefix}longitude'),
+            'north': Max(f'{prefix}latitude'), 'east': Max(f'{prefix}longitude')}
+
+
+def bounds_payload(bounds):
+    if bounds['south'] is None:
+        return None
+    return [[float(bounds['south']), float(bounds['west'])], [float(bounds['north']), float(bounds['east'])]]
+
+
+def layer_bounds(layer, city=None):
+    qs, prefix = layer_queryset(layer, city=city)
+    return bounds_payload(qs.aggregate(**bounds_aggregates(prefix)))
+
+
+async def alayer_bounds(layer, city=None):
+    qs, prefix = layer_queryset(layer, city=city)
+    return bounds_payload(await qs.aaggregate(**bounds_aggregates(prefix)))
+
+
+#-----------------Packed point payloads--------------------------------
+
+# Points returned by one request; past this the payload is flagged as truncated
+POINT_LIMIT = 200000
+TRUNCATED = 1
+
+
+def layer_points(layer, bbox=None, city=None, limit=POINT_LIMIT):
+    """Return ``(rows, truncated)`` with one ``(latitude, longitude, id)`` row per point."""
+    qs, prefix = layer_queryset(layer, bbox, city)
+    rows = list(qs.values_list(f'{prefix}latitude', f'{prefix}longitude', 'id').order_by()[:limit + 1])
+    return rows[:limit], len(rows) > limit
+
+
+def pack_points(rows, truncated=False):
+    """Columns of little-endian 32-bit values: a uint32 point count and a uint32
+    flags word, then the float32 latitudes, the float32 longitudes and the uint32
+    ids. Each column can be read straight into a typed array in the browser.
+    """
+    latitudes, longitudes, ids = zip(*rows) if rows else ((), (), ())
+    columns = [array('f', latitudes), array('f', longitudes), array('I', ids)]
+    if sys.byteorder == 'big':
+        for column in columns:
+            column.byteswap()
+    header = struct.pack('<II', len(rows), TRUNCATED if truncated else 0)
+    return header + b''.join(column.tobytes() for column in columns)
+
+
+#-----------------Nearest-neighbour index--------------------------------
+
+def to_xyz(latitude, longitude):
+    lat, lon = math.radians(float(latitude)), math.radians(float(longitude))
+    return (math.cos(lat) * math.cos(lon), math.cos(lat) * math.sin(lon), math.sin(lat))
+
+
+def chord_to_km(chord):
+    return 2 * geo.EARTH_RADIUS_KM * math.asin(min(1.0, chord / 2))
+
+
+def km_to_chord(km):
+    return 2 * math.sin(min(math.pi, km / geo.EARTH_RADIUS_KM) / 2)
+
+
+class PointIndex:
+    """KD-tree over points on the unit sphere.
+
+    Straight-line (chord) distance between unit vectors grows monotonically
+    with great-circle distance, so a plain 3-d tree answers k-nearest and
+    radius queries without any trigonometry at query time.
+    """
+
+    def __init__(self, items):
+        # items: iterable of (latitude, longitude, payload)
+        points = [(to_xyz(lat, lon), payload) for lat, lon, payload in items]
+        self.size = len(points)
+        self.root = self._build(points, 0)
+
+    def __len__(self):
+        return self.size
+
+    def _build(self, points, depth):
+        if not points:
+            return None
+        axis = depth % 3
+        points.sort(key=lambda point: point[0][axis])
+        mid = len(points) // 2
+        return (points[mid], axis,
+                self._build(points[:mid], depth + 1),
+                self._build(points[mid + 1:], depth + 1))
+
+    def nearest(self, latitude, longitude, k=1):
+        target = tx, ty, tz = to_xyz(latitude, longitude)
+        heap = []  # max-heap on squared distance via negation
+        counter = 0
+
+        def visit(node):
+            nonlocal counter
+            if node is None:
+                return
+            (xyz, payload), axis, left, right = node
+            dist = (xyz[0] - tx) ** 2 + (xyz[1] - ty) ** 2 + (xyz[2] - tz) ** 2
+            if len(heap) < k:
+                heapq.heappush(heap, (-dist, counter, payload))
+                counter += 1
+            elif dist < -heap[0][0]:
+                heapq.heapreplace(heap, (-dist, counter, payload))
+                counter += 1
+            diff = target[axis] - xyz[axis]
+            near, far = (left, right) if diff < 0 else (right, left)
+            visit(near)
+            if len(heap) < k or diff * diff < -heap[0][0]:
+                visit(far)
+
+        if k > 0:
+            visit(self.root)
+        return [(chord_to_km(math.sqrt(-neg)), payload) for neg, _, payload in sorted(heap, reverse=True)]
+
+    def within(self, latitude, longitude, radius_km):
+        target = tx, ty, tz = to_xyz(latitude, longitude)
+        limit = km_to_chord(radius_km) ** 2
+        found = []
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            if node is None:
+                continue
+            (xyz, payload), axis, left, right = node
+            dist = (xyz[0] - tx) ** 2 + (xyz[1] - ty) ** 2 + (xyz[2] - tz) ** 2
+            if dist <= limit:
+                found.append((chord_to_km(math.sqrt(dist)), payload))
+            diff = target[axis] - xyz[axis]
+            stack.append(left if diff < 0 else right)
+            if diff * diff <= limit:
+                stack.append(right if diff < 0 else left)
+        found.sort(key=lambda match: match[0])
+        return found
+
+
+def build_station_index():
+    rows = (FireStation.objects
+            .exclude(latitude__isnull=True)
+            .exclude(longitude__isnull=True)
+            .values_list('latitude', 'longitude', 'id', 'name'))
+    return PointIndex(
+        (lat, lon, {'id': pk, 'name': name, 'latitude': float(lat), 'longitude': float(lon)})
+        for lat, lon, pk, name in rows.iterator())
+
+
+# Built lazily in each worker process and rebuilt once the FireStation version
+# moves, whichever process saved the change.
+_station_index = cache.VersionedMemo(build_station_index, FireStation)
+
+
+def station_index():
+    return _station_index.get()
+
+
+def invalidate_station_index():
+    _station_index.clear()
+
+
+def coordinates(location):
+    if isinstance(location, (tuple, list)):
+        return location
+    return location.latitude, location.longitude
+
+
+def _station_results(matches):
+    return [dict(station, distance_km=round(distance, 3)) for distance, station in matches]
+
+
+def nearest_stations(location, k=5):
+    """Return the ``k`` stations closest to a Locations row or a (lat, lon) pair."""
+    latitude, longitude = coordinates(location)
+    if latitude is None or longitude is None:
+        return []
+    return _station_results(station_index().nearest(latitude, longitude, k))
+
+
+def stations_within(location, radius_km):
+    latitude, longitude = coordinates(location)
+    if latitude is None or longitude is None:
+        return []
+    return _station_results(station_index().within(latitude, longitude, radius_km))
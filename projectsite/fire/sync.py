@@ -0,0 +1,114 @@
+import base64
+import json
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from fire.models import FireStation, FireTruck, Firefighters, Incident, Locations, Tombstone, WeatherConditions
+
+# name used in tokens and responses -> model
+SYNC_MODELS = {
+    'locations': Locations,
+    'stations': FireStation,
+    'incidents': Incident,
+    'trucks': FireTruck,
+    'firefighters': Firefighters,
+    'weather': WeatherConditions,
+}
+MODEL_NAMES = {model._meta.label_lower: name for name, model in SYNC_MODELS.items()}
+DELETED = 'deleted'
+
+# auto_now stamps a row when it is saved, not when its transaction commits, so the
+# newest few seconds are held back until any slower transaction has landed.
+SETTLE = timedelta(seconds=getattr(settings, 'FIRE_SYNC_SETTLE_SECONDS', 2))
+# Tombstones older than this are pruned; a client further behind must start over.
+TOMBSTONE_RETENTION = timedelta(days=getattr(settings, 'FIRE_TOMBSTONE_DAYS', 90))
+
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+
+class ExpiredToken(Exception):
+    pass
+
+
+def encode_token(cursors):
+    raw = json.dumps({name: [stamp.isoformat(), pk] for name, (stamp, pk) in cursors.items()})
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_token(token):
+    """Return ``{stream: (timestamp, pk)}``; an empty token starts from the beginning."""
+    cursors = {name: (EPOCH, 0) for name in [*SYNC_MODELS, DELETED]}
+    if not token:
+        return cursors
+    try:
+        raw = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+        for name, (stamp, pk) in raw.items():
+            if name in cursors:
+                stamp = datetime.fromisoformat(stamp)
+                # Compared with aware timestamps below, where a naive one would raise TypeError
+                if timezone.is_naive(stamp):
+                    raise ValueError('Naive timestamp in sync token')
+                cursors[name] = (stamp, int(pk))
+    except (ValueError, TypeError, AttributeError):
+        raise ValueError('Invalid sync token')
+    return cursors
+
+
+def after(field, stamp, pk):
+    return Q(**{f'{field}__gt': stamp}) | Q(**{field: stamp, 'id__gt': pk})
+
+
+def fetch(queryset, field, cursor, until, limit):
+    """Up to ``limit`` rows past ``cursor`` in (field, id) order; return ``(rows, more)``."""
+    rows = list(queryset.filter(after(field, *cursor), **{f'{field}__lte': until})
+                .order_by(field, 'id')[:limit + 1])
+    return rows[:limit], len(rows) > limit
+
+
+def changes_since(token, limit=500):
+    cursors = decode_token(token)
+    now = timezone.now()
+    if token and cursors[DELETED][0] < now - TOMBSTONE_RETENTION:
+        raise ExpiredToken('Sync token is older than the tombstone history; sync from scratch')
+    until = now - SETTLE
+
+    result = {'changed': {}, 'deleted': {}, 'has_more': False}
+    for name, model in SYNC_MODELS.items():
+        fields = [field.attname for field in model._meta.concrete_fields]
+        rows, more = fetch(model._default_manager.values(*fields), 'updated_at', cursors[name], until, limit)
+        result['changed'][name] = rows
+        result['has_more'] |= more
+        if rows:
+            cursors[name] = (rows[-1]['updated_at'], rows[-1]['id'])
+
+    tombstones, more = fetch(Tombstone.objects.values('id', 'model', 'object_id', 'deleted_at'),
+                             'deleted_at', cursors[DELETED], until, limit)
+    result['has_more'] |= more
+    for tombstone in tombstones:
+        name = MODEL_NAMES.get(tombstone['model'])
+        if name:
+            result['deleted'].setdefault(name, []).append(tombstone['object_id'])
+    if more:
+        cursors[DELETED] = (tombstones[-1]['deleted_at'], tombstones[-1]['id'])
+    else:
+        # Every deletion up to the settle point has been sent; moving the cursor there
+        # keeps a client that simply saw no deletions from looking expired later.
+        cursors[DELETED] = (until, 0)
+
+    result['next'] = encode_token(cursors)
+    return result
+
+
+def record_deletion(instance):
+    Tombstone.objects.create(model=instance._meta.label_lower, object_id=instance.pk)
+
+
+def record_deletions(model, pks):
+    Tombstone.objects.bulk_create([Tombstone(model=model._meta.label_lower, object_id=pk) for pk in pks])
+
+
+def prune_tombstones(older_than=TOMBSTONE_RETENTION):
+    return Tombstone.objects.filter(deleted_at__lt=timezone.now() - older_than).delete()[0]
@@ -0,0 +1,43 @@
+from django import template
+from django.conf import settings
+from django.utils.safestring import mark_safe
+
+from fire import cache
+
+register = template.Library()
+
+
+class FragmentNode(template.Node):
+    def __init__(self, nodelist, name, vary_on):
+        self.nodelist = nodelist
+        self.name = name
+        self.vary_on = vary_on
+
+    def render(self, context):
+        if not getattr(settings, 'FIRE_FRAGMENT_CACHE', False):
+            return self.nodelist.render(context)
+        key = cache.fragment_key(self.name.resolve(context), [value.resolve(context) for value in self.vary_on])
+        store = cache.get_cache()
+        content = store.get(key)
+        if content is None:
+            content = str(self.nodelist.render(context))
+            store.set(key, content, timeout=getattr(settings, 'FIRE_FRAGMENT_CACHE_TIMEOUT', 3600))
+        return mark_safe(content)
+
+
+@register.tag
+def fragment(parser, token):
+    """Cache the enclosed template until one of the values it varies on changes::
+
+        {% fragment 'incident-row' object object.location %}...{% endfragment %}
+
+    Model instances count as changed when their ``updated_at`` moves, so a row
+    fragment names every row it renders fields of. Anything else is compared by
+    its string form.
+    """
+    bits = token.split_contents()
+    if len(bits) < 2:
+        raise template.TemplateSyntaxError(f"'{bits[0]}' tag requires a fragment name.")
+    nodelist = parser.parse(('endfragment',))
+    parser.delete_first_token()
+    return FragmentNode(nodelist, parser.compile_filter(bits[1]), [parser.compile_filter(bit) for bit in bits[2:]])
@@ -0,0 +1,16 @@
+from pathlib import Path
+
+from django.template import engines
+
+
+def precompile_templates():
+    """Compile every project template once at startup, so with the cached loader
+    no request pays for parsing one.
+    """
+    engine = engines['django']
+    compiled = 0
+    for directory in engine.engine.dirs:
+        for path in sorted(Path(directory).rglob('*.html')):
+            engine.get_template(path.relative_to(directory).as_posix())
+            compiled += 1
+    return compiled
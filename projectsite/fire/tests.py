@@ -1,3 +1,1160 @@
-from django.test import TestCase
+from collections import Counter
+from datetime import date, datetime, timedelta
+import asyncio
+import csv
+import importlib
+import io
+import json
+import random
+import struct
+from unittest import mock
 
-# Create your tests here.
+from django.apps import apps as django_apps
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection, connections
+from django.db.models import Count, Max, Min, QuerySet
+from django.test import SimpleTestCase, TestCase
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import resolve, reverse
+from django.utils import timezone
+
+from fire import (analytics, async_api, cache, coverage, dashboard, db, dispatch, events, exporters, geo, metrics,
+                  pagination, rollups, search, spatial, sync)
+
+from fire.models import (Locations, Incident, FireStation, FireTruck, Firefighters, WeatherConditions, IncidentRollup,
+                         LocationCoverage, Tombstone)
+
+# Queries a list page may issue regardless of how many rows it shows:
+# COUNT for the paginator, the page itself, and a little headroom.
+LIST_QUERY_BUDGET = 4
+
+
+class ListViewQueryBudgetTests(TestCase):
+    url_names = [
+        'location-list',
+        'firestation-list',
+        'fireincident-list',
+        'firetruck-list',
+        'firefighter-list',
+        'weathercondition-list',
+    ]
+
+    @classmethod
+    def setUpTestData(cls):
+        for i in range(12):
+            location = Locations.objects.create(
+                name=f"Location {i}", latitude=9.7 + i / 100, longitude=118.7 + i / 100,
+                address=f"{i} Rizal Ave", city="Puerto Princesa", country="Philippines")
+            station = FireStation.objects.create(
+                name=f"Station {i}", latitude=9.8 + i / 100, longitude=118.8 + i / 100,
+                address=f"{i} Malvar St", city="Puerto Princesa", country="Philippines")
+            incident = Incident.objects.create(
+                location=location, date_time="2024-03-01", severity_level="Minor Fire",
+                description="Grass fire")
+            FireTruck.objects.create(truck_number=f"T-{i}", model="Tesla", capacity=2000, station=station)
+            Firefighters.objects.create(name=f"Firefighter {i}", rank="Captain", experience_level="Expert",
+                                        station=station)
+            WeatherConditions.objects.create(incident=incident, temperature=30, humidity=70, wind_speed=12,
+                                             weather_description="Sunny")
+
+    def assertWithinBudget(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertLessEqual(
+            len(queries), LIST_QUERY_BUDGET,
+            f"{url} issued {len(queries)} queries:\n" + "\n".join(q['sql'] for q in queries))
+
+    def test_list_pages_stay_within_query_budget(self):
+        for name in self.url_names:
+            with self.subTest(name=name):
+                self.assertWithinBudget(reverse(name))
+
+    def test_search_and_cursor_pages_stay_within_query_budget(self):
+        for name in self.url_names:
+            for query in ("?q=Puerto", "?q=1", "?cursor="):
+                with self.subTest(name=name, query=query):
+                    self.assertWithinBudget(reverse(name) + query)
+
+    def test_ranked_search_runs_match_once(self):
+        if not isinstance(search.get_backend(), search.SQLiteFTSBackend):
+            self.skipTest("FTS5 is not available")
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('fireincident-list') + "?q=Puerto")
+        self.assertEqual(len(response.context['object_list']), 10)
+        # A MATCH repeated per row (e.g. in a correlated rank subquery) makes the
+        # page cost grow with the number of matches rather than the page size.
+        for query in queries:
+            self.assertLessEqual(query['sql'].count('MATCH'), 1, query['sql'])
+            with connection.cursor() as cursor:
+                cursor.execute(f"EXPLAIN QUERY PLAN {query['sql']}")
+                plan = [row[3] for row in cursor.fetchall()]
+            self.assertFalse([line for line in plan if 'CORRELATED' in line], plan)
+
+    @override_settings(FIRE_ESTIMATED_COUNTS=True)
+    def test_estimated_count_never_pages_past_the_end(self):
+        url = reverse('location-list')
+        self.assertContains(self.client.get(url), "out of about <b>12</b>")
+        # Deleted rows leave gaps in the primary keys, so Max(pk) now overestimates
+        pks = list(Locations.objects.order_by('pk').values_list('pk', flat=True))
+        Locations.objects.filter(pk__in=pks[:-3]).delete()
+        response = self.client.get(url + "?page=last")
+        page = response.context['page_obj']
+        self.assertEqual((page.number, len(page.object_list), page.has_next()), (1, 3, False))
+        self.assertEqual((page.paginator.count, page.paginator.estimated), (3, False))
+
+    @override_settings(FIRE_FRAGMENT_CACHE=True)
+    def test_cached_row_fragments_follow_updates(self):
+        url = reverse('fireincident-list')
+        location = Incident.objects.order_by('pk').first().location
+        cell = f"<td>{location.name}</td>"
+        self.assertContains(self.client.get(url), cell)
+        self.assertContains(self.client.get(url), cell)
+        # A row shows its location's fields, so renaming the location must re-render it
+        location.name = "Renamed location"
+        location.save()
+        response = self.client.get(url)
+        self.assertContains(response, "<td>Renamed location</td>")
+        self.assertNotContains(response, cell)
+
+
+
+class BulkActionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.locations = []
+        for i in range(3):
+            location = Locations.objects.create(
+                name=f"Bulk {i}", latitude=9.7, longitude=118.7, address="-", city=f"City {i}", country="Philippines")
+            cls.locations.append(location)
+            for severity in ("Minor Fire", "Major Fire"):
+                incident = Incident.objects.create(location=location, date_time="2024-03-01",
+                                                   severity_level=severity, description="-")
+                WeatherConditions.objects.create(incident=incident, temperature=30, humidity=70, wind_speed=12,
+                                                 weather_description="Sunny")
+
+    def post(self, kind, payload):
+        return self.client.post(reverse('bulk-action', args=[kind]), json.dumps(payload),
+                                content_type='application/json')
+
+    def assertRollupsMatch(self):
+        expected = Counter(Incident.objects.values_list('severity_level', flat=True))
+        rolled_up = Counter()
+        for severity, count in IncidentRollup.objects.values_list('severity_level', 'count'):
+            rolled_up[severity] += count
+        self.assertEqual(rolled_up, expected)
+
+    def test_delete_cascades_in_bulk(self):
+        doomed = [location.pk for location in self.locations[:2]]
+        response = self.post('locations', {'action': 'delete', 'ids': doomed})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['rows'], {
+            'fire.WeatherConditions': 4, 'fire.Incident': 4, 'fire.Locations': 2})
+        self.assertEqual(Incident.objects.count(), 2)
+        self.assertEqual(WeatherConditions.objects.count(), 2)
+        self.assertRollupsMatch()
+        # Sync clients learn about every row that went, cascaded ones included
+        self.assertEqual(Counter(Tombstone.objects.values_list('model', flat=True)),
+                         {'fire.locations': 2, 'fire.incident': 4, 'fire.weatherconditions': 4})
+
+    def test_update_rebuckets_and_stamps_rows(self):
+        incidents = list(Incident.objects.filter(severity_level="Minor Fire"))
+        response = self.post('incidents', {'action': 'update', 'ids': [incident.pk for incident in incidents],
+                                           'values': {'severity_level': "Moderate Fire"}})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['selected'], 3)
+        for incident in incidents:
+            updated = Incident.objects.get(pk=incident.pk)
+            self.assertEqual(updated.severity_level, "Moderate Fire")
+            self.assertGreater(updated.updated_at, incident.updated_at)
+        self.assertRollupsMatch()
+
+    def test_rejects_bad_requests(self):
+        pk = self.locations[0].pk
+        self.assertEqual(self.post('incidents', {'action': 'update', 'ids': [pk],
+                                                 'values': {'severity_level': "Inferno"}}).status_code, 400)
+        self.assertEqual(self.post('locations', {'action': 'update', 'ids': [pk],
+                                                 'values': {'latitude': 1}}).status_code, 400)
+        self.assertEqual(self.post('locations', {'action': 'delete'}).status_code, 400)
+        self.assertEqual(self.post('rollups', {'action': 'delete', 'all': True}).status_code, 404)
+        self.assertEqual(Locations.objects.count(), 3)
+
+    def test_selecting_every_row_needs_a_query_or_a_matching_count(self):
+        for payload in ({}, {'confirm': 2}, {'query': 'Bulk', 'confirm': 4}):
+            with self.subTest(payload=payload):
+                response = self.post('locations', {'action': 'delete', 'all': True, **payload})
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.json()['selected'], 3)
+        self.assertEqual(Locations.objects.count(), 3)
+        response = self.post('locations', {'action': 'update', 'all': True, 'query': 'Bulk',
+                                           'values': {'city': "Roxas"}})
+        self.assertEqual(response.json()['selected'], 3)
+        response = self.post('locations', {'action': 'delete', 'all': True, 'confirm': 3})
+        self.assertEqual(response.json()['rows']['fire.Locations'], 3)
+        self.assertFalse(Locations.objects.exists())
+
+
+class TopCountryMonthsTests(TestCase):
+    year = 2024
+    # (country, month, incidents); Japan and Kenya tie for third place
+    incidents = [
+        ("Philippines", 1, 5), ("Philippines", 3, 2),
+        ("Brazil", 2, 4), ("Brazil", 12, 1),
+        ("Kenya", 6, 3),
+        ("Japan", 4, 2), ("Japan", 5, 1),
+        ("Chile", 7, 1),
+    ]
+
+    @classmethod
+    def setUpTestData(cls):
+        for country, month, count in cls.incidents:
+            location = Locations.objects.create(
+                name=f"{country} {month}", latitude=1, longitude=1, address="-", city="City", country=country)
+            for day in range(1, count + 1):
+                Incident.objects.create(location=location, date_time=date(cls.year, month, day),
+                                        severity_level="Minor Fire", description="-")
+        # Other years must not count towards the ranking
+        location = Locations.objects.create(
+            name="Old", latitude=1, longitude=1, address="-", city="City", country="Chile")
+        for day in range(1, 20):
+            Incident.objects.create(location=location, date_time=date(cls.year - 1, 1, day),
+                                    severity_level="Minor Fire", description="-")
+
+    def expected(self, limit):
+        totals = Counter()
+        for country, month, count in self.incidents:
+            totals[country] += count
+        top = sorted(totals, key=lambda country: (-totals[country], country))[:limit]
+        return sorted(({"country": country, "month": month, "total": count}
+                       for country, month, count in self.incidents if country in top),
+                      key=lambda row: (row["country"], row["month"]))
+
+    def test_plans_agree(self):
+        for limit in (1, 3, 10):
+            with self.subTest(limit=limit):
+                expected = self.expected(limit)
+                self.assertEqual(analytics.two_pass_top_country_months(self.year, limit), expected)
+                if connection.features.supports_over_clause:
+                    self.assertEqual(analytics.ranked_top_country_months(self.year, limit), expected)
+
+    def test_dispatch_follows_backend_features(self):
+        with mock.patch.object(connection.features, "supports_over_clause", False), \
+                CaptureQueriesContext(connection) as queries:
+            fallback = analytics.top_country_months(self.year)
+        self.assertEqual(len(queries), 2)
+        self.assertEqual(fallback, self.expected(3))
+        if connection.features.supports_over_clause:
+            with CaptureQueriesContext(connection) as queries:
+                ranked = analytics.top_country_months(self.year)
+            self.assertEqual(len(queries), 1)
+            self.assertEqual(ranked, fallback)
+
+    def test_dashboard_breaks_ties_like_analytics(self):
+        expected = sorted({row["country"] for row in analytics.top_country_months(self.year)})
+        self.assertEqual(list(dashboard.compute_series(["multiline"], self.year)["multiline"]), expected)
+        # Rows arriving in any order must pick the same countries
+        rows = list(dashboard.series_queryset("multiline", self.year))
+        for ordered in (rows, rows[::-1]):
+            with self.subTest(reversed=ordered is not rows):
+                self.assertEqual(list(dashboard.shape_series("multiline", ordered)), expected)
+
+
+class RollupRaceTests(TestCase):
+    key = rollups.rollup_key(date(2024, 1, 1), "Minor Fire", "Philippines", "Puerto Princesa")
+
+    def setUp(self):
+        # The bucket another writer created after this one looked for it
+        IncidentRollup.objects.create(count=2, **self.key)
+
+    def test_bump_updates_a_bucket_created_after_its_update(self):
+        update = QuerySet.update
+        calls = []
+
+        def racing_update(queryset, **kwargs):
+            calls.append(kwargs)
+            return 0 if len(calls) == 1 else update(queryset, **kwargs)
+
+        with mock.patch.object(QuerySet, "update", racing_update):
+            rollups.bump(self.key, 3)
+        self.assertEqual(IncidentRollup.objects.get(**self.key).count, 5)
+
+    def test_bump_many_updates_buckets_created_after_its_lookup(self):
+        with mock.patch.object(QuerySet, "select_for_update", QuerySet.none):
+            rollups.bump_many({tuple(self.key.values()): 3})
+        self.assertEqual(IncidentRollup.objects.get(**self.key).count, 5)
+
+
+# Rows are held back from a sync until they are SETTLE old; the tests want them at once.
+@mock.patch.object(sync, "SETTLE", timedelta(0))
+class SyncTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.location = Locations.objects.create(
+            name="Depot", latitude=9.7, longitude=118.7, address="-", city="Puerto Princesa", country="Philippines")
+
+    def changes(self, since=""):
+        return self.client.get(reverse("sync"), {"since": since})
+
+    def test_token_round_trip(self):
+        cursors = sync.decode_token("")
+        cursors["locations"] = (datetime(2024, 5, 1, 8, 30, 15, 250, tzinfo=sync.EPOCH.tzinfo), 42)
+        self.assertEqual(sync.decode_token(sync.encode_token(cursors)), cursors)
+
+    def test_rejects_malformed_tokens(self):
+        naive = sync.encode_token({sync.DELETED: (datetime.now(), 1)})
+        for token in (naive, "not a token", sync.encode_token({})[:-1] + "!"):
+            with self.subTest(token=token):
+                self.assertEqual(self.changes(token).status_code, 400)
+
+    def test_next_token_only_returns_newer_changes(self):
+        first = self.changes().json()
+        self.assertEqual([row["id"] for row in first["changed"]["locations"]], [self.location.pk])
+        again = self.changes(first["next"]).json()
+        self.assertEqual(again["changed"]["locations"], [])
+        self.assertEqual(again["deleted"], {})
+
+    def test_deletions_arrive_as_tombstones(self):
+        token = self.changes().json()["next"]
+        pk = self.location.pk
+        self.location.delete()
+        data = self.changes(token).json()
+        self.assertEqual(data["deleted"], {"locations": [pk]})
+
+    def test_token_older_than_tombstones_expires(self):
+        cursors = sync.decode_token("")
+        cursors[sync.DELETED] = (timezone.now() - sync.TOMBSTONE_RETENTION - timedelta(days=1), 0)
+        self.assertEqual(self.changes(sync.encode_token(cursors)).status_code, 410)
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        metrics.registry.reset()
+        self.addCleanup(metrics.registry.reset)
+
+    def test_routes_sharing_a_url_name_get_their_own_label(self):
+        for path in ("/chart/", "/lineChart/"):
+            self.client.get(path)
+        self.assertEqual(set(metrics.registry.responses), {("chart/", 200), ("lineChart/", 200)})
+
+    def test_render_shortcut_counts_as_template_time(self):
+        self.client.get(reverse("map-station"))
+        histogram = metrics.registry.histograms["fire_request_template_duration_seconds", "stations"]
+        self.assertGreater(histogram.sum, 0)
+
+
+class NearestStationTests(TestCase):
+    points = [(9.74, 118.73), (14.6, 121.0), (-33.9, 151.2), (51.5, -0.1), (0.0, 179.9)]
+
+    @classmethod
+    def setUpTestData(cls):
+        rnd = random.Random(7)
+        for i in range(60):
+            # Most stations around Palawan, a few anywhere on the globe
+            if i % 4:
+                latitude, longitude = 9.7 + rnd.uniform(-2, 2), 118.7 + rnd.uniform(-2, 2)
+            else:
+                latitude, longitude = rnd.uniform(-80, 80), rnd.uniform(-180, 180)
+            FireStation.objects.create(name=f"Station {i}", latitude=latitude, longitude=longitude,
+                                       address="-", city="City", country="Country")
+
+    def setUp(self):
+        spatial.invalidate_station_index()
+
+    def brute_force(self, point):
+        return sorted((geo.haversine(*point, station.latitude, station.longitude), station.pk)
+                      for station in FireStation.objects.all())
+
+    def test_index_agrees_with_brute_force(self):
+        for point in self.points:
+            expected = self.brute_force(point)
+            with self.subTest(point=point):
+                nearest = spatial.nearest_stations(point, 7)
+                self.assertEqual([station['id'] for station in nearest], [pk for _, pk in expected[:7]])
+                for station, (distance, _) in zip(nearest, expected):
+                    self.assertAlmostEqual(station['distance_km'], distance, places=2)
+                for radius_km in (50, 300, 5000):
+                    within = spatial.stations_within(point, radius_km)
+                    self.assertEqual([station['id'] for station in within],
+                                     [pk for distance, pk in expected if distance <= radius_km])
+
+    def test_api_clamps_k_and_validates_radius(self):
+        url = reverse('nearest-stations')
+        self.assertEqual(len(self.client.get(url, {'lat': 9.7, 'lon': 118.7, 'k': 1000}).json()['stations']), 50)
+        self.assertEqual(len(self.client.get(url, {'lat': 9.7, 'lon': 118.7, 'k': 0}).json()['stations']), 1)
+        for radius_km in ('0', '-5', 'far'):
+            with self.subTest(radius_km=radius_km):
+                response = self.client.get(url, {'lat': 9.7, 'lon': 118.7, 'radius_km': radius_km})
+                self.assertEqual(response.status_code, 400)
+
+    def test_index_follows_changes_saved_by_other_workers(self):
+        point = (-54.8, -68.3)
+        spatial.nearest_stations(point, 1)
+        station = FireStation.objects.order_by('pk').first()
+        # Another process moves a station: this one only sees the version bump
+        FireStation.objects.filter(pk=station.pk).update(latitude=point[0], longitude=point[1])
+        cache.bump(FireStation)
+        self.assertEqual(spatial.nearest_stations(point, 1)[0]['id'], station.pk)
+
+
+class DispatchSummaryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.station = FireStation.objects.create(name="Central", latitude=9.74, longitude=118.73,
+                                                 address="-", city="Puerto Princesa", country="Philippines")
+        cls.truck = FireTruck.objects.create(truck_number="T-1", model="Tesla", capacity=2000, station=cls.station)
+
+    def setUp(self):
+        dispatch.invalidate_station_summaries()
+
+    def summary(self):
+        return dispatch.station_summaries()[self.station.pk]
+
+    def test_edit_changes_the_summary(self):
+        self.assertEqual(self.summary()['truck_capacity'], 2000)
+        Firefighters.objects.create(name="Ana", rank="Captain", experience_level="Expert", station=self.station)
+        self.truck.capacity = 3000
+        self.truck.save()
+        self.assertEqual((self.summary()['truck_capacity'], self.summary()['senior_firefighters']), (3000, 1))
+
+    def test_summary_follows_changes_saved_by_other_workers(self):
+        self.assertEqual(self.summary()['truck_capacity'], 2000)
+        # Another process edits the truck: this one only sees the version bump
+        FireTruck.objects.filter(pk=self.truck.pk).update(capacity=500)
+        cache.bump(FireTruck)
+        self.assertEqual(self.summary()['truck_capacity'], 500)
+
+
+class EventBusTests(SimpleTestCase):
+    def test_replay_returns_missed_events_or_none_when_dropped(self):
+        bus = events.EventBus(size=3)
+        ids = [bus.publish('incident.created', {'id': pk}) for pk in range(5)]
+        self.assertEqual([event[0] for event in bus.replay(ids[2])], ids[3:])
+        self.assertEqual(bus.replay(ids[-1]), [])
+        # Events 1 and 2 have left the buffer, and ids from the future are unknown
+        self.assertIsNone(bus.replay(ids[0]))
+        self.assertIsNone(bus.replay(ids[-1] + 1))
+
+    def test_subscribers_receive_events_published_from_other_threads(self):
+        async def receive():
+            bus = events.EventBus()
+            queue = bus.subscribe()
+            await asyncio.get_running_loop().run_in_executor(None, bus.publish, 'truck.updated', {'id': 1})
+            return await asyncio.wait_for(queue.get(), 1)
+
+        self.assertEqual(asyncio.run(receive())[1:], ('truck.updated', '{"id": 1}'))
+
+    def test_publish_drops_subscribers_whose_loop_closed(self):
+        bus = events.EventBus()
+
+        async def subscribe():
+            bus.subscribe()
+
+        asyncio.run(subscribe())
+        bus.publish('reset', {})
+        self.assertEqual(bus.subscribers, set())
+
+    @mock.patch.object(async_api, "HEARTBEAT", 0.01)
+    @mock.patch.object(async_api, "STREAM_LIFETIME", 0.05)
+    def test_stream_ends_after_its_lifetime_and_unsubscribes(self):
+        async def consume():
+            return [line async for line in async_api.event_stream(None, set())]
+
+        lines = asyncio.run(asyncio.wait_for(consume(), 1))
+        self.assertTrue(lines[0].startswith('retry: '))
+        self.assertIn(': keep-alive\n\n', lines)
+        self.assertEqual(events.bus.subscribers, set())
+
+
+class LiveEventsTests(SimpleTestCase):
+    def get(self, last_event_id, types=''):
+        response = self.client.get(reverse('live-events'), {'types': types}, HTTP_LAST_EVENT_ID=str(last_event_id))
+        return response.content.decode()
+
+    def test_reconnect_replays_missed_events_of_the_wanted_types(self):
+        start = events.bus.last_id
+        incident = events.bus.publish('incident.created', {'id': 1})
+        truck = events.bus.publish('truck.updated', {'id': 2})
+        reset = events.bus.publish('reset', {'model': 'incident'})
+        body = self.get(start, 'incident')
+        self.assertIn(f'id: {incident}\nevent: incident.created', body)
+        self.assertIn(f'id: {reset}\nevent: reset', body)
+        self.assertNotIn('truck.updated', body)
+        self.assertIn(f'id: {truck}\nevent: truck.updated', self.get(start))
+        self.assertNotIn('event:', self.get(reset))
+
+    def test_client_too_far_behind_gets_a_reset(self):
+        self.assertIn('event: reset\ndata: {"reason": "replay"}', self.get(events.bus.last_id + 100))
+
+
+class DashboardConditionalTests(TestCase):
+    urls = ('dashboard-api', 'async-dashboard-api')
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.location = Locations.objects.create(
+            name="Depot", latitude=9.7, longitude=118.7, address="-", city="Puerto Princesa", country="Philippines")
+        Incident.objects.create(location=cls.location, date_time=date.today(), severity_level="Minor Fire",
+                                description="-")
+
+    def get(self, name, etag=None):
+        headers = {'HTTP_IF_NONE_MATCH': etag} if etag else {}
+        return self.client.get(reverse(name), **headers)
+
+    def test_unchanged_data_answers_304(self):
+        for name in self.urls:
+            with self.subTest(name=name):
+                response = self.get(name)
+                self.assertEqual(response.status_code, 200)
+                self.assertTrue(response.has_header('Last-Modified'))
+                self.assertEqual(self.get(name, response['ETag']).status_code, 304)
+
+    def test_moving_a_location_changes_the_etag(self):
+        etags = {name: self.get(name)['ETag'] for name in self.urls}
+        self.location.country = "Japan"
+        self.location.save()
+        for name in self.urls:
+            with self.subTest(name=name):
+                response = self.get(name, etags[name])
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(list(response.json()['multiline'])[0], "Japan")
+
+    def test_new_incident_changes_the_etag(self):
+        etags = {name: self.get(name)['ETag'] for name in self.urls}
+        Incident.objects.create(location=self.location, date_time=date.today(), severity_level="Major Fire",
+                                description="-")
+        for name in self.urls:
+            with self.subTest(name=name):
+                self.assertEqual(self.get(name, etags[name]).status_code, 200)
+
+
+class IncidentCountCacheTests(TestCase):
+    year = 2023
+
+    @classmethod
+    def setUpTestData(cls):
+        location = Locations.objects.create(
+            name="Depot", latitude=9.7, longitude=118.7, address="-", city="Puerto Princesa", country="Philippines")
+        cls.incidents = [Incident.objects.create(location=location, date_time=date(cls.year, month, 10),
+                                                 severity_level="Minor Fire", description="-")
+                         for month in range(1, 13)]
+
+    def setUp(self):
+        cache.get_cache().clear()
+
+    def month_versions(self):
+        return cache.key_versions([analytics.period_version_key('month', date(self.year, month, 1))
+                                   for month in range(1, 13)])
+
+    def test_partial_ends_are_counted_without_the_cached_middle(self):
+        start, end = date(self.year, 1, 15), date(self.year, 12, 10)
+        first = analytics.incident_counts(start, end)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(analytics.incident_counts(start, end), first)
+        # Only the cut January and December are recounted, each on its own
+        self.assertEqual(len(queries), 2)
+        self.assertIn(f"'{self.year}-01-31'", queries[0]['sql'])
+        self.assertIn(f"'{self.year}-12-01'", queries[1]['sql'])
+
+    def test_editing_an_incident_bumps_only_its_period(self):
+        start, end = date(self.year, 1, 1), date(self.year, 12, 31)
+        analytics.incident_counts(start, end)
+        before = self.month_versions()
+        incident = self.incidents[2]
+        incident.severity_level = "Major Fire"
+        incident.save()
+        after = self.month_versions()
+        self.assertEqual([month for month in range(1, 13) if before[month - 1] != after[month - 1]], [3])
+        with CaptureQueriesContext(connection) as queries:
+            counts = analytics.incident_counts(start, end)
+        self.assertEqual(len(queries), 1)
+        self.assertEqual([row['counts'] for row in counts], [{None: 1}] * 12)
+
+
+class CoverageTests(TestCase):
+    def setUp(self):
+        cache.get_cache().clear()
+        spatial.invalidate_station_index()
+        rnd = random.Random(11)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.stations = [FireStation.objects.create(
+                name=f"Station {i}", latitude=9.7 + rnd.uniform(-1, 1), longitude=118.7 + rnd.uniform(-1, 1),
+                address="-", city="Puerto Princesa", country="Philippines") for i in range(8)]
+            self.locations = [Locations.objects.create(
+                name=f"Location {i}", latitude=9.7 + rnd.uniform(-1.5, 1.5), longitude=118.7 + rnd.uniform(-1.5, 1.5),
+                address="-", city="Puerto Princesa", country="Philippines") for i in range(40)]
+
+    def assertCoverageIsNearest(self):
+        stations = FireStation.objects.all()
+        for location in Locations.objects.select_related('coverage'):
+            distance, station_id = min((geo.haversine(location.latitude, location.longitude,
+                                                      station.latitude, station.longitude), station.pk)
+                                       for station in stations)
+            with self.subTest(location=location.pk):
+                self.assertEqual(location.coverage.station_id, station_id)
+                self.assertAlmostEqual(location.coverage.distance_km, distance, places=2)
+
+    def test_new_rows_are_covered(self):
+        self.assertEqual(LocationCoverage.objects.count(), len(self.locations))
+        self.assertCoverageIsNearest()
+
+    def test_moving_a_station_updates_coverage(self):
+        station = self.stations[0]
+        for latitude, longitude in ((11.2, 119.9), (8.3, 117.4), (9.7, 118.7)):
+            station.latitude, station.longitude = latitude, longitude
+            with self.captureOnCommitCallbacks(execute=True):
+                station.save()
+            self.assertCoverageIsNearest()
+
+    def test_moving_a_location_updates_coverage(self):
+        location = self.locations[0]
+        for station in self.stations[:3]:
+            location.latitude, location.longitude = station.latitude + 0.001, station.longitude
+            with self.captureOnCommitCallbacks(execute=True):
+                location.save()
+            self.assertEqual(LocationCoverage.objects.get(location=location).station_id, station.pk)
+        self.assertCoverageIsNearest()
+
+    def test_deleting_a_station_reassigns_its_locations(self):
+        station = LocationCoverage.objects.values('station').annotate(n=Count('pk')).order_by('-n')[0]['station']
+        with self.captureOnCommitCallbacks(execute=True):
+            FireStation.objects.get(pk=station).delete()
+        self.assertFalse(LocationCoverage.objects.filter(station__isnull=True).exists())
+        self.assertCoverageIsNearest()
+
+    def test_migration_backfills_coverage(self):
+        migration = importlib.import_module('fire.migrations.0008_coverage')
+        LocationCoverage.objects.all().delete()
+        migration.populate_coverage(django_apps, None)
+        self.assertEqual(LocationCoverage.objects.count(), len(self.locations))
+        self.assertCoverageIsNearest()
+
+    def test_uncovered_radius_is_read_per_request(self):
+        url = reverse('uncovered-locations')
+        furthest = LocationCoverage.objects.aggregate(furthest=Max('distance_km'))['furthest']
+        with override_settings(FIRE_COVERAGE_RADIUS_KM=furthest + 1):
+            response = self.client.get(url).json()
+        self.assertEqual(response['total'], 0)
+        cache.get_cache().clear()
+        with override_settings(FIRE_COVERAGE_RADIUS_KM=0.001):
+            response = self.client.get(url).json()
+        self.assertEqual((response['radius_km'], response['total']), (0.001, len(self.locations)))
+
+
+class ImportTests(TestCase):
+    header = "location_name,city,country,address,date_time,severity_level,description\n"
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.location = Locations.objects.create(name="Market", latitude=9.74, longitude=118.73, address="-",
+                                                city="Puerto Princesa", country="Philippines")
+
+    def row(self, i, severity="Minor Fire", date_time="2024-03-01"):
+        return f"Market,Puerto Princesa,Philippines,,{date_time},{severity},Row {i}\n"
+
+    def upload(self, content, kind='incidents', name='incidents.csv', **data):
+        if isinstance(content, str):
+            content = content.encode()
+        data['file'] = SimpleUploadedFile(name, content)
+        return self.client.post(reverse('import-data', args=[kind]), data)
+
+    def test_rejects_bad_requests(self):
+        self.assertEqual(self.client.post(reverse('import-data', args=['stations'])).status_code, 404)
+        self.assertEqual(self.client.post(reverse('import-data', args=['incidents'])).status_code, 400)
+        self.assertEqual(self.upload(self.header, format='xml').status_code, 400)
+        self.assertEqual(self.upload(self.header, batch_size='many').status_code, 400)
+        self.assertFalse(Incident.objects.exists())
+
+    def test_reports_error_rows_and_keeps_the_rest(self):
+        content = (self.header + self.row(1) + self.row(2, severity="Inferno") + self.row(3, date_time="March")
+                   + "Nowhere,Atlantis,Sea,,2024-03-01,Minor Fire,lost\n" + self.row(5))
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.upload(content)
+        self.assertEqual(response.status_code, 207)
+        summary = response.json()
+        self.assertEqual((summary['created'], summary['failed'], summary['batches']), (2, 3, 1))
+        self.assertEqual([error['line'] for error in summary['errors']], [3, 4, 5])
+        self.assertIn('severity_level', summary['errors'][0]['errors'])
+        self.assertIn('date_time', summary['errors'][1]['errors'])
+        self.assertIn('location', summary['errors'][2]['errors'])
+        self.assertEqual(sorted(Incident.objects.values_list('description', flat=True)), ["Row 1", "Row 5"])
+
+    def test_creates_unknown_locations_with_an_address(self):
+        content = self.header + "Pier,El Nido,Philippines,1 Bay Rd,2024-03-01,Major Fire,new\n"
+        self.assertEqual(self.upload(content).status_code, 200)
+        self.assertEqual(Incident.objects.get().location.address, "1 Bay Rd")
+
+    def test_writes_in_batches(self):
+        content = self.header + "".join(self.row(i) for i in range(7))
+        response = self.upload(content, batch_size=3)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.json()['batches'], response.json()['created']), (3, 7))
+        self.assertEqual(Incident.objects.count(), 7)
+
+    def test_ndjson_reports_bad_lines(self):
+        content = '{"location_id": %d, "date_time": "2024-03-01", "severity_level": "Minor Fire", "description": "-"}\n[1]\n{oops\n' % (
+            self.location.pk)
+        response = self.upload(content, name='incidents.ndjson')
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual([error['line'] for error in response.json()['errors']], [2, 3])
+        self.assertEqual(Incident.objects.count(), 1)
+
+    def test_malformed_upload_returns_400_with_the_batches_so_far(self):
+        content = (self.header + "".join(self.row(i) for i in range(4))).encode() + b"\xff\xfe,broken\n"
+        response = self.upload(content, batch_size=2)
+        self.assertEqual(response.status_code, 400)
+        summary = response.json()
+        self.assertIn('error', summary)
+        # How far the decoder got depends on its read-ahead; whatever was written is reported
+        self.assertGreater(summary['batches'], 0)
+        self.assertEqual(summary['created'], Incident.objects.count())
+        self.assertEqual(summary['created'], 2 * summary['batches'])
+
+
+class CachedPageInvalidationTests(TestCase):
+    """Every change to a model a cached page depends on must make that page miss."""
+    pages = ['/chart/', '/lineChart/', '/multilineChart/', '/multiBarChart/', '/Incidents',
+             '/api/dashboard/', '/api/map/clusters/', '/api/map/points/?format=json',
+             '/api/stations/nearest/?lat=9.74&lon=118.73', '/api/coverage/heatmap/', '/api/coverage/uncovered/',
+             '/api/async/chart/pie/', '/api/async/map/']
+
+    def setUp(self):
+        cache.get_cache().clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.location = Locations.objects.create(name="Market", latitude=9.74, longitude=118.73, address="-",
+                                                     city="Puerto Princesa", country="Philippines")
+            self.station = FireStation.objects.create(name="Central", latitude=9.75, longitude=118.74, address="-",
+                                                      city="Puerto Princesa", country="Philippines")
+            self.incident = Incident.objects.create(location=self.location, date_time=date.today(),
+                                                    severity_level="Minor Fire", description="-")
+
+    def new_row(self, model):
+        if model is Locations:
+            return Locations.objects.create(name="Pier", latitude=9.8, longitude=118.8, address="-",
+                                            city="El Nido", country="Philippines")
+        if model is FireStation:
+            return FireStation.objects.create(name="North", latitude=9.9, longitude=118.9, address="-",
+                                              city="El Nido", country="Philippines")
+        return Incident.objects.create(location=self.location, date_time=date.today(),
+                                       severity_level="Major Fire", description="-")
+
+    def changes(self, model):
+        """``(label, callable)`` pairs that each write ``model`` the way the app does."""
+        if model is IncidentRollup:
+            return [('rebuild', rollups.rebuild)]
+        if model is LocationCoverage:
+            return [('rebuild', coverage.rebuild), ('location', lambda: coverage.location_changed(self.location.pk))]
+        row = self.new_row(model)
+
+        def save():
+            row.description = row.name = "Edited"
+            row.save()
+        return [('save', save), ('delete', row.delete)]
+
+    def rendered(self, url):
+        """Fetch ``url`` and say whether the view ran, rather than the page coming from the cache."""
+        stores, get_cache = [], cache.get_cache
+
+        def spy():
+            stores.append(mock.Mock(wraps=get_cache()))
+            return stores[-1]
+        with mock.patch('fire.cache.get_cache', spy):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return any(name in ('set', 'aset') and args[0].startswith('fire:view:')
+                   for store in stores for name, args, kwargs in store.mock_calls)
+
+    def assertInvalidatedBy(self, url, change):
+        self.rendered(url)
+        self.assertFalse(self.rendered(url))
+        with self.captureOnCommitCallbacks(execute=True):
+            change()
+        self.assertTrue(self.rendered(url))
+
+    def test_saves_and_deletes_invalidate_dependent_pages(self):
+        for url in self.pages:
+            models = resolve(url.split('?')[0]).func.cache_models
+            for model in models:
+                for label, change in self.changes(model):
+                    with self.subTest(url=url, model=model.__name__, change=label):
+                        self.assertInvalidatedBy(url, change)
+
+    def test_bulk_actions_invalidate_dependent_pages(self):
+        for url in ('/api/dashboard/', '/api/map/clusters/', '/api/async/map/'):
+            for kind, model in (('locations', Locations), ('incidents', Incident), ('stations', FireStation)):
+                if model not in resolve(url.split('?')[0]).func.cache_models:
+                    continue
+                row = self.new_row(model)
+                field = 'description' if model is Incident else 'name'
+                update = {'action': 'update', 'ids': [row.pk], 'values': {field: "Bulk"}}
+                for payload in (update, {'action': 'delete', 'ids': [row.pk]}):
+                    with self.subTest(url=url, kind=kind, action=payload['action']):
+                        self.assertInvalidatedBy(url, lambda: self.client.post(
+                            reverse('bulk-action', args=[kind]), json.dumps(payload), content_type='application/json'))
+
+
+class MapClusterTests(TestCase):
+    boxes = [(117.0, 8.0, 120.0, 11.0), (-10.0, -60.0, 40.0, 10.0), (170.0, -50.0, -170.0, 50.0),
+             (-180.0, -90.0, 180.0, 90.0)]
+
+    @classmethod
+    def setUpTestData(cls):
+        rnd = random.Random(3)
+        for i in range(120):
+            if i % 3:
+                latitude, longitude = 9.7 + rnd.uniform(-1, 1), 118.7 + rnd.uniform(-1, 1)
+            else:
+                latitude, longitude = rnd.uniform(-85, 85), rnd.uniform(-180, 180)
+            FireStation.objects.create(name=f"Station {i}", latitude=latitude, longitude=longitude, address="-",
+                                       city="Puerto Princesa" if i % 2 else "Elsewhere", country="Philippines")
+        # Either side of the antimeridian
+        for longitude in (179.5, -179.5, 175.0):
+            FireStation.objects.create(name=f"Dateline {longitude}", latitude=-17.0, longitude=longitude,
+                                       address="-", city="Suva", country="Fiji")
+
+    def in_box(self, station, box):
+        west, south, east, north = box
+        inside_lon = west <= station.longitude <= east if west <= east else not east < station.longitude < west
+        return south <= station.latitude <= north and inside_lon
+
+    def clusters(self, **params):
+        response = self.client.get(reverse('map-clusters'), dict(layer='stations', **params))
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_clusters_hold_exactly_the_points_in_the_box(self):
+        stations = list(FireStation.objects.all())
+        for box in self.boxes:
+            expected = [station for station in stations if self.in_box(station, box)]
+            self.assertTrue(expected)
+            for zoom in (0, 6, 12):
+                with self.subTest(box=box, zoom=zoom):
+                    data = self.clusters(bbox=','.join(map(str, box)), zoom=zoom)
+                    precision = data['precision']
+                    self.assertEqual(precision, geo.zoom_precision(zoom))
+                    self.assertEqual({cluster['geohash']: cluster['count'] for cluster in data['clusters']},
+                                     Counter(station.geohash[:precision] for station in expected))
+
+    def test_single_point_clusters_carry_the_name(self):
+        data = self.clusters(zoom=18)
+        names = {station.geohash[:data['precision']]: station.name for station in FireStation.objects.all()}
+        for cluster in data['clusters']:
+            if cluster['count'] == 1:
+                self.assertEqual(cluster['name'], names[cluster['geohash']])
+            else:
+                self.assertNotIn('name', cluster)
+
+    def test_city_filter_and_bounds(self):
+        data = self.clusters(city="Elsewhere", bounds=1)
+        self.assertEqual(sum(cluster['count'] for cluster in data['clusters']),
+                         FireStation.objects.filter(city="Elsewhere").count())
+        south, west, north, east = (
+            FireStation.objects.filter(city="Elsewhere").aggregate(Min('latitude'), Min('longitude'),
+                                                                   Max('latitude'), Max('longitude')).values())
+        self.assertEqual(data['bounds'], [[south, west], [north, east]])
+
+    def test_rejects_bad_parameters(self):
+        url = reverse('map-clusters')
+        for params in ({'layer': 'rivers'}, {'bbox': '1,2,3'}, {'bbox': '0,50,10,40'}, {'bbox': '0,0,200,10'},
+                       {'zoom': 'near'}):
+            with self.subTest(params=params):
+                self.assertEqual(self.client.get(url, params).status_code, 400)
+
+
+class ExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        station = FireStation.objects.create(name="Central", latitude=9.75, longitude=118.74, address="-",
+                                             city="Puerto Princesa", country="Philippines")
+        FireTruck.objects.create(truck_number="T-1", model="Tesla", capacity=2000, station=station)
+        Firefighters.objects.create(name="Juan, \"JJ\" Cruz", rank="Captain", experience_level="Senior",
+                                    station=station)
+        for i, city in enumerate(("Puerto Princesa", "El Nido", "Coron")):
+            location = Locations.objects.create(name=f"Market {i}", latitude=9.7 + i, longitude=118.7, address="-",
+                                                city=city, country="Philippines")
+            for severity in ("Minor Fire", "Major Fire"):
+                incident = Incident.objects.create(location=location, date_time=f"2024-0{i + 1}-15",
+                                                   severity_level=severity, description=f"{severity} in {city}")
+                if i:
+                    WeatherConditions.objects.create(incident=incident, temperature=30, humidity=70,
+                                                     wind_speed=12, weather_description="Sunny")
+
+    def export(self, kind, fmt, **params):
+        response = self.client.get(reverse('export-data', args=[kind]), dict(format=fmt, **params))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        content = b''.join(response.streaming_content).decode()
+        if fmt == 'csv':
+            return list(csv.DictReader(io.StringIO(content)))
+        return [json.loads(line) for line in content.splitlines()]
+
+    def test_every_kind_exports_every_row_in_both_formats(self):
+        for kind, (model, columns) in exporters.EXPORTS.items():
+            for fmt in exporters.FORMATS:
+                with self.subTest(kind=kind, fmt=fmt):
+                    rows = self.export(kind, fmt)
+                    self.assertEqual(sorted(int(row['id']) for row in rows),
+                                     sorted(model.objects.values_list('pk', flat=True)))
+                    self.assertEqual(list(rows[0]), [name for name, path in columns])
+
+    def test_csv_and_ndjson_carry_the_same_values(self):
+        by_csv = self.export('firefighters', 'csv')
+        by_ndjson = self.export('firefighters', 'ndjson')
+        self.assertEqual(by_csv[0]['name'], 'Juan, "JJ" Cruz')
+        # Timestamps differ only in notation: JSON keeps milliseconds, CSV the full value
+        for row in by_csv + by_ndjson:
+            del row['created_at']
+        self.assertEqual([{name: str(value) for name, value in row.items()} for row in by_ndjson], by_csv)
+
+    def test_exported_incidents_import_back(self):
+        before = sorted(Incident.objects.values_list('location_id', 'date_time', 'severity_level', 'description'))
+        exported = self.export('incidents', 'csv')
+        WeatherConditions.objects.all().delete()
+        Incident.objects.all().delete()
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=list(exported[0]))
+        writer.writeheader()
+        writer.writerows(exported)
+        response = self.client.post(reverse('import-data', args=['incidents']),
+                                    {'file': SimpleUploadedFile('incidents.csv', buffer.getvalue().encode())})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            sorted(Incident.objects.values_list('location_id', 'date_time', 'severity_level', 'description')), before)
+
+    def test_search_narrows_the_export(self):
+        rows = self.export('incidents', 'ndjson', q="Coron")
+        self.assertEqual({row['city'] for row in rows}, {"Coron"})
+        self.assertEqual(len(rows), 2)
+
+    def test_rejects_unknown_kind_and_format(self):
+        self.assertEqual(self.client.get(reverse('export-data', args=['rollups'])).status_code, 404)
+        self.assertEqual(self.client.get(reverse('export-data', args=['incidents']), {'format': 'xml'}).status_code,
+                         400)
+
+
+class AsyncEndpointTests(TestCase):
+    """The ASGI endpoints answer exactly what their sync counterparts do."""
+
+    @classmethod
+    def setUpTestData(cls):
+        this_year = date.today().year
+        for i, (country, city) in enumerate((("Philippines", "Coron"), ("Japan", "Osaka"), ("Chile", "Arica"))):
+            location = Locations.objects.create(name=f"Market {i}", latitude=10.0 + i * 20, longitude=120.0 - i * 90,
+                                                address="-", city=city, country=country)
+            FireStation.objects.create(name=f"Station {i}", latitude=10.1 + i * 20, longitude=120.0 - i * 90,
+                                       address="-", city=city, country=country)
+            for month in range(1, 4 + i):
+                Incident.objects.create(location=location, date_time=date(this_year, month, 10),
+                                        severity_level=("Minor Fire", "Moderate Fire", "Major Fire")[month % 3],
+                                        description="-")
+        rollups.rebuild()
+
+    def setUp(self):
+        cache.get_cache().clear()
+
+    def test_chart_series_match_the_dashboard(self):
+        combined = self.client.get(reverse('dashboard-api')).json()
+        for series in dashboard.SERIES:
+            with self.subTest(series=series):
+                response = self.client.get(reverse('async-chart', args=[series]))
+                self.assertEqual(response.status_code, 200)
+                self.assertTrue(combined[series])
+                self.assertEqual(response.json(), combined[series])
+
+    def test_dashboard_matches_the_sync_view(self):
+        for params in ({}, {'series': 'pie,line'}):
+            with self.subTest(params=params):
+                self.assertEqual(self.client.get(reverse('async-dashboard-api'), params).json(),
+                                 self.client.get(reverse('dashboard-api'), params).json())
+
+    def test_map_matches_the_sync_view(self):
+        for params in ({}, {'layer': 'stations', 'zoom': 8, 'bounds': 1}, {'bbox': '100,0,130,20', 'zoom': 3},
+                       {'city': 'Osaka'}):
+            with self.subTest(params=params):
+                self.assertEqual(self.client.get(reverse('async-map-data'), params).json(),
+                                 self.client.get(reverse('map-clusters'), params).json())
+
+    def test_rejects_bad_requests(self):
+        self.assertEqual(self.client.get(reverse('async-chart', args=['radar'])).status_code, 404)
+        self.assertEqual(self.client.get(reverse('async-dashboard-api'), {'series': 'radar'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('async-map-data'), {'bbox': 'nowhere'}).status_code, 400)
+        for name, args in (('async-chart', ['pie']), ('async-dashboard-api', []), ('async-map-data', [])):
+            with self.subTest(name=name):
+                self.assertEqual(self.client.post(reverse(name, args=args)).status_code, 405)
+
+
+class SqliteTuningTests(TestCase):
+    def pragma(self, name):
+        with connection.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    def test_connections_get_the_pragmas(self):
+        self.assertEqual(self.pragma('synchronous'), 1)  # NORMAL
+        self.assertEqual(self.pragma('busy_timeout'), 5000)
+        self.assertEqual(self.pragma('cache_size'), -64000)
+        self.assertEqual(self.pragma('temp_store'), 2)  # MEMORY
+        self.assertEqual(self.pragma('query_only'), 0)
+
+    def test_read_connection_is_query_only(self):
+        self.assertEqual(db.sqlite_pragmas(db.READ_ALIAS)['query_only'], 'ON')
+        self.assertNotIn('query_only', db.sqlite_pragmas('default'))
+
+    def test_router_reads_from_default_inside_a_write_transaction(self):
+        router = db.ReadRouter()
+        self.assertEqual(router.db_for_write(Incident), 'default')
+        with mock.patch.object(connections['default'], 'in_atomic_block', False):
+            self.assertEqual(router.db_for_read(Incident), db.READ_ALIAS)
+        with mock.patch.object(connections['default'], 'in_atomic_block', True):
+            self.assertEqual(router.db_for_read(Incident), 'default')
+        self.assertFalse(router.allow_migrate(db.READ_ALIAS, 'fire'))
+
+    def test_set_journal_mode_reports_a_mode_it_could_not_set(self):
+        # The test database lives in memory, where WAL is unavailable
+        with self.assertRaisesMessage(CommandError, 'Journal mode is still'):
+            call_command('set_journal_mode', 'wal', stdout=io.StringIO())
+
+
+class PackedPointsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        rnd = random.Random(5)
+        for i in range(50):
+            FireStation.objects.create(name=f"Station {i}", latitude=rnd.uniform(-90, 90),
+                                       longitude=rnd.uniform(-180, 180), address="-", city="City", country="Country")
+
+    def unpack(self, payload):
+        count, flags = struct.unpack_from('<II', payload)
+        columns = [struct.unpack_from(f'<{count}{code}', payload, 8 + column * 4 * count)
+                   for column, code in enumerate('ffI')]
+        self.assertEqual(len(payload), 8 + 12 * count)
+        return list(zip(*columns)), flags
+
+    def float32(self, value):
+        return struct.unpack('<f', struct.pack('<f', value))[0]
+
+    def test_payload_decodes_to_the_same_points(self):
+        response = self.client.get(reverse('map-points'), {'layer': 'stations'})
+        self.assertEqual(response['Content-Type'], 'application/octet-stream')
+        points, flags = self.unpack(response.content)
+        self.assertEqual(flags, 0)
+        expected = FireStation.objects.values_list('latitude', 'longitude', 'id')
+        self.assertEqual(sorted(points, key=lambda point: point[2]),
+                         sorted(((self.float32(lat), self.float32(lon), pk) for lat, lon, pk in expected),
+                                key=lambda point: point[2]))
+
+    def test_binary_and_json_carry_the_same_points(self):
+        params = {'layer': 'stations', 'bbox': '-90,-45,90,45'}
+        points, flags = self.unpack(self.client.get(reverse('map-points'), params).content)
+        data = self.client.get(reverse('map-points'), dict(params, format='json')).json()
+        self.assertFalse(data['truncated'])
+        self.assertEqual(points, [(self.float32(lat), self.float32(lon), pk) for lat, lon, pk in data['points']])
+
+    def test_truncated_payload_is_flagged(self):
+        rows, truncated = spatial.layer_points('stations', limit=10)
+        self.assertTrue(truncated)
+        points, flags = self.unpack(spatial.pack_points(rows, truncated))
+        self.assertEqual((len(points), flags), (10, spatial.TRUNCATED))
+        self.assertEqual(self.unpack(spatial.pack_points([])), ([], 0))
+
+    def test_coordinates_are_stored_as_floats(self):
+        station = FireStation.objects.create(name="Precise", latitude=9.123456789, longitude=118.987654321,
+                                             address="-", city="City", country="Country")
+        station.refresh_from_db()
+        self.assertIsInstance(station.latitude, float)
+        self.assertAlmostEqual(station.latitude, 9.123456789, places=9)
+        self.assertAlmostEqual(station.longitude, 118.987654321, places=9)
+
+
+class SearchBackendTests(TestCase):
+    # Whole words and word prefixes, where a token match and a substring match agree
+    queries = ["Puerto", "puerto princesa", "Coron", "Major", "Rizal", "Tesla", "Captain", "Mal", "Nowhere", "2000"]
+
+    @classmethod
+    def setUpTestData(cls):
+        for i, (city, street) in enumerate((("Puerto Princesa", "Rizal Ave"), ("Coron", "Malvar St"),
+                                             ("El Nido", "Real St"))):
+            location = Locations.objects.create(name=f"Market {i}", latitude=9.7, longitude=118.7,
+                                                address=f"{i} {street}", city=city, country="Philippines")
+            station = FireStation.objects.create(name=f"{city} Central", latitude=9.8, longitude=118.8,
+                                                 address=f"{i} {street}", city=city, country="Philippines")
+            FireTruck.objects.create(truck_number=f"T-{i}", model=("Tesla", "Isuzu", "Hino")[i],
+                                     capacity=2000 + i * 500, station=station)
+            Firefighters.objects.create(name=f"Firefighter {i}", rank=("Captain", "Probationary", "Lieutenant")[i],
+                                        experience_level="Senior", station=station)
+            for severity in ("Minor Fire", "Major Fire"):
+                incident = Incident.objects.create(location=location, date_time="2024-03-01",
+                                                   severity_level=severity, description="-")
+                WeatherConditions.objects.create(incident=incident, temperature=30 + i, humidity=70, wind_speed=12,
+                                                 weather_description="Sunny")
+
+    def setUp(self):
+        if not search.fts5_available():
+            self.skipTest("FTS5 is not available")
+
+    def test_fts_matches_icontains(self):
+        fts, contains = search.SQLiteFTSBackend(), search.ContainsBackend()
+        for model in search.SEARCH_FIELDS:
+            for query in self.queries:
+                with self.subTest(model=model.__name__, query=query):
+                    expected = set(contains.search(model.objects.all(), query).values_list('pk', flat=True))
+                    for ranked in (True, False):
+                        found = fts.search(model.objects.all(), query, ranked=ranked).values_list('pk', flat=True)
+                        self.assertEqual(sorted(found), sorted(expected))
+
+    def test_index_follows_edits_of_embedded_rows(self):
+        fts = search.SQLiteFTSBackend()
+        location = Locations.objects.get(city="Coron")
+        location.city = "Busuanga"
+        location.save()
+        self.assertFalse(fts.search(Incident.objects.all(), "Coron").exists())
+        self.assertEqual(fts.search(Incident.objects.all(), "Busuanga").count(), 2)
+        location.delete()
+        self.assertFalse(fts.search(Locations.objects.all(), "Busuanga").exists())
+
+
+class CursorPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        location = Locations.objects.create(name="Market", latitude=9.7, longitude=118.7, address="-",
+                                            city="Puerto Princesa", country="Philippines")
+        for i in range(23):
+            Incident.objects.create(location=location, date_time="2024-03-01", severity_level="Minor Fire",
+                                    description=f"Incident {i}")
+        # Runs of rows sharing a created_at, so pages have to break ties on id
+        stamp = timezone.now() - timedelta(days=1)
+        pks = list(Incident.objects.order_by('pk').values_list('pk', flat=True))
+        for start, size in ((0, 9), (12, 5), (20, 3)):
+            Incident.objects.filter(pk__in=pks[start:start + size]).update(created_at=stamp - timedelta(hours=start))
+
+    def expected(self):
+        return list(Incident.objects.order_by('-created_at', '-id').values_list('pk', flat=True))
+
+    def test_pages_round_trip_through_ties(self):
+        for per_page in (1, 4, 5, 23, 30):
+            with self.subTest(per_page=per_page):
+                pages = [pagination.CursorPage(Incident.objects.all(), per_page)]
+                while pages[-1].next_cursor:
+                    pages.append(pagination.CursorPage(Incident.objects.all(), per_page, pages[-1].next_cursor))
+                self.assertEqual([row.pk for page in pages for row in page], self.expected())
+                self.assertFalse(pages[0].has_previous())
+
+                # Walking back from the last page returns the same pages
+                back = [pages[-1]]
+                while back[-1].previous_cursor:
+                    back.append(pagination.CursorPage(Incident.objects.all(), per_page, back[-1].previous_cursor))
+                self.assertEqual([[row.pk for row in page] for page in reversed(back)],
+                                 [[row.pk for row in page] for page in pages])
+
+    def test_list_view_follows_cursors(self):
+        url = reverse('fireincident-list')
+        response = self.client.get(url, {'cursor': ''})
+        seen = []
+        while True:
+            page = response.context['page_obj']
+            seen.extend(row.pk for row in page)
+            if not page.next_cursor:
+                break
+            response = self.client.get(url, {'cursor': page.next_cursor})
+        self.assertEqual(seen, self.expected())
+        self.assertEqual(self.client.get(url, {'cursor': 'n:garbage'}).status_code, 404)
@@ -1,7 +1,7 @@
 from django.shortcuts import render
 from django.views.generic.list import ListView
 from django.views.generic.edit import CreateView, UpdateView, DeleteView
-from fire.models import Locations, Incident, FireStation, FireTruck, Firefighters, WeatherConditions
+from fire.models import Locations, Incident, FireStation, FireTruck, Firefighters, WeatherConditions, IncidentRollup
 from fire.forms import LocationForm, IncidentForm, FireStationForm, FireFighterForm, FireTruckForm, WeatherConForm
 from django.urls import reverse_lazy
 
@@ -13,10 +13,16 @@ from django.db import connection
 from django.http import JsonResponse
 from django.db.models.functions import ExtractMonth
 
-from django.db.models import Count
-from datetime import datetime
+from django.db.models import Count, Sum
+from datetime import date, datetime
 
 from django.contrib import messages
+from django.conf import settings
+from django.http import Http404
+
+from fire import analytics, bulk, search
+from fire.cache import cache_page_for_models
+from fire.pagination import CursorPage, EstimatedCountPaginator, estimated_count
 
 
 class HomePageView(ListView):
@@ -34,37 +40,34 @@ class ChartView(ListView):
     def get_queryset(self, *args, **kwargs):
         pass
 
+def current_year(request):
+    return datetime.now().year
+
+# Chart data is read from the rollup, which follows incidents and their locations
+CHART_MODELS = (Incident, Locations, IncidentRollup)
+
+@cache_page_for_models(*CHART_MODELS)
 def PieCountbySeverity(request):
-    query = '''
-    SELECT severity_level, COUNT(*) as count
-    FROM fire_incident
-    GROUP BY severity_level
-    '''
-    data = {}
-    with connection.cursor() as cursor:
-        cursor.execute(query)
-        rows = cursor.fetchall()
-
-    if rows:
-        # Construct the dictionary with severity level as keys and count as values
-        data = {severity: count for severity, count in rows}
-    else:
-        data = {}
+    rows = (IncidentRollup.objects
+            .values('severity_level')
+            .annotate(count=Sum('count'))
+            .order_by('severity_level'))
+
+    # Construct the dictionary with severity level as keys and count as values
+    data = {row['severity_level']: row['count'] for row in rows}
 
     return JsonResponse(data)
 
+@cache_page_for_models(*CHART_MODELS, vary_on=current_year)
 def LineCountbyMonth(request):
     current_year = datetime.now().year
     result = {month: 0 for month in range(1, 13)}
 
-    incidents_per_month = Incident.objects.filter(
-        date_time__year=current_year
-    ).exclude(date_time__isnull=True).values_list('date_time', flat=True)
+    incidents_per_month = analytics.incident_counts(
+        date(current_year, 1, 1), date(current_year, 12, 31), granularity='month')
 
-    for date_time in incidents_per_month:
-        if date_time is not None:
-            month = date_time.month
-            result[month] += 1
+    for row in incidents_per_month:
+        result[row['period'].month] += row['counts'].get(None, 0)
 
     month_names = {1: 'Jan', 2: 'Feb', 3: 'Mar', 4: 'Apr', 5: 'May', 6: 'Jun', 7: 'Jul', 8: 'Aug', 9: 'Sep', 10: 'Oct', 11: 'Nov', 12: 'Dec'}
     result_with_month_names = {month_names[int(month)]: count for month, count in result.items()}
@@ -72,43 +75,10 @@ def LineCountbyMonth(request):
     return JsonResponse(result_with_month_names)
 
 
+@cache_page_for_models(*CHART_MODELS, vary_on=current_year)
 def MultilineIncidentTop3Country(request):
-
-    query = '''
-        SELECT 
-        fl.country,
-        strftime('%m', fi.date_time) AS month,
-        COUNT(fi.id) AS incident_count
-    FROM 
-        fire_incident fi
-    JOIN 
-        fire_locations fl ON fi.location_id = fl.id
-    WHERE 
-        fl.country IN (
-            SELECT 
-                fl_top.country
-            FROM 
-                fire_incident fi_top
-            JOIN 
-                fire_locations fl_top ON fi_top.location_id = fl_top.id
-            WHERE 
-                strftime('%Y', fi_top.date_time) = strftime('%Y', 'now')
-            GROUP BY 
-                fl_top.country
-            ORDER BY 
-                COUNT(fi_top.id) DESC
-            LIMIT 3
-        )
-        AND strftime('%Y', fi.date_time) = strftime('%Y', 'now')
-    GROUP BY 
-        fl.country, month
-    ORDER BY 
-        fl.country, month;
-    '''
-
-    with connection.cursor() as cursor:
-        cursor.execute(query)
-        rows = cursor.fetchall()
+    current_year = datetime.now().year
+    rows = analytics.top_country_months(current_year, limit=3)
 
     # Initialize a dictionary to store the result
     result = {}
@@ -118,16 +88,15 @@ def MultilineIncidentTop3Country(request):
 
     # Loop through the query results
     for row in rows:
-        country = row[0]
-        month = row[1]
-        total_incidents = row[2]
+        country = row['country']
+        month = str(row['month']).zfill(2)
 
         # If the country is not in the result dictionary, initialize it with all months set to zero
         if country not in result:
             result[country] = {month: 0 for month in months}
 
         # Update the incident count for the corresponding month
-        result[country][month] = total_incidents
+        result[country][month] = row['total']
 
     # Ensure there are always 3 countries in the result
     while len(result) < 3:
@@ -140,33 +109,26 @@ def MultilineIncidentTop3Country(request):
 
     return JsonResponse(result)
 
+@cache_page_for_models(*CHART_MODELS)
 def multipleBarbySeverity(request):
-    query = '''
-    SELECT 
-        fi.severity_level,
-        strftime('%m', fi.date_time) AS month,
-        COUNT(fi.id) AS incident_count
-    FROM 
-        fire_incident fi
-    GROUP BY fi.severity_level, month
-    '''
-
-    with connection.cursor() as cursor:
-        cursor.execute(query)
-        rows = cursor.fetchall()
+    rows = (IncidentRollup.objects
+            .exclude(day__isnull=True)
+            .annotate(month=ExtractMonth('day'))
+            .values('severity_level', 'month')
+            .annotate(total=Sum('count'))
+            .order_by())
 
     result = {}
     months = set(str(i).zfill(2) for i in range(1, 13))
 
     for row in rows:
-        level = str(row[0])  # Ensure the severity level is a string
-        month = row[1]
-        total_incidents = row[2]
+        level = str(row['severity_level'])  # Ensure the severity level is a string
+        month = str(row['month']).zfill(2)
 
         if level not in result:
             result[level] = {month: 0 for month in months}
 
-        result[level][month] = total_incidents
+        result[level][month] = row['total']
 
     # Sort months within each severity level
     for level in result:
@@ -175,35 +137,15 @@ def multipleBarbySeverity(request):
     return JsonResponse(result)
 
 def map_station(request):
-    fireStations = FireStation.objects.values('name', 'latitude', 'longitude')
-
-    for fs in fireStations:
-        fs['latitude'] = float(fs['latitude'])
-        fs['longitude'] = float(fs['longitude'])
-
-    fireStations_list = list(fireStations)
-
-    context = {
-        'fireStations': fireStations_list,
-    }
-
-    return render(request, 'map_station.html', context)
+    # Markers are loaded per viewport from the map-clusters endpoint.
+    return render(request, 'map_station.html')
 
 
+@cache_page_for_models(Locations)
 def map_Incidents(request):
-    # Fetching fire incidents along with their location details
-    cities = Locations.objects.values_list('city', flat=True).distinct()
-    fireIncidents = Incident.objects.select_related('location').values('location__name', 'location__latitude', 'location__longitude', 'location__city')
-
- 
-    for incident in fireIncidents:
-        incident['location__latitude'] = float(incident['location__latitude'])
-        incident['location__longitude'] = float(incident['location__longitude'])
-
-    fireIncidents_list = list(fireIncidents)
+    cities = Locations.objects.values_list('city', flat=True).distinct().order_by('city')
 
     context = {
-        'fireIncidents': fireIncidents_list,  # Pass the list to the template
         'cities': cities,
     }
 
@@ -218,15 +160,72 @@ def map_Incidents(request):
 class BaseListView(ListView):
     paginate_by = 10
     context_object_name = 'object_list'
-    
+    # Keyset pagination on (created_at, id); requests can also opt in with ?cursor=.
+    # None follows FIRE_CURSOR_PAGINATION.
+    cursor_pagination = None
+    # Replace COUNT(*) on unfiltered lists with a cheap estimate; None follows FIRE_ESTIMATED_COUNTS
+    estimate_count = None
+    # Relations the template renders for every row, loaded up front instead of one query per row
+    select_related = ()
+    prefetch_related = ()
+
     def get_queryset(self):
         qs = super().get_queryset()
+        if self.select_related:
+            qs = qs.select_related(*self.select_related)
+        if self.prefetch_related:
+            qs = qs.prefetch_related(*self.prefetch_related)
         if query := self.request.GET.get("q"):
-            qs = qs.filter(self.get_search_filter(query))
+            # Ranking only makes sense with offset pages; keyset pages order by created_at
+            qs = search.search(qs, query, ranked=not self.uses_cursor_pagination())
         return qs
-    
-    def get_search_filter(self, query):
-        return Q()
+
+    def uses_cursor_pagination(self):
+        # Settings are read per request, so override_settings and reloads take effect
+        enabled = self.cursor_pagination
+        if enabled is None:
+            enabled = getattr(settings, 'FIRE_CURSOR_PAGINATION', False)
+        return enabled or 'cursor' in self.request.GET
+
+    def uses_estimated_count(self):
+        if self.estimate_count is None:
+            return getattr(settings, 'FIRE_ESTIMATED_COUNTS', False)
+        return self.estimate_count
+
+    def get_paginator(self, queryset, per_page, orphans=0, allow_empty_first_page=True, **kwargs):
+        paginator_class = EstimatedCountPaginator if self.uses_estimated_count() else self.paginator_class
+        return paginator_class(queryset, per_page, orphans=orphans,
+                               allow_empty_first_page=allow_empty_first_page, **kwargs)
+
+    def paginate_queryset(self, queryset, page_size):
+        if not self.uses_cursor_pagination():
+            return super().paginate_queryset(queryset, page_size)
+        try:
+            page = CursorPage(queryset, page_size, self.request.GET.get('cursor'))
+        except ValueError:
+            raise Http404("Invalid cursor")
+        return None, page, page.object_list, page.has_other_pages()
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        params = self.request.GET.copy()
+        params.pop('page', None)
+        params.pop('cursor', None)
+        context['pagination_query'] = params.urlencode() + '&' if params else ''
+        context['cursor_pagination'] = self.uses_cursor_pagination()
+        # Selection mode: the bulk action bar posts the ticked rows, or every row matching q
+        context['bulk_kind'] = bulk.KINDS.get(self.model)
+        context['bulk_fields'] = bulk.updatable_fields(self.model)
+        context['search_query'] = self.request.GET.get('q', '')
+        page = context.get('page_obj')
+        paginator = context.get('paginator')
+        if paginator is not None and page is not None:
+            # Only the pages around the current one, not the whole page_range
+            context['page_range'] = [number for number in paginator.get_elided_page_range(page.number, on_each_side=2, on_ends=0)
+                                     if number != paginator.ELLIPSIS]
+        elif self.uses_estimated_count():
+            context['estimated_count'] = estimated_count(self.object_list)
+        return context
 
 class BaseCreateView(CreateView):
     def form_valid(self, form):
@@ -247,21 +246,11 @@ class BaseDeleteView(DeleteView):
 
 #-----------------Location--------------------------------
 
-class LocationList(ListView):
+class LocationList(BaseListView):
     model = Locations
     context_object_name = 'locations'
     template_name = 'locations/location_list.html'
-    paginate_by = 10
 
-    def get_queryset(self, *args, **kwargs):
-        qs = super(LocationList, self).get_queryset(*args, **kwargs)
-        if self.request.GET.get("q") != None:
-            query = self.request.GET.get('q')
-            qs = qs.filter(Q(name__icontains=query) | 
-                        Q(city__icontains=query) |
-                        Q(address__icontains=query) |
-                        Q(country__icontains=query))
-        return qs
 
 class LocationCreateView(CreateView):
     model = Locations
@@ -309,21 +298,11 @@ class LocationDeleteView(DeleteView):
 #-----------------FireStation--------------------------------
 
 
-class FirestationList(ListView):
+class FirestationList(BaseListView):
     model = FireStation
     context_object_name = 'firestation'
     template_name = 'firestation/firestation_list.html'
-    paginate_by = 10
 
-    def get_queryset(self, *args, **kwargs):
-        qs = super(FirestationList, self).get_queryset(*args, **kwargs)
-        if self.request.GET.get("q") != None:
-            query = self.request.GET.get('q')
-            qs = qs.filter(Q(name__icontains=query) | 
-                        Q(city__icontains=query) |
-                        Q(address__icontains=query) |
-                        Q(country__icontains=query))
-        return qs
 
 class FirestationCreateView(CreateView):
     model = FireStation
@@ -372,21 +351,12 @@ class FirestationDeleteView(DeleteView):
 #-----------------FireIncident--------------------------------
 
 
-class FireincidentList(ListView):
+class FireincidentList(BaseListView):
     model = Incident
     context_object_name = 'fireincident'
     template_name = 'fireincident/fireincident_list.html'
-    paginate_by = 10
+    select_related = ('location',)
 
-    def get_queryset(self, *args, **kwargs):
-        qs = super(FireincidentList, self).get_queryset(*args, **kwargs)
-        if self.request.GET.get("q") != None:
-            query = self.request.GET.get('q')
-            qs = qs.filter(Q(location__name__icontains=query) | 
-                           Q(location__city__icontains=query) |
-                           Q(location__country__icontains=query) |
-                           Q(severity_level__icontains=query))
-        return qs
 
 class FireincidentCreateView(CreateView):
     model = Incident
@@ -435,21 +405,12 @@ class FireincidentDeleteView(DeleteView):
 #-----------------Firetruckss--------------------------------
 
 
-class FiretrucksList(ListView):
+class FiretrucksList(BaseListView):
     model = FireTruck
     context_object_name = 'firetruck'
     template_name = 'firetruck/firetruck_list.html'
-    paginate_by = 10
+    select_related = ('station',)
 
-    def get_queryset(self, *args, **kwargs):
-        qs = super(FiretrucksList, self).get_queryset(*args, **kwargs)
-        if self.request.GET.get("q") != None:
-            query = self.request.GET.get('q')
-            qs = qs.filter(Q(truck_number__icontains=query) | 
-                           Q(model__icontains=query) |
-                           Q(capacity__icontains=query) |
-                           Q(station__name__icontains=query))
-        return qs
 
 class FiretrucksCreateView(CreateView):
     model = FireTruck
@@ -499,22 +460,12 @@ class FiretrucksDeleteView(DeleteView):
 #-----------------Firefighterssss--------------------------------
 
 
-class FireFightersList(ListView):
+class FireFightersList(BaseListView):
     model = Firefighters
     context_object_name = 'firefighter'
     template_name = 'firefighter/firefighter_list.html'
-    paginate_by = 10
+    select_related = ('station',)
 
-    def get_queryset(self, *args, **kwargs):
-        qs = super(FireFightersList, self).get_queryset(*args, **kwargs)
-        if self.request.GET.get("q") != None:
-            query = self.request.GET.get('q')
-            qs = qs.filter(Q(name__icontains=query) | 
-                           Q(rank__icontains=query) |
-                           Q(experience_level__icontains=query) |
-                           Q(station__name__icontains=query)|
-                           Q(station__country__icontains=query))
-        return qs
 
 class FireFightersCreateView(CreateView):
     model = Firefighters
@@ -564,21 +515,12 @@ class FireFightersDeleteView(DeleteView):
 #-----------------weathercondtions--------------------------------
 
 
-class WeatherConditionList(ListView):
+class WeatherConditionList(BaseListView):
     model = WeatherConditions
     context_object_name = 'weathercondition'
     template_name = 'weathercon/weathercon_list.html'
-    paginate_by = 10
+    select_related = ('incident__location',)
 
-    def get_queryset(self, *args, **kwargs):
-        qs = super(WeatherConditionList, self).get_queryset(*args, **kwargs)
-        if self.request.GET.get("q") != None:
-            query = self.request.GET.get('q')
-            qs = qs.filter(Q(incident__location__name__icontains=query) | 
-                           Q(temperature__icontains=query) |
-                           Q(humidity__icontains=query) |
-                           Q(wind_speed__icontains=query))
-        return qs
 
 class WeatherConditionCreateView(CreateView):
     model = WeatherConditions
@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/4.2/ref/settings/
 
 from pathlib import Path
 import os
+import tempfile
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -42,6 +43,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "fire.metrics.MetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -53,9 +55,16 @@ MIDDLEWARE = [
 
 ROOT_URLCONF = "projectsite.urls"
 
+# Serve {% fragment %} blocks from the cache. Fragments are keyed on the rows they
+# show, not on the template source, so this is off while DEBUG: an edited template
+# would otherwise keep showing its old fragments until they expire.
+FIRE_FRAGMENT_CACHE = os.environ.get('FIRE_FRAGMENT_CACHE', '0' if DEBUG else '1') == '1'
+
 TEMPLATES = [
     {
-        "BACKEND": "django.template.backends.django.DjangoTemplates",
+        # DjangoTemplates plus render timing for fire.metrics; NAME keeps the usual alias
+        "BACKEND": "fire.metrics.TimedDjangoTemplates",
+        "NAME": "django",
         "DIRS": [os.path.join(BASE_DIR, 'templates')],
         "APP_DIRS": True,
         "OPTIONS": {
@@ -79,9 +88,35 @@ DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": BASE_DIR / "db.sqlite3",
+        # Keep connections open between requests instead of reconnecting each time
+        "CONN_MAX_AGE": int(os.environ.get('FIRE_CONN_MAX_AGE', 600)),
+        "CONN_HEALTH_CHECKS": True,
     }
 }
 
+# Applied to every new SQLite connection by fire.db.configure_connection, so only
+# per-connection settings belong here. The journal mode is stored in the database
+# file and is switched once with `manage.py set_journal_mode WAL`: in WAL mode
+# readers keep reading while a writer commits, and synchronous=NORMAL is safe
+# under WAL and saves an fsync per transaction.
+FIRE_SQLITE_PRAGMAS = {
+    "synchronous": "NORMAL",
+    "busy_timeout": 5000,  # milliseconds a writer waits for the lock
+    "cache_size": -64000,  # negative means KiB
+    "mmap_size": 256 * 1024 * 1024,
+    "temp_store": "MEMORY",
+}
+
+# Route reads to a second, read-only connection to the same file, so page reads
+# never hold or wait on the writer's lock.
+if os.environ.get('FIRE_READ_CONNECTION') == '1':
+    DATABASES["read"] = {
+        **DATABASES["default"],
+        "NAME": f"{Path(DATABASES['default']['NAME']).as_uri()}?mode=ro",
+        "TEST": {"MIRROR": "default"},
+    }
+    DATABASE_ROUTERS = ['fire.db.ReadRouter']
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -128,3 +163,49 @@ STATICFILES_DIRS = (
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
+
+
+# List views
+# Keyset pagination on (created_at, id) instead of COUNT + OFFSET; a request
+# can also opt in by passing ?cursor=
+FIRE_CURSOR_PAGINATION = os.environ.get('FIRE_CURSOR_PAGINATION') == '1'
+# Replace COUNT(*) on unfiltered lists with a cheap estimate
+FIRE_ESTIMATED_COUNTS = os.environ.get('FIRE_ESTIMATED_COUNTS') == '1'
+
+
+# Metrics
+# Queries slower than this many milliseconds are logged to "fire.slow_queries"
+FIRE_SLOW_QUERY_MS = float(os.environ['FIRE_SLOW_QUERY_MS']) if os.environ.get('FIRE_SLOW_QUERY_MS') else None
+
+
+# Cache
+# Where cached views live: locmem (default), file or redis. locmem is private to
+# each process, so use file or redis when running several workers.
+FIRE_CACHE_BACKEND = os.environ.get('FIRE_CACHE_BACKEND', 'locmem')
+CACHES = {
+    "default": {
+        "locmem": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "fire",
+            "OPTIONS": {"MAX_ENTRIES": 10000},
+        },
+        "file": {
+            "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+            "LOCATION": os.environ.get('FIRE_CACHE_LOCATION', os.path.join(tempfile.gettempdir(), 'fire-cache')),
+            "OPTIONS": {"MAX_ENTRIES": 10000},
+        },
+        "redis": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": os.environ.get('FIRE_CACHE_LOCATION', 'redis://127.0.0.1:6379/1'),
+        },
+    }[FIRE_CACHE_BACKEND],
+}
+# Cached views are invalidated by model version bumps, not by age
+FIRE_CACHE_TIMEOUT = None
+# Cached template fragments are keyed on the rows' updated_at; superseded ones age out
+FIRE_FRAGMENT_CACHE_TIMEOUT = 3600
+
+
+# Station coverage
+# Locations further than this from every fire station are reported as uncovered
+FIRE_COVERAGE_RADIUS_KM = float(os.environ.get('FIRE_COVERAGE_RADIUS_KM', 5))
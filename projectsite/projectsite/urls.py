@@ -2,6 +2,8 @@ from django.contrib import admin
 from django.urls import path
 
 from fire.views import HomePageView, ChartView, PieCountbySeverity, LineCountbyMonth, MultilineIncidentTop3Country, multipleBarbySeverity, map_station, map_Incidents, LocationList,LocationCreateView, LocationUpdateView, LocationDeleteView, FirestationList, FirestationCreateView, FirestationUpdateView, FirestationDeleteView, FireincidentList, FireincidentCreateView, FireincidentUpdateView, FireincidentDeleteView, FiretrucksList, FiretrucksCreateView, FiretrucksUpdateView,FiretrucksDeleteView, FireFightersList, FireFightersCreateView, FireFightersUpdateView, FireFightersDeleteView, WeatherConditionList, WeatherConditionUpdateView, WeatherConditionCreateView, WeatherConditionDeleteView
+from fire.api import bulk_action, dashboard_data, map_clusters, map_points, nearest_stations, import_data, export_data, metrics_data, sync_changes, incident_analytics, dispatch_recommendations, coverage_heatmap, uncovered_locations
+from fire import async_api
 
 urlpatterns = [
     path("admin/", admin.site.urls),
@@ -13,6 +15,23 @@ urlpatterns = [
     path('multiBarChart/', multipleBarbySeverity, name='chart'),
     path('stations', map_station, name='map-station'),
     path('Incidents', map_Incidents, name='map-incidents'),
+    path('api/dashboard/', dashboard_data, name='dashboard-api'),
+    path('api/map/clusters/', map_clusters, name='map-clusters'),
+    path('api/map/points/', map_points, name='map-points'),
+    path('api/stations/nearest/', nearest_stations, name='nearest-stations'),
+    path('api/dispatch/', dispatch_recommendations, name='dispatch'),
+    path('api/coverage/heatmap/', coverage_heatmap, name='coverage-heatmap'),
+    path('api/coverage/uncovered/', uncovered_locations, name='uncovered-locations'),
+    path('api/import/<str:kind>/', import_data, name='import-data'),
+    path('api/export/<str:kind>/', export_data, name='export-data'),
+    path('api/bulk/<str:kind>/', bulk_action, name='bulk-action'),
+    path('metrics', metrics_data, name='metrics'),
+    path('api/sync/', sync_changes, name='sync'),
+    path('api/analytics/incidents/', incident_analytics, name='incident-analytics'),
+    path('api/async/chart/<str:series>/', async_api.chart_series, name='async-chart'),
+    path('api/async/dashboard/', async_api.dashboard_data, name='async-dashboard-api'),
+    path('api/async/map/', async_api.map_data, name='async-map-data'),
+    path('api/events/', async_api.live_events, name='live-events'),
 
     path('location_list', LocationList.as_view(), name='location-list'),
     path('location_list/add', LocationCreateView.as_view(), name='location-add'),